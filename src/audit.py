@@ -0,0 +1,253 @@
+import argparse
+import base64
+import os
+import sys
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from cryptography.hazmat.primitives import serialization
+from blocks import BlockRecord, split_block_body, parse_header, parse_data_line, compute_data_root
+from segment_log import SegmentLog
+from utils.hash_util import compute_hash_from_data
+from utils.keys_util import verify_ECDSA_bytes
+from utils.pseudorandom_util import hash_concat_data_and_known_rand
+
+# Blocks sent to a worker in a single task, and tasks in flight at the same time:
+# at most _batch_size * _window blocks are kept in memory while streaming the chain.
+_batch_size = 64
+_window = 16
+
+_keys = {}
+
+def _load_key(public_key):
+    """
+    Load a public key from the base64 DER body shown in the blocks, caching it per process.
+    """
+    key = _keys.get(public_key)
+    if key is None:
+        key = serialization.load_der_public_key(base64.b64decode(public_key))
+        _keys[public_key] = key
+    return key
+
+def _verify_signatures(batch):
+    """
+    Verify the block signatures and the player signatures of a batch of blocks. It runs in the worker processes.
+    # Arguments
+        batch: list
+            (block number, block public key, block hash, block signature, list of (player public key, message, player signature))
+    # Returns
+        list
+            The (block number, reason) pairs of the blocks with an invalid signature.
+    """
+    failures = []
+    for number, public_key, block_hash, signature, player_signatures in batch:
+        try:
+            if not verify_ECDSA_bytes(_load_key(public_key), block_hash.encode(), bytes.fromhex(signature)):
+                failures.append((number, 'invalid block signature'))
+                continue
+            for user_id, player_key, message, player_signature in player_signatures:
+                if not verify_ECDSA_bytes(_load_key(player_key), message.encode(), bytes.fromhex(player_signature)):
+                    failures.append((number, f'invalid signature of player {user_id}'))
+                    break
+        except ValueError as e:
+            failures.append((number, f'malformed key or signature ({e})'))
+    return failures
+
+class ChainAuditor:
+    """
+    Streams a stored blockchain and checks it block by block.
+    The hash of the header, the Merkle root of the data, the PreviousHash link, the block number, the game code,
+    the signer, the openings of the commitments and the final string are checked while streaming; block and player signatures are verified in batches by a
+    pool of processes, with a bounded number of batches in flight.
+    # Attributes
+        _path: string
+            The blockchain directory.
+        _workers: int
+            The number of processes verifying the signatures, 1 to verify them in the calling process.
+    """
+
+    __slots__ = ['_path', '_workers', '_blocks', '_signatures', '_first_bad']
+
+    def __init__(self, path, workers: int = None):
+        self._path = path
+        self._workers = workers or os.cpu_count() or 1
+        self._blocks = 0
+        self._signatures = 0
+        self._first_bad = None
+
+    def __fail(self, number, reason):
+        if self._first_bad is None or number < self._first_bad[0]:
+            self._first_bad = (number, reason)
+
+    def __collect(self, result):
+        for number, reason in result:
+            self.__fail(number, reason)
+
+    def audit(self):
+        """
+        Verify the whole chain.
+        # Returns
+            dict
+                The number of verified blocks and signatures, the elapsed time, the throughput
+                and the first bad block as (block number, reason), None if the chain is valid.
+        """
+        start = time.perf_counter()
+        log = SegmentLog(os.path.join(self._path, 'log'))
+        executor = ProcessPoolExecutor(max_workers=self._workers) if self._workers > 1 else None
+        pending = deque()
+        batch = []
+        try:
+            for task in self.__stream(log):
+                batch.append(task)
+                if len(batch) < _batch_size:
+                    continue
+                self.__submit(executor, pending, batch)
+                batch = []
+                while len(pending) > _window or (pending and pending[0].done()):
+                    self.__collect(pending.popleft().result())
+                    if self._first_bad is not None:
+                        break
+                if self._first_bad is not None:
+                    break
+            # The blocks of the partial batch precede a block failed while streaming: their signatures are verified too
+            if batch:
+                self.__submit(executor, pending, batch)
+            # Every batch in flight precedes a block failed while streaming, its failures come first
+            while pending:
+                self.__collect(pending.popleft().result())
+        finally:
+            for future in pending:
+                future.cancel()
+            if executor is not None:
+                executor.shutdown(cancel_futures=True)
+            log.close()
+
+        elapsed = time.perf_counter() - start
+        return {
+            "blocks": self._blocks,
+            "signatures": self._signatures,
+            "seconds": elapsed,
+            "blocks_per_second": self._blocks / elapsed if elapsed > 0 else 0.0,
+            "first_bad_block": self._first_bad,
+        }
+
+    def __submit(self, executor, pending, batch):
+        if executor is None:
+            self.__collect(_verify_signatures(batch))
+        else:
+            pending.append(executor.submit(_verify_signatures, batch))
+
+    def __stream(self, log):
+        """
+        Check the blocks in order and yield the signature verification task of each valid block.
+        The stream stops at the first block failing a sequential check.
+        """
+        previous_hash = None
+        game_code = None
+        server_key = None
+        player_keys = {}
+        commitments = {}
+
+        for number, payload in enumerate(log):
+            try:
+                record = BlockRecord.from_bytes(payload)
+                header_string, lines = split_block_body(record.get_body_string())
+                header = parse_header(header_string)
+                data = dict(parse_data_line(line) for line in lines)
+            except (ValueError, SyntaxError, UnicodeDecodeError) as e:
+                self.__fail(number, f'malformed block ({e})')
+                return
+            self._blocks += 1
+
+            # the hash covers the header, the header commits to the data through its Merkle root
+            if compute_hash_from_data(header_string) != record.get_hash():
+                self.__fail(number, 'hash mismatch')
+                return
+            if compute_data_root(lines) != header.get('Data Root'):
+                self.__fail(number, 'data root mismatch')
+                return
+            if header.get('Block Number') != str(number):
+                self.__fail(number, 'wrong block number')
+                return
+
+            if number == 0:
+                if record.get_block_type() != 'pre_game':
+                    self.__fail(number, 'the first block is not a pre game block')
+                    return
+                game_code = header.get('Game Code')
+                server_key = header.get('Public Key')
+                player_keys = {user_id: entry['Public Key'] for user_id, entry in data.items()}
+            else:
+                if header.get('PreviousHash') != previous_hash:
+                    self.__fail(number, 'broken PreviousHash link')
+                    return
+                if header.get('Game Code') != game_code:
+                    self.__fail(number, 'wrong game code')
+                    return
+                signer = header.get('Public Key')
+                if signer != server_key and not (record.get_block_type() == 'dispute' and signer in player_keys.values()):
+                    self.__fail(number, 'block signed by an unknown key')
+                    return
+
+            player_signatures = []
+            for user_id, entry in data.items():
+                # the sala bingo takes part in the game with the server key, it is not in the pre game block
+                player_key = player_keys.get(user_id, server_key)
+                if 'Commitment' in entry:
+                    player_signatures.append((user_id, player_key, ''.join(entry['Parameter']) + entry['Commitment'], entry['Player Signature']))
+                    if record.get_block_type() == 'commit':
+                        commitments[user_id] = entry['Commitment']
+                elif 'Winner' in entry:
+                    if entry['Game Code'] != game_code:
+                        self.__fail(number, f'wrong game code in the data of player {user_id}')
+                        return
+                    player_signatures.append((user_id, player_key, entry['Winner'] + entry['Game Code'], entry['Player Signature']))
+                elif 'Reveal' in entry and record.get_block_type() == 'reveal':
+                    if hash_concat_data_and_known_rand(entry['Reveal'], entry['Randomness']) != commitments.get(user_id):
+                        self.__fail(number, f'opening of player {user_id} does not match its commitment')
+                        return
+
+            if record.get_block_type() == 'reveal' and 'Final String' in header:
+                # the contributions are concatenated in the numeric order of the player ids
+                contributions = ''.join(data[user_id]['Reveal'] for user_id in sorted(data, key=int))
+                if compute_hash_from_data(contributions) != header['Final String']:
+                    self.__fail(number, 'the final string does not match the openings')
+                    return
+
+            self._signatures += 1 + len(player_signatures)
+            previous_hash = record.get_hash()
+            yield (number, header.get('Public Key'), record.get_hash(), record.get_signature_string(), player_signatures)
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Verify stored blockchains: hashes, links, game codes and signatures.")
+    parser.add_argument("path", nargs="?", default="Application/Blockchain", help="the directory of a game chain, or the blockchain root to audit every game")
+    parser.add_argument("-w", "--workers", type=int, default=None, help="processes verifying the signatures (default: number of CPUs)")
+    args = parser.parse_args(argv)
+
+    if os.path.isdir(os.path.join(args.path, 'log')):
+        chains = [args.path]
+    elif os.path.isdir(args.path):
+        chains = sorted(os.path.join(args.path, name) for name in os.listdir(args.path) if os.path.isdir(os.path.join(args.path, name, 'log')))
+    else:
+        chains = []
+    if len(chains) == 0:
+        print(f"No blockchain log in {args.path}")
+        return 2
+
+    status = 0
+    for chain in chains:
+        report = ChainAuditor(chain, args.workers).audit()
+        print(f"Chain: {chain}")
+        print(f"Blocks verified: {report['blocks']}")
+        print(f"Signatures verified: {report['signatures']}")
+        print(f"Time: {report['seconds']:.3f} s ({report['blocks_per_second']:.0f} blocks/s)")
+        if report["first_bad_block"] is None:
+            print("The blockchain is valid")
+        else:
+            number, reason = report["first_bad_block"]
+            print(f"First bad block: {number} ({reason})")
+            status = 1
+    return status
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,94 @@
+import os
+import tempfile
+from audit import ChainAuditor
+from blocks import BlockRecord, split_block_body
+from segment_log import SegmentLog
+from utils.hash_util import compute_hash_from_data
+from utils.keys_util import sign_ECDSA_bytes, load_private_key
+from blockchain_test_util import write_game
+
+def resign(record, body, private_key_file):
+    """
+    Returns the record with a new body, hashed and signed again with the server key.
+    """
+    hash = compute_hash_from_data(split_block_body(body)[0])
+    signature = sign_ECDSA_bytes(load_private_key(private_key_file), hash.encode()).hex()
+    return BlockRecord(record.get_block_type(), body, hash, signature)
+
+def tamper(directory, target, changes):
+    """
+    Copy a stored chain replacing some of its blocks.
+    # Arguments
+        changes: dict
+            key: block number, value: function from the BlockRecord to the tampered BlockRecord.
+    # Returns
+        The directory of the tampered copy.
+    """
+    source = SegmentLog(os.path.join(directory, 'log'))
+    copy = SegmentLog(os.path.join(target, 'log'))
+    try:
+        for number, payload in enumerate(source):
+            if number in changes:
+                payload = changes[number](BlockRecord.from_bytes(payload)).to_bytes()
+            copy.append(payload)
+    finally:
+        source.close()
+        copy.close()
+    return target
+
+def stored_signature(directory, number):
+    """
+    Returns the signature of a stored block, a valid signature on another hash.
+    """
+    log = SegmentLog(os.path.join(directory, 'log'))
+    try:
+        return BlockRecord.from_bytes(log.get(number)).get_signature_string()
+    finally:
+        log.close()
+
+def first_bad_block(path, workers=1):
+    return ChainAuditor(path, workers).audit()['first_bad_block']
+
+def test_a_valid_chain_is_accepted():
+    with tempfile.TemporaryDirectory() as folder:
+        directory, _ = write_game(folder, 'audit1', 3)
+        report = ChainAuditor(directory, 1).audit()
+        assert report['first_bad_block'] is None
+        assert report['blocks'] == 7
+        # a block signature and three player signatures for every commit block
+        assert report['signatures'] == 7 + 3 * 3
+
+def test_tampered_chains_report_the_first_bad_block():
+    with tempfile.TemporaryDirectory() as folder:
+        directory, server_key = write_game(folder, 'audit2', 3)
+        other_signature = lambda record: BlockRecord(record.get_block_type(), record.get_body_string(), record.get_hash(), stored_signature(directory, 1))
+        data_line = lambda record: BlockRecord(record.get_block_type(), record.get_body_string().replace('Reveal: ', 'Reveal: 0', 1), record.get_hash(), record.get_signature_string())
+        link = lambda record: resign(record, record.get_body_string().replace('PreviousHash: ', 'PreviousHash: 0', 1), server_key)
+        final_string = lambda record: resign(record, record.get_body_string().replace('Final String: ', 'Final String: 0', 1), server_key)
+
+        cases = [
+            ({3: other_signature}, (3, 'invalid block signature')),
+            ({4: data_line}, (4, 'data root mismatch')),
+            ({5: link}, (5, 'broken PreviousHash link')),
+            ({6: final_string}, (6, 'the final string does not match the openings')),
+        ]
+        for index, (changes, expected) in enumerate(cases):
+            copy = tamper(directory, os.path.join(folder, f'tampered{index}'), changes)
+            assert first_bad_block(copy) == expected
+            assert first_bad_block(copy, workers=2) == expected
+
+def test_a_bad_signature_before_a_sequential_failure_is_reported_first():
+    with tempfile.TemporaryDirectory() as folder:
+        directory, server_key = write_game(folder, 'audit3', 3)
+        bad_signature = lambda record: BlockRecord(record.get_block_type(), record.get_body_string(), record.get_hash(), stored_signature(directory, 1))
+        bad_hash = lambda record: BlockRecord(record.get_block_type(), record.get_body_string(), '0' * 64, record.get_signature_string())
+        copy = tamper(directory, os.path.join(folder, 'tampered'), {2: bad_signature, 5: bad_hash})
+        # the signature of block 2 is still in the partial batch when block 5 fails
+        assert first_bad_block(copy) == (2, 'invalid block signature')
+        assert first_bad_block(copy, workers=2) == (2, 'invalid block signature')
+
+if __name__ == "__main__":
+    test_a_valid_chain_is_accepted()
+    test_tampered_chains_report_the_first_bad_block()
+    test_a_bad_signature_before_a_sequential_failure_is_reported_first()
+    print("Audit tests passed")
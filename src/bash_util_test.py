@@ -0,0 +1,83 @@
+import os
+import signal
+import subprocess
+import tempfile
+import threading
+import utils.bash_util as BU
+
+def test_the_output_ends_at_the_sentinel():
+    pool = BU.CommandPool(1)
+    try:
+        assert pool.execute("printf 'a\\nb\\n'") == b'a\nb\n'
+        # an output without a final newline is not merged with the sentinel line
+        assert pool.execute("printf 'no newline'") == b'no newline'
+        assert pool.execute("true") == b''
+        # a line looking like a sentinel of another worker is part of the output
+        assert pool.execute("echo __worker_0__ 1") == b'__worker_0__ 1\n'
+        assert pool.stats()["spawns"] == 1
+    finally:
+        pool.close()
+
+def test_the_exit_status_is_propagated():
+    pool = BU.CommandPool(1)
+    try:
+        try:
+            pool.execute("echo failed; (exit 3)")
+            assert False, "the command should fail"
+        except subprocess.CalledProcessError as e:
+            assert e.returncode == 3
+            assert e.output == b'failed\n'
+        # a failed command does not cost the worker
+        assert pool.execute("echo alive") == b'alive\n'
+        assert pool.stats() == {"commands": 2, "spawns": 1, "restarts": 0, "spawns_saved": 1}
+    finally:
+        pool.close()
+
+def test_a_worker_killed_while_idle_is_replaced():
+    pool = BU.CommandPool(1)
+    try:
+        pool.execute("true")
+        worker = pool._idle[0]
+        worker._process.send_signal(signal.SIGKILL)
+        worker._process.wait()
+        # the command never reached the dead worker: it runs on a fresh one
+        assert pool.execute("echo fresh") == b'fresh\n'
+        assert pool.stats()["restarts"] == 1
+    finally:
+        pool.close()
+
+def test_a_worker_killed_by_its_command_does_not_run_it_again():
+    pool = BU.CommandPool(1)
+    try:
+        with tempfile.TemporaryDirectory() as folder:
+            log = os.path.join(folder, 'log')
+            try:
+                pool.execute(f"echo run >> {log}; kill -9 $$")
+                assert False, "the worker should be lost"
+            except ChildProcessError:
+                pass
+            with open(log) as f:
+                assert f.read() == 'run\n'
+        assert pool.stats()["restarts"] == 1
+        # the slot of the lost worker is free again
+        assert pool.execute("echo next") == b'next\n'
+    finally:
+        pool.close()
+
+def test_direct_executions_are_counted_across_threads():
+    BU.disable_command_pool()
+    before = BU.command_stats()["direct_executions"]
+    threads = [threading.Thread(target=lambda: [BU.execute_command("true") for _ in range(10)]) for _ in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert BU.command_stats()["direct_executions"] == before + 40
+
+if __name__ == "__main__":
+    test_the_output_ends_at_the_sentinel()
+    test_the_exit_status_is_propagated()
+    test_a_worker_killed_while_idle_is_replaced()
+    test_a_worker_killed_by_its_command_does_not_run_it_again()
+    test_direct_executions_are_counted_across_threads()
+    print("Bash util tests passed")
@@ -1,24 +1,84 @@
-import datetime
 from participant import Participant
 from utils.bash_util import execute_command
 from utils.commands_util import commands
 from utils.pseudorandom_util import hash_concat_data_and_known_rand
-from utils.certificates_util import extract_public_key
-from merkle import verify_proof
-from utils.keys_util import verify_ECDSA, gen_ECDSA_keys, sign_ECDSA, concatenate
-from utils.hash_util import compute_hash_from_data
-from utils.pseudorandom_util import rand_extract
+from utils.certificates_util import GPCertificate, TrustStore
+from merkle import verify_multiproof
+from utils.keys_util import verify_ECDSA, gen_ECDSA_keys, sign_ECDSA, concatenate, sign_ECDSA_from_variable, verify_ECDSA_from_variable, verify_ECDSA_bytes, sign_ECDSA_bytes, read_signature, write_signature, load_private_key
+from utils.hash_util import ConcatenationHash, Transcript
 from blockchain import Blockchain
+from concurrent.futures import ProcessPoolExecutor
+import multiprocessing
 import random
 import os
 
+# Below this number of messages a batch is verified in the calling process,
+# the cost of shipping the tasks to the workers would exceed the gain.
+_parallel_batch_threshold = 32
+
+def _verify_and_acknowledge(task):
+    """
+    Verify the signature of a player on its commit message and, if it is valid,
+    sign the acknowledgement of the sala bingo. It runs in the worker processes.
+    # Arguments
+        task: tuple
+            (player public key, commit message, player signature, bingo private key, acknowledgement file)
+    # Returns
+        string
+            The acknowledgement file, None if the signature of the player is not valid.
+    """
+    PK, concat, signature, SK, ack_file = task
+    if verify_ECDSA_from_variable(PK, concat, signature):
+        sign_ECDSA_from_variable(SK, concat + signature, ack_file)
+        return ack_file
+    return None
+
+class PlayerSlot:
+    """
+    The state of a player of the table, the sala bingo included.
+    The slot is created once, when the player is admitted, and its fields are
+    overwritten in every round.
+    # Attributes
+        id: string
+            The id of the player.
+        auth_id: int
+            The authentication id of the GP of the player.
+        BC_PK: string
+            The public key of the player for the game.
+        params: tuple
+            The parameters of the commit message of the round.
+        commitment: string
+            The commitment of the round.
+        signature: string
+            The signature of the player on the commit message.
+        concat: string
+            The concatenation of the parameters and the commitment.
+        contribution: string
+            The opened contribution of the round.
+        randomness: string
+            The randomness opening the commitment.
+    """
+
+    __slots__ = ['id', 'auth_id', 'BC_PK', 'params', 'commitment', 'signature', 'concat', 'contribution', 'randomness']
+
+    def __init__(self, id, auth_id = None):
+        self.id = id
+        self.auth_id = auth_id
+        self.BC_PK = None
+        self.params = None
+        self.commitment = None
+        self.signature = None
+        self.concat = None
+        self.contribution = None
+        self.randomness = None
+
 class Bingo(Participant):
     
     """ 
     This class represents the sala bingo.
     """
     
-    __slots__ = ['_known_CAs', '_GPs', '_SK', '_PK', '_final_string', '_blockchain', '_players_info', '_last_id', '_last_auth_id','_current_commitment_block','_current_opening_block', '_winner_id', '_folder']
+    __slots__ = ['_known_CAs', '_GPs', '_SK', '_PK', '_final_string', '_blockchain', '_slots', '_last_id', '_last_auth_id', '_winner_id', '_folder', '_executor', '_publications', '_transcript', '_absorbed', '_openings_valid', '_final_hash']
     
     def __init__(self, folder):
         Participant.__init__(self)
@@ -26,19 +86,24 @@ class Bingo(Participant):
         self._blockchain = None
         execute_command(commands["create_directory"](self._folder))
         execute_command(commands["copy_cert"](folder+"/AS/auto_certificate.cert", self._folder+"AS.cert"))
-        self._known_CAs = [self._folder+"AS.cert"]
+        self._known_CAs = TrustStore()
+        self._known_CAs.add(self._folder+"AS.cert")
         self._GPs = {}
-        self._players_info = {}
+        self._slots = [] # PlayerSlot of the player with id i at index i, the order of the publications
         self._final_string = None
         gen_ECDSA_keys("prime256v1", self._folder+"params.pem", self._folder+"private_key.pem", self._folder+"public_key.pem")
         self._SK = self._folder+"private_key.pem"
         self._PK = self._folder+"public_key.pem"
         self._last_id = 0
         self._last_auth_id = 0
-        self._current_commitment_block = None
-        self._current_opening_block = None
+        self._publications = {} # phase -> publication of the current round
+        self._transcript = Transcript("commitments") # messages of the current round, in the order of the slots
+        self._absorbed = 0 # slots absorbed in the transcript in the current phase
+        self._openings_valid = True
+        self._final_hash = ConcatenationHash() # contributions of the current round, in the order of the slots
         self._winner_id = None
         self._game_code = str(os.urandom(16).hex())
+        self._executor = None
         
     def get_folder(self):
         """
@@ -70,7 +135,7 @@ class Bingo(Participant):
         """
         if self._blockchain is not None:
             raise Exception("Blockchain is already present")
-        self._blockchain = Blockchain(self._PK,self._SK)
+        self._blockchain = Blockchain(self._PK, self._SK, self._game_code)
         
     def add_pre_game_block(self):
         """ 
@@ -79,12 +144,13 @@ class Bingo(Participant):
         # Returns
             list of tuples (id_player, path_PK)
         """
-        if len(self._players_info) == 0:
+        if len(self._slots) == 0:
             raise Exception("No players info")
         
         data = {}
-        for id in self._players_info.keys():
-            data[id] = self._players_info[id]['BC_PK']
+        for slot in self._slots:
+            if slot.id != self._player_id:
+                data[slot.id] = slot.BC_PK
         
         self._blockchain.add_block('pre_game', self._game_code, data)
         
@@ -108,95 +174,54 @@ class Bingo(Participant):
 
         return self._PK
         
-    def __check_CA(self, GP_cert, CA_cert):
-        """ 
-        Check if the CA is known.
-        # Arguments
-            GP_cert: string
-                The name of the GP certificate file.
-            CA_cert: string
-                The name of the CA certificate file.
-        # Returns
-            boolean
-                True if the CA is known, False otherwise.
+    def add_known_CA(self, CA_cert):
         """
-
-        issuer = execute_command(commands["cert_extract_issuer"](GP_cert))
-        subject = execute_command(commands["cert_extract_subject"](CA_cert))
-
-        [execute_command(commands["cert_extract_subject"](CA)) for CA in self._known_CAs]
-        return issuer == subject
-        
-    def __check_sign(self, GP_cert, AS_cert):
-        """ 
-        Check if the sign is valid.
+        Trust an additional CA (e.g. the AS of another region) for the GPs.
         # Arguments
-            GP_cert: string
-                The name of the GP certificate file.
-            CA_cert: string 
+            CA_cert: string
                 The name of the CA certificate file.
-        # Returns   
-            boolean
-                True if the sign is valid, False otherwise.
         """
-
-        #return True
-        res = execute_command(commands["validate_certificate"](AS_cert, GP_cert)).split(" ")[1].replace("\n", "").replace(" ", "")
-        return True if res == "OK" else False
-    
-    def __check_expiration(self, GP_cert):
-        """ 
-        Check if the GP is expired.
-        # Arguments
-            GP_cert: string
-                The name of the GP certificate file.
-        # Returns
-            boolean
-                True if the GP is not expired, False otherwise.
-        """
-
-        expiration_date = execute_command(commands["cert_extract_expiration_date"](GP_cert)).split("=")[1]
-        expiration_date = datetime.datetime.strptime(expiration_date.removesuffix("\n"), "%b %d %H:%M:%S %Y %Z")
-        current_date = datetime.datetime.now()
-        days_left = (expiration_date - current_date).days
-
-        return True if days_left > 0 else False
+        self._known_CAs.add(CA_cert)
     
     def receive_GP(self, GP):
         """ 
         Receive the GP from the user.
+        The certificate is parsed once, the parsed GP is kept for the validation
+        of the clear fields and for the mapping of the player.
         # Arguments
             GP: string
                 The name of the GP certificate file.
         # Returns
-            boolean
-                True if the GP is valid, False otherwise.
+            int
+                The authentication id if the GP is valid, None otherwise.
         """
         if GP is None:
             raise Exception("GP is None")
 
-        if self.__check_CA(GP, self._known_CAs[0]) and self.__check_expiration(GP) and self.__check_sign(GP, self._known_CAs[0]):
+        try:
+            GP = GPCertificate(GP)
+        except ValueError:
+            return None
+
+        # the issuer must be a known CA, the GP must not be expired and the sign must be valid
+        if self._known_CAs.validate(GP):
             self._last_auth_id += 1
-            # self._GPs.append(GP
             self._GPs[self._last_auth_id] = GP
             return self._last_auth_id
         return None
     
-    def __extract_root(self, GP_cert):
+    def __extract_root(self, GP):
         """
         Extract the root from the GP certificate.
         # Arguments
-            GP_cert: string
-                The name of the GP certificate file.
+            GP: GPCertificate
+                The GP certificate.
         # Returns
             string
                 The root of the GP certificate.
         """
 
-        text = execute_command(commands["cert_extract_merkle_root"](GP_cert))
-        
-        # find the 'X509v3 Subject Alternative Name:' string and extract the root
-        return text.split("X509v3 Subject Alternative Name:")[1].split("DNS:")[1].split("\n")[0].encode('utf-8').decode('unicode_escape')
+        return GP.get_merkle_root()
 
     def __validate_clear_fields(self, policy, clear_fields, proofs, indices, auth_id):
         """
@@ -207,8 +232,8 @@ class Bingo(Participant):
                 The policy of the DPA.
             clear_fields: dict
                 The clear fields sent by the user. key: field name, value: (value, randomness)
-            proofs: dict
-                The merkle proofs of the clear fields. key: field name, value: list of hashes
+            proofs: tuple
+                The merkle multiproof of the clear fields (number of leaves, list of hashes).
             indices: dict
                 The indices of the clear fields.
         # Returns
@@ -234,15 +259,17 @@ class Bingo(Participant):
             # append the hashed value of the concatenation between the value and the randomness
             leaves[key] = hash_concat_data_and_known_rand(value[0],value[1])
             
-        # check for the proofs of the clear fields
-        for key, value in proofs.items():
-            res = verify_proof(root, value, leaves[key], indices[key])
-            if not res:
-                print("Proofs are not valid")
-                raise Exception("Invalid proof")
+        # every field of the policy has its own leaf: a missing or shared index is rejected,
+        # a shared index would leave one of the fields unchecked
+        if any(key not in indices or not isinstance(indices[key], int) for key in policy) or len({indices[key] for key in policy}) != len(policy):
+            raise Exception("Policy and indices have different keys")
+
+        # check the multiproof of the clear fields against the root of the GP
+        if not verify_multiproof(root, proofs, {indices[key]: leaves[key] for key in policy}):
+            print("Proofs are not valid")
+            raise Exception("Invalid proof")
             
-        self._players_info[str(self._last_id)] = {}
-        self._players_info[str(self._last_id)]['auth_id'] = auth_id
+        self._slots.append(PlayerSlot(str(self._last_id), auth_id))
         
         return self.__init_player()
 
@@ -254,8 +281,8 @@ class Bingo(Participant):
                 The policy of the DPA.
             clear_fields: dict
                 The clear fields sent by the user. key: field name, value: (value, randomness)
-            proofs: dict
-                The merkle proofs of the clear fields. key: field name, value: list of hashes
+            proofs: tuple
+                The merkle multiproof of the clear fields (number of leaves, list of hashes).
             indices: dict
                 The indices of the clear fields.
         # Returns
@@ -277,14 +304,88 @@ class Bingo(Participant):
         # Inizializzo la PRF per il calcolo dei contributi casuali
         self._player_id = str(self._last_id)
         self._last_id += 1
+        self._slots.append(PlayerSlot(self._player_id))
          
         #self._round = 0
         
-        self._IV = int(rand_extract(self._security_param, "hex"), 32) # Cast to a 32-bit integer cause it's used as a counter
-        self._seed = rand_extract(self._security_param, "base64")
+        self._init_PRF()
         
         #super().generate_message(self._SK, "Bingo")
         
+    def __slot(self, id):
+        """
+        Returns the PlayerSlot of a player.
+        # Arguments
+            id: string
+                The id of the player.
+        # Raises
+            ValueError: If the id is not the decimal id of a player of the table.
+        """
+        index = int(id) if isinstance(id, str) and id.isdecimal() else -1
+        # "01" or " 1" would reach the slot of "1" with another name
+        if not 0 <= index < len(self._slots) or str(index) != id:
+            raise ValueError("Unknown player id")
+        return self._slots[index]
+
+    def __commitment_task(self, params, commitment, signature, ack_file):
+        """
+        Returns the slot of the sender of a commit message and the task verifying its signature,
+        nothing is stored before the signature is verified.
+        # Raises
+            ValueError: If the message is not from a player of the table.
+        """
+        if params[0] == self._player_id:
+            raise ValueError("Commit message with the id of the sala bingo")
+        slot = self.__slot(params[0])
+        return slot, (slot.BC_PK, concatenate(*params, commitment), signature, self._SK, ack_file)
+
+    def __store_commitment(self, slot, params, commitment, signature, concat):
+        """
+        Store the verified commit message of a player.
+        """
+        slot.params = params
+        slot.commitment = commitment
+        slot.signature = signature
+        slot.concat = concat
+        self.__absorb_commitments()
+
+    def __absorb_commitments(self):
+        """
+        Absorb in the transcript the commit messages arrived, in the order of the slots:
+        a message arrived early waits for the ones of the previous slots.
+        """
+        while self._absorbed < len(self._slots) and self._slots[self._absorbed].commitment is not None:
+            slot = self._slots[self._absorbed]
+            self._transcript.absorb(*slot.params, slot.commitment)
+            self._absorbed += 1
+
+    def __absorb_openings(self):
+        """
+        Absorb in the transcript the openings arrived, in the order of the slots,
+        and check that each of them opens the commitment of its player.
+        The contributions feed the hash of the final string in the same order: the openings
+        arrived early stay in their slots until the previous ones arrive, and the final string
+        is ready as soon as the last opening is absorbed.
+        """
+        while self._absorbed < len(self._slots) and self._slots[self._absorbed].contribution is not None:
+            slot = self._slots[self._absorbed]
+            self._transcript.absorb(slot.contribution, slot.randomness)
+            self._final_hash.update(slot.contribution)
+            if slot.commitment != hash_concat_data_and_known_rand(slot.contribution, slot.randomness):
+                self._openings_valid = False
+            self._absorbed += 1
+        if self._absorbed == len(self._slots) and self._openings_valid:
+            self._final_string = self._final_hash.hexdigest()
+
+    def __sign_transcript(self, signature_file):
+        """
+        Sign the digest of the transcript.
+        # Arguments
+            signature_file: string
+                The file to store the signature in.
+        """
+        write_signature(sign_ECDSA_bytes(load_private_key(self._SK), self._transcript.digest()), signature_file)
+
     def receive_commitment(self, params, commitment, signature):
         """ 
         The sala bingo receives the commitment, the signature and the 
@@ -303,173 +404,179 @@ class Bingo(Participant):
             signature: string
                 The signature of the sala bingo on the additional parameters and the commitment.
         """
-        # concatenate params and commitment
-        id = params[0][0]
-        concat = concatenate(*params, commitment)
-        self._players_info[id]["params"] = params
-        self._players_info[id]["commitment"] = commitment
-        self._players_info[id]["signature"] = signature
-        self._players_info[id]["concat_1"] = concat
-
         # verify the signature of the user on the commitment and the additional parameters
-        # using the PK contained in the GP certificate
-        extract_public_key(self._GPs[self._players_info[id]['auth_id']], self._folder+"GP_PK.pem")
-        with open(self._folder+"concat.txt", "w") as f:
-            f.write(concat)
-        if verify_ECDSA(self._players_info[id]["BC_PK"], self._folder+"concat.txt", signature):
-            # compute the signature of the sala bingo on all of them
-            concat += signature
-            with open(self._folder+"concat.txt", "w") as f:
-                f.write(concat)
-            sign_ECDSA(self._SK, self._folder+"concat.txt", self._folder+"signature.pem")
-            return self._folder+"signature.pem"
-        return None
+        # using the PK mapped for the game, then sign all of them
+        try:
+            slot, task = self.__commitment_task(params, commitment, signature, self._folder+"signature.pem")
+        except ValueError:
+            return None
+        ack = _verify_and_acknowledge(task)
+        if ack is not None:
+            self.__store_commitment(slot, params, commitment, signature, task[1])
+        return ack
+
+    def receive_commitments_batch(self, messages):
+        """
+        The sala bingo receives the commit messages of all the players of the round
+        and verifies them in parallel on a pool of worker processes.
+        # Arguments
+            messages: list
+                The list of (params, commitment, signature) messages.
+        # Returns
+            acks: dict
+                key: player id, value: the signature of the sala bingo on the message
+                of the player, None if the message is rejected.
+        """
+        acks = {}
+        accepted = []
+        tasks = []
+        for params, commitment, signature in messages:
+            try:
+                slot, task = self.__commitment_task(params, commitment, signature, self._folder+"ack_"+params[0]+".pem")
+            except ValueError:
+                acks[params[0]] = None
+                continue
+            accepted.append((slot, params, commitment, signature))
+            tasks.append(task)
+
+        workers = os.cpu_count() or 1
+        if workers > 1 and len(tasks) >= _parallel_batch_threshold:
+            if self._executor is None:
+                # the batch arrives from the threads of the round coordinator: the workers are
+                # spawned, forking a multithreaded process could copy a lock held by another thread
+                self._executor = ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context("spawn"))
+            results = self._executor.map(_verify_and_acknowledge, tasks, chunksize=max(1, len(tasks) // (4 * workers)))
+        else:
+            results = map(_verify_and_acknowledge, tasks)
+
+        for (slot, params, commitment, signature), task, ack in zip(accepted, tasks, results):
+            if ack is not None:
+                self.__store_commitment(slot, params, commitment, signature, task[1])
+            acks[params[0]] = ack
+        return acks
             
+    def next_round(self):
+        """
+        Go to next round, the publications of the ended round are dropped.
+        """
+        Participant.next_round(self)
+        self._publications.clear()
+        self._transcript = Transcript("commitments")
+        self._absorbed = 0
+        self._openings_valid = True
+        self._final_hash = ConcatenationHash()
+        for slot in self._slots:
+            slot.commitment = slot.contribution = slot.randomness = None
+
     def publish_commitments_and_signature(self):
         """ 
         Once it has received all the commitments, the sala bingo publishes
         them and its signature on them.
+        The publication is computed once per round, the same immutable object
+        is returned to every player asking for it.
         
         # Returns
-            commitments: list
-                The list of (params, commitment).
+            commitments: tuple
+                The tuple of (params, commitment).
             signature: string
-                The signature of the sala bingo on the concatenation between the params
-                and the commitment.
+                The signature of the sala bingo on the digest of the transcript of the params
+                and the commitments.
         """
+        publication = self._publications.get('commit')
+        if publication is not None:
+            return publication
 
         # the server adds its own paramsa, commitment and signature
-        self._players_info[str(self._player_id)] = {}
-        self._players_info[str(self._player_id)]["params"] = self._last_message[0]
-        self._players_info[str(self._player_id)]["commitment"] = self._last_message[1]
-        self._players_info[str(self._player_id)]["signature"] = self._last_message[2]
-        
-        concat = concatenate(*self._last_message[0], self._last_message[1])
-        self._players_info[str(self._player_id)]["concat_1"] = concat
-        
-        concat = ""
-        ids = list(self._players_info.keys())
-        ids.sort()
-        
-        for id in ids:
-            concat += self._players_info[id]["concat_1"]# params + commitment
+        slot = self.__slot(self._player_id)
+        slot.params, slot.commitment, slot.signature = self._last_message
+        slot.concat = concatenate(*slot.params, slot.commitment)
+        self.__absorb_commitments()
+        if self._absorbed != len(self._slots):
+            raise Exception("Commitments missing.")
 
-        with open(self._folder+"concat.txt", "w") as f:
-            f.write(concat) 
-
-        sign_ECDSA(self._SK, self._folder+"concat.txt", self._folder+"signature.pem")
-        
-        pairs = []
-
-        for id in ids:
-            pairs.append((self._players_info[id]["params"], self._players_info[id]["commitment"]))
-        
         if self._blockchain is not None:
             # send commit block
             # dict {player_id: (commitment, params, signature_path)}
             data = {}
-            for id in self._players_info.keys():
-                data[id] = (self._players_info[id]["params"], self._players_info[id]["commitment"], self._players_info[id]["signature"])
-            if self._current_opening_block is not None:
-                self._current_opening_block = None
-            if self._current_commitment_block is None:
-                self._current_commitment_block = self._blockchain.add_block('commit', self._game_code, data)
-            return self._current_commitment_block, ""
+            for slot in self._slots:
+                data[slot.id] = (slot.params, slot.commitment, slot.signature)
+            publication = (self._blockchain.add_block('commit', self._game_code, data), "")
         else:
-            return pairs, self._folder+"signature.pem"
+            # the signature is on the digest of the transcript of the params and the commitments;
+            # each phase has its own signature file, a later signature doesn't overwrite a published one
+            self.__sign_transcript(self._folder+"commitments_signature.pem")
+            pairs = tuple((slot.params, slot.commitment) for slot in self._slots)
+            publication = (pairs, self._folder+"commitments_signature.pem")
+
+        # the openings follow the commitments in the transcript; the opening of the sala bingo,
+        # in the last slot, is stored now and published with the ones of the players
+        self._transcript.absorb("openings")
+        self._absorbed = 0
+        slot.contribution = self._last_contribute
+        slot.randomness = self._last_randomess
+        self.__absorb_openings()
+
+        self._publications['commit'] = publication
+        return publication
     
     def receive_opening(self, id, contribution, randomness):
         """ 
         The sala bingo receives the opening from the user.
-        """
-        # append the opening to the list of openings
-        self._players_info[id]["opening"] = {"contribution": contribution, "randomness": randomness}
-        
-    def __compute_final_string(self):
-        """
-        Compute the final string based on the concatenation of all the openings.
-
-        # Returns
-            string
-                The final string.
-        """
-        # hash the concatenation of all the openings
-        concat = ""
-        ids = list(self._players_info.keys())
-        ids.sort()
-        
-        for id in ids:
-            concat += self._players_info[id]["opening"]["contribution"]
-        
-        return compute_hash_from_data(concat)
-
-    def __verify_commitments(self):
-        """
-        Verify the commitments received from the user.
+        Only the first opening of a player in a round is kept: it may already be in the
+        transcript and in the final string.
         # Returns
-            boolean
-                True if the commitments are valid, False otherwise.
+            bool
+                True if the opening is stored, False if the player already sent one.
         """
-        # verify the commitments
-        
-        ids = list(self._players_info.keys())
-        ids.sort()
-        for id in ids:
-            if self._players_info[id]["commitment"] != hash_concat_data_and_known_rand(self._players_info[id]["opening"]["contribution"], self._players_info[id]["opening"]["randomness"]):
-                return False
-
+        # append the opening to the list of openings
+        slot = self.__slot(id)
+        if slot.contribution is not None:
+            return False
+        slot.contribution = contribution
+        slot.randomness = randomness
+        if 'commit' in self._publications:
+            self.__absorb_openings()
         return True
-
+        
     def publish_openings(self):
         """ 
-        Once received all the openings, the sala bingo computes the
-        final string and publishes the openings as (message, randomness) 
-        pairs.
-        In addition it computed and returns the signature on the concatenation
+        Once received all the openings, the sala bingo publishes the openings
+        as (message, randomness) pairs; the final string is already computed,
+        when the last opening has been received.
+        In addition it computed and returns the signature on the transcript
         of all the commitments and the opensings.   
+        The publication is computed once per round, the same immutable object
+        is returned to every player asking for it.
         # Returns
-            openings: list
-                The list of (message, randomness) pairs.
+            openings: tuple
+                The tuple of (message, randomness) pairs.
             signature: string
-                The signature of the sala bingo on the concatenation of all the commitments
+                The signature of the sala bingo on the digest of the transcript of all the commitments
                 and the openings.
         """
-        self._players_info[str(self._player_id)]["opening"] = {"contribution": self._last_contribute, "randomness": self._last_randomess}
-        
-        openings = []
-        ids = list(self._players_info.keys())
-        ids.sort()
-        
-        for id in ids:
-            openings.append((self._players_info[id]["opening"]["contribution"], self._players_info[id]["opening"]["randomness"]))
-            
-        if self.__verify_commitments():
-            concat = ""
-            
-            ids = list(self._players_info.keys())
-            ids.sort()
-            for id in ids:
-                concat += self._players_info[id]["concat_1"]
-                concat += self._players_info[id]["opening"]["contribution"] + self._players_info[id]["opening"]["randomness"]
-                
-            with open(self._folder+"concat.txt", "w") as f:
-                f.write(concat)
-            sign_ECDSA(self._SK, self._folder+"concat.txt", self._folder+"signature.pem")
-            self._final_string = self.__compute_final_string()
+        publication = self._publications.get('reveal')
+        if publication is not None:
+            return publication
+
+        if self._absorbed != len(self._slots):
+            raise Exception("Openings missing.")
             
+        # the openings are checked against the commitments while they are absorbed
+        if self._openings_valid:
             if self._blockchain != None:
                 # send openings block
                 # dict {player_id: (randomness, contribution)}
                 data = {}
-                for id in self._players_info.keys():
-                    data[id] = (self._players_info[id]["opening"]["contribution"], self._players_info[id]["opening"]["randomness"])
-                if self._current_commitment_block is not None:
-                    self._current_commitment_block = None
-                if self._current_opening_block is None:
-                    self._current_opening_block = self._blockchain.add_block('reveal',self._game_code, data)
-                return self._current_opening_block , ""
+                for slot in self._slots:
+                    data[slot.id] = (slot.contribution, slot.randomness)
+                publication = (self._blockchain.add_block('reveal',self._game_code, data, header={'Final String': self._final_string}), "")
             else:
-                return openings, self._folder+"signature.pem"
+                self.__sign_transcript(self._folder+"openings_signature.pem")
+                openings = tuple((slot.contribution, slot.randomness) for slot in self._slots)
+                publication = (openings, self._folder+"openings_signature.pem")
+
+            self._publications['reveal'] = publication
+            return publication
         else:
             raise Exception("Commitments not valid.")
         
@@ -480,19 +587,16 @@ class Bingo(Participant):
         return self._final_string
     
     def receive_mapping(self, player_id, mapping):
-        # Verify signature with the original PK of the player
-        extract_public_key(self._GPs[self._players_info[player_id]['auth_id']],self._folder+"GP_PK.pem")
-        with open(self._folder+"concat.txt", "w") as f:
-            f.write(concatenate(*mapping[0]))
+        # Verify signature with the original PK of the player, contained in the GP certificate
+        slot = self.__slot(player_id)
+        GP_PK = self._GPs[slot.auth_id].get_public_key()
         
-        if verify_ECDSA(self._folder+"GP_PK.pem", self._folder+"concat.txt", mapping[1]):
+        if verify_ECDSA_bytes(GP_PK, concatenate(*mapping[0]).encode("utf-8"), read_signature(mapping[1])):
             # Verify that the mapping is valid, i.e. verify that signature
             # of the player on the mapping is correctly computed
             new_pk = mapping[0][0]
-            with open(self._folder+"concat.txt", "w") as f:
-                f.write('')
-            if verify_ECDSA(new_pk, self._folder+"concat.txt", mapping[0][1]):
-                self._players_info[player_id]["BC_PK"] = new_pk
+            if verify_ECDSA_from_variable(new_pk, '', mapping[0][1]):
+                slot.BC_PK = new_pk
                 
     def choose_winner(self):
         """
@@ -501,14 +605,13 @@ class Bingo(Participant):
             tuple: (winner_id, game_code, bingo_signature)
                 The id, the public key and the signature of the bingo on the winner.
         """
-        ids = list(self._players_info.keys())
-        self._winner_id = random.choice(ids)
+        self._winner_id = random.choice(self._slots).id
         
         concat = self._winner_id + self._game_code
         with open(self._folder+"concat.txt", "w") as f:
             f.write(concat)
             
-        sign_ECDSA(self._SK, self._folder+"concat.txt", self._folder+"signature.pem")
+        sign_ECDSA_from_variable(self._SK, concat, self._folder+"signature.pem")
 
         return (self._winner_id, self._folder+"signature.pem")
     
@@ -525,22 +628,28 @@ class Bingo(Participant):
         signs = list(*signs)
         signs.append((self._player_id, self._folder+"signature.pem"))
 
-        if len(signs) < len(self._players_info):
+        if len(signs) < len(self._slots):
             raise Exception("Not enough signatures")
         
-        self._players_info[self._player_id]["BC_PK"] = self._PK
+        self.__slot(self._player_id).BC_PK = self._PK
         
         sign_dict = {}
         for sign in signs:
-            print(self._players_info[sign[0]]["BC_PK"])
-            if not verify_ECDSA(self._players_info[sign[0]]["BC_PK"],self._folder+"concat.txt", sign[1]):
+            if not verify_ECDSA(self.__slot(sign[0]).BC_PK,self._folder+"concat.txt", sign[1]):
                 raise Exception("Invalid signature")
             sign_dict[sign[0]] = sign[1]
         
         data = {}
-        ids = list(self._players_info.keys())
-        for id in ids:
-            data[id] = (self._winner_id, self._game_code, sign_dict[id])
+        for slot in self._slots:
+            data[slot.id] = (self._winner_id, self._game_code, sign_dict[slot.id])
         
         self._blockchain.add_block('end_game', self._game_code, data)
+
+    def close(self):
+        """
+        Shut down the pool verifying the batches of commit messages, if it was started.
+        """
+        if self._executor is not None:
+            self._executor.shutdown()
+            self._executor = None
         
\ No newline at end of file
@@ -0,0 +1,151 @@
+import os
+from concurrent.futures import ThreadPoolExecutor
+from round_test import application, table
+from player import Player
+from AS import AS
+import AS_authentication as AS_util
+import bingo_authentication as bingo_util
+import bingo as bingo_module
+
+def tampered(message):
+    params, commitment, signature = message
+    return params, '0' * len(commitment), signature
+
+def single_acks(bingo, players, messages):
+    # the acknowledgements of receive_commitment share a file: each one is checked on arrival
+    return [None if ack is None else player.receive_signature(ack) for player, ack in
+            ((player, bingo.receive_commitment(*message)) for player, message in zip(players, messages))]
+
+def batch_acks(bingo, players, messages):
+    acks = bingo.receive_commitments_batch(messages)
+    return [None if acks[message[0][0]] is None else player.receive_signature(acks[message[0][0]]) for player, message in zip(players, messages)]
+
+def test_the_batch_matches_the_single_messages():
+    with application() as folder:
+        players, bingo = table(folder, count=3)
+        try:
+            messages = [player.send_commitment() for player in players]
+            messages[1] = tampered(messages[1])
+            expected = [True, None, True]
+            assert single_acks(bingo, players, messages) == expected
+            assert batch_acks(bingo, players, messages) == expected
+        finally:
+            bingo.close()
+
+def test_the_parallel_batch_runs_from_a_thread():
+    threshold, cpu_count = bingo_module._parallel_batch_threshold, os.cpu_count
+    bingo_module._parallel_batch_threshold = 1
+    os.cpu_count = lambda: 2
+    try:
+        with application() as folder:
+            players, bingo = table(folder, count=3)
+            try:
+                messages = [player.send_commitment() for player in players]
+                messages[2] = tampered(messages[2])
+                # the round coordinator sends the batch from one of its threads
+                with ThreadPoolExecutor(max_workers=1) as executor:
+                    acks = executor.submit(batch_acks, bingo, players, messages).result()
+                assert acks == [True, True, None]
+                assert bingo._executor is not None
+            finally:
+                bingo.close()
+            assert bingo._executor is None
+    finally:
+        bingo_module._parallel_batch_threshold = threshold
+        os.cpu_count = cpu_count
+
+def with_id(message, id):
+    params, commitment, signature = message
+    return (id,) + tuple(params[1:]), commitment, signature
+
+def test_messages_with_unknown_ids_are_rejected():
+    with application() as folder:
+        players, bingo = table(folder, count=2)
+        try:
+            message = players[0].send_commitment()
+            # the last slot is the one of the sala bingo
+            for id in ("-1", "2", "3", "01", " 0", "x", ""):
+                assert bingo.receive_commitment(*with_id(message, id)) is None
+                assert bingo.receive_commitments_batch([with_id(message, id)]) == {id: None}
+            assert all(slot.commitment is None for slot in bingo._slots)
+        finally:
+            bingo.close()
+
+def test_a_forged_message_is_not_stored():
+    with application() as folder:
+        players, bingo = table(folder, count=2)
+        try:
+            messages = [player.send_commitment() for player in players]
+            assert bingo.receive_commitment(*tampered(messages[0])) is None
+            assert bingo.receive_commitments_batch([tampered(messages[1])]) == {messages[1][0][0]: None}
+            assert all(slot.commitment is None for slot in bingo._slots)
+            bingo.generate_message(bingo._SK, bingo.get_folder())
+            try:
+                bingo.publish_commitments_and_signature()
+                assert False, "the commitments should be missing"
+            except Exception as e:
+                assert str(e) == "Commitments missing."
+        finally:
+            bingo.close()
+
+def test_the_slots_follow_the_numeric_order_of_the_ids():
+    with application() as folder:
+        players, bingo = table(folder, count=11)
+        try:
+            assert batch_acks(bingo, players, [player.send_commitment() for player in players]) == [True] * 11
+            bingo.generate_message(bingo._SK, bingo.get_folder())
+            pairs, _ = bingo.publish_commitments_and_signature()
+            # "10" comes after "2", the sala bingo is the last one
+            assert [params[0] for params, _ in pairs] == [str(id) for id in range(12)]
+        finally:
+            bingo.close()
+
+def test_clear_fields_without_their_own_index_are_rejected():
+    with application() as folder:
+        player = Player(["Player0", "IT", "F", "Rome", "1990-01-01", "CF0"], folder)
+        AS_util.authentication(player, AS(folder))
+        bingo = bingo_module.Bingo(folder)
+        player.set_auth_id(bingo_util.authentication(player, bingo))
+        policy = dict.fromkeys(["Nome", "Data di nascita"])
+        clear_fields, proofs, indices = player.send_clear_fields(policy)
+        missing = {key: index for key, index in indices.items() if key != "Nome"}
+        shared = {key: indices["Nome"] for key in indices}
+        for forged in (missing, shared, {**indices, "Nome": "0"}):
+            try:
+                bingo.receive_clear_fields(policy, clear_fields, proofs, forged, player.get_auth_id())
+                assert False, "the indices should be rejected"
+            except Exception as e:
+                assert str(e) == "Policy and indices have different keys"
+        assert bingo.receive_clear_fields(policy, clear_fields, proofs, indices, player.get_auth_id()) is not None
+
+def test_a_second_opening_is_ignored():
+    with application() as folder:
+        players, bingo = table(folder, count=3)
+        try:
+            bingo.generate_message(bingo._SK, bingo.get_folder())
+            messages = [player.send_commitment() for player in players]
+            assert batch_acks(bingo, players, messages) == [True, True, True]
+            openings = [player.send_opening() for player in players]
+            # the opening of the second player arrives first and waits for the one of the first player
+            assert bingo.receive_opening(*openings[1])
+            assert not bingo.receive_opening(openings[1][0], '0' * 32, '0' * 32)
+            bingo.publish_commitments_and_signature()
+            assert bingo.receive_opening(*openings[0]) and bingo.receive_opening(*openings[2])
+            final_string = bingo.get_final_string()
+            # the openings are absorbed: a later one would change what is published, not what is signed
+            assert not bingo.receive_opening(openings[0][0], '0' * 32, '0' * 32)
+            published, _ = bingo.publish_openings()
+            assert [tuple(pair) for pair in published[:3]] == [opening[1:] for opening in openings]
+            assert bingo.get_final_string() == final_string
+        finally:
+            bingo.close()
+
+if __name__ == "__main__":
+    test_the_batch_matches_the_single_messages()
+    test_the_parallel_batch_runs_from_a_thread()
+    test_messages_with_unknown_ids_are_rejected()
+    test_a_forged_message_is_not_stored()
+    test_the_slots_follow_the_numeric_order_of_the_ids()
+    test_clear_fields_without_their_own_index_are_rejected()
+    test_a_second_opening_is_ignored()
+    print("Bingo tests passed")
@@ -1,18 +1,23 @@
 import os
 import shutil
+import threading
 from pathlib import Path
 from blocks import *
+from segment_log import SegmentLog
 
 class Blockchain:
+    """
+    The blockchain of a single game.
+    Every chain is stored under its own directory, named after the game code, in the blockchain root,
+    and the open chains are registered by game code: many games can run in the same process
+    and creating a chain never touches the storage of the other games.
+    """
     __blockchain_directory_name = 'Application/Blockchain'
-    __blockchain_directory_path = Path.cwd() / __blockchain_directory_name
-    __blockchain_keys_directory_path = __blockchain_directory_path / 'keys'
-    __blockchain_signatures_directory_path = __blockchain_directory_path / 'signatures'
-    __blockchain_hash_directory_path = __blockchain_directory_path / 'hashes'
-    __blockchain_blocks_file = __blockchain_directory_path / 'blocks.txt'
-
-    __slots__ = ['__block_actions','__last_block', '__server_public_key_file', '__server_private_key_file', '__actual_public_key_file', '__actual_private_key_file', '__block_list']
-    def __init__(self, server_public_key_file, server_private_key_file):
+    __registry = {}
+    __registry_lock = threading.Lock()
+
+    __slots__ = ['__block_actions','__last_block', '__server_public_key_file', '__server_private_key_file', '__actual_public_key_file', '__actual_private_key_file', '__log', '__game_code', '__blockchain_directory_path', '__blockchain_keys_directory_path', '__blockchain_blocks_file', '__round', '__blocks_by_type', '__blocks_by_round', '__blocks_by_user', '__entry_record']
+    def __init__(self, server_public_key_file, server_private_key_file, game_code: str, root = None):
         
         self.__block_actions = {
             'pre_game': (self.__create_pre_game_block, self.__check_entry_pre_game),
@@ -21,58 +26,196 @@ class Blockchain:
             'dispute': (self.__create_dispute_block, self.__check_entry_dispute),
             'end_game': (self.__create_end_game_block, self.__check_entry_end_game),
         }
-        
-        shutil.rmtree(self.__blockchain_directory_path, ignore_errors=True)
-        os.makedirs(self.__blockchain_directory_path, exist_ok=True)
-        os.makedirs(self.__blockchain_hash_directory_path, exist_ok=True)
-        os.makedirs(self.__blockchain_keys_directory_path, exist_ok=True)
-        shutil.copy(server_public_key_file, self.__blockchain_keys_directory_path / 'server_public_key.pem')
-        shutil.copy(server_private_key_file, self.__blockchain_keys_directory_path / 'server_private_key.pem')
-        self.__server_public_key_file = self.__blockchain_keys_directory_path / 'server_public_key.pem'
-        self.__server_private_key_file = self.__blockchain_keys_directory_path / 'server_private_key.pem'
-        self.__actual_public_key_file = self.__server_public_key_file
-        self.__actual_private_key_file = self.__server_private_key_file
-        os.makedirs(self.__blockchain_signatures_directory_path, exist_ok=True)
-        self.__blockchain_blocks_file.touch(exist_ok=True)
-        self.__block_list = []
-        self.__last_block = None
 
-    
-    def add_block(self, block_type: str, game_code: str, data: dict, on_chain: bool = False):
+        if not isinstance(game_code, str) or not game_code or os.sep in game_code or game_code in ('.', '..'):
+            raise ValueError('Invalid game code!')
+        self.__game_code = game_code
+        self.__blockchain_directory_path = Path(root if root is not None else Path.cwd() / self.__blockchain_directory_name) / game_code
+        self.__blockchain_keys_directory_path = self.__blockchain_directory_path / 'keys'
+        self.__blockchain_blocks_file = self.__blockchain_directory_path / 'blocks.txt'
+
+        with Blockchain.__registry_lock:
+            if game_code in Blockchain.__registry:
+                raise ValueError(f'The blockchain of game {game_code} is already open!')
+            Blockchain.__registry[game_code] = self
+
+        try:
+            # Only the directory of this game is reset
+            shutil.rmtree(self.__blockchain_directory_path, ignore_errors=True)
+            os.makedirs(self.__blockchain_keys_directory_path, exist_ok=True)
+            shutil.copy(server_public_key_file, self.__blockchain_keys_directory_path / 'server_public_key.pem')
+            shutil.copy(server_private_key_file, self.__blockchain_keys_directory_path / 'server_private_key.pem')
+            self.__server_public_key_file = self.__blockchain_keys_directory_path / 'server_public_key.pem'
+            self.__server_private_key_file = self.__blockchain_keys_directory_path / 'server_private_key.pem'
+            self.__actual_public_key_file = self.__server_public_key_file
+            self.__actual_private_key_file = self.__server_private_key_file
+            self.__log = SegmentLog(self.__blockchain_directory_path / 'log')
+            self.__last_block = None
+            # Secondary index: block type, round and user id -> ascending block numbers
+            self.__round = 0
+            self.__blocks_by_type = {}
+            self.__blocks_by_round = {}
+            self.__blocks_by_user = {}
+            # The last stored block read for its entries, with its tree: the players of a round ask for the same block
+            self.__entry_record = None
+        except BaseException:
+            with Blockchain.__registry_lock:
+                Blockchain.__registry.pop(game_code, None)
+            raise
+
+    @classmethod
+    def get_open_chain(cls, game_code: str):
+        """
+        Returns the open blockchain of a game, None if there is none.
+        # Arguments
+            game_code: the code of the game.
+        """
+        with cls.__registry_lock:
+            return cls.__registry.get(game_code)
+
+    @classmethod
+    def open_chains(cls):
+        """
+        Returns the game codes of the open blockchains.
+        """
+        with cls.__registry_lock:
+            return list(cls.__registry)
+
+    def get_game_code(self):
+        return self.__game_code
+
+    def get_directory(self):
+        return self.__blockchain_directory_path
+
+    def add_block(self, block_type: str, game_code: str, data: dict, on_chain: bool = False, header: dict = None):
         if block_type not in self.__block_actions:
             raise TypeError('Invalid block type!')
 
+        if game_code != self.__game_code:
+            raise ValueError(f'Block for game {game_code} added to the blockchain of game {self.__game_code}!')
+
         add_func, check_func = self.__block_actions[block_type]
 
         for user_id, user_data in data.items():
             data[user_id] = check_func(user_id, user_data)
 
-        self.__last_block = add_func(game_code, data, on_chain)
-        self.append_last_block_to_file()
+        self.__last_block = add_func(game_code, data, on_chain, header)
+        block_number = self.__log.append(self.__last_block.to_record())
+        self.__index_block(block_number, block_type, data)
 
         return self.__last_block
 
+    def __index_block(self, block_number, block_type, data):
+        # A commit block opens a new round, the other blocks belong to the current one
+        if block_type == 'commit':
+            self.__round += 1
+        self.__blocks_by_type.setdefault(block_type, []).append(block_number)
+        self.__blocks_by_round.setdefault(self.__round, []).append(block_number)
+        for user_id in data:
+            self.__blocks_by_user.setdefault(user_id, []).append(block_number)
+
+    def get_round(self):
+        """Returns the current round, the number of commit blocks in the chain."""
+        return self.__round
+
+    def find_blocks(self, block_type: str = None, round: int = None, user_id: str = None):
+        """
+        Find the blocks matching all the given filters through the secondary index.
+        # Arguments
+            block_type: the type of the blocks (e.g. 'commit').
+            round: the round of the blocks, 0 for the pre game block.
+            user_id: a user with an entry in the data of the blocks.
+        # Returns
+            The ascending list of the matching block numbers.
+        """
+        candidates = [index.get(key, []) for index, key in ((self.__blocks_by_type, block_type), (self.__blocks_by_round, round), (self.__blocks_by_user, user_id)) if key is not None]
+        if len(candidates) == 0:
+            return list(range(len(self.__log)))
+        candidates.sort(key=len)
+        others = [set(numbers) for numbers in candidates[1:]]
+        return [number for number in candidates[0] if all(number in numbers for numbers in others)]
+
+    def iter_blocks(self, block_type: str = None, round: int = None, user_id: str = None):
+        """
+        Lazily read from the log the blocks matching all the given filters, in chain order.
+        # Arguments
+            block_type: the type of the blocks (e.g. 'commit').
+            round: the round of the blocks, 0 for the pre game block.
+            user_id: a user with an entry in the data of the blocks.
+        # Returns
+            A generator of BlockRecord.
+        """
+        for block_number in self.find_blocks(block_type, round, user_id):
+            yield self.get_block(block_number)
+
+    def __len__(self):
+        return len(self.__log)
 
-    def __create_pre_game_block(self, game_code: str, data: dict, on_chain: bool):
-        return PreGameBlock(self.__blockchain_directory_path, self.__server_public_key_file,self.__server_private_key_file, game_code,data)
+    def get_entry(self, block_number: int, user_id: str):
+        """
+        Read the entry of a user in a block with its Merkle inclusion proof.
+        # Arguments
+            block_number: the number of the block, negative numbers count from the end.
+            user_id: the id of the user.
+        # Returns
+            The BlockEntry of the user.
+        """
+        if self.__last_block is not None and block_number in (-1, len(self.__log) - 1):
+            # the tree of the last block is still in memory
+            return self.__last_block.get_entry(user_id)
+        block_number = block_number if block_number >= 0 else block_number + len(self.__log)
+        cached = self.__entry_record
+        if cached is None or cached[0] != block_number:
+            cached = (block_number, self.get_block(block_number))
+            self.__entry_record = cached
+        return cached[1].get_entry(user_id)
 
-    def __create_commit_block(self, game_code: str, data: dict, on_chain: bool):
-        return CommitBlock(self.__blockchain_directory_path, len(self.__block_list), self.__actual_public_key_file, self.__actual_private_key_file,self.__last_block.get_hash() ,game_code, data, on_chain)
+    def get_block(self, block_number: int):
+        """
+        Read a block from the blockchain log with a single seek.
+        # Arguments
+            block_number: the number of the block, negative numbers count from the end.
+        # Returns
+            The BlockRecord of the block.
+        """
+        return BlockRecord.from_bytes(self.__log.get(block_number))
 
-    def __create_reveal_block(self, game_code: str, data: dict, on_chain: bool):
-        return RevealBlock(self.__blockchain_directory_path, len(self.__block_list), self.__actual_public_key_file, self.__actual_private_key_file,self.__last_block.get_hash() ,game_code, data, on_chain)
+    def export_text(self, file_path=None):
+        """
+        Write the human readable dump of the whole blockchain.
+        # Arguments
+            file_path: the output file, blocks.txt in the blockchain directory by default.
+        # Returns
+            The path of the written file.
+        """
+        file_path = file_path or self.__blockchain_blocks_file
+        with open(file_path, 'w') as f:
+            for record in self.__log:
+                f.write(str(BlockRecord.from_bytes(record)))
+        return file_path
 
-    def __create_dispute_block(self, game_code: str, data: dict, on_chain: bool):
-        return DisputeBlock(self.__blockchain_directory_path, len(self.__block_list), self.__actual_public_key_file, self.__actual_private_key_file,self.__last_block.get_hash() ,game_code,data, on_chain)
+    def close(self):
+        """Close the files of the blockchain log and remove the chain from the open ones."""
+        with Blockchain.__registry_lock:
+            if Blockchain.__registry.get(self.__game_code) is self:
+                del Blockchain.__registry[self.__game_code]
+        self.__log.close()
 
-    def __create_end_game_block(self, game_code: str, data: dict, on_chain: bool):
-        return PostGameBlock(self.__blockchain_directory_path, len(self.__block_list), self.__server_public_key_file, self.__server_private_key_file,self.__last_block.get_hash() ,game_code, data)
 
+    def __create_pre_game_block(self, game_code: str, data: dict, on_chain: bool, header: dict):
+        return PreGameBlock(self.__server_public_key_file,self.__server_private_key_file, game_code, data, header)
 
-    def append_last_block_to_file(self):
-        Blockchain.append_to_file(self.__blockchain_blocks_file, str(self.__last_block))
-        if (len(self.__block_list) == 0) or (self.__block_list[-1] != self.__last_block):
-            self.__block_list.append(self.__last_block)
+    def __create_commit_block(self, game_code: str, data: dict, on_chain: bool, header: dict):
+        return CommitBlock(len(self.__log), self.__actual_public_key_file, self.__actual_private_key_file,self.__last_block.get_hash() ,game_code, data, on_chain, header)
+
+    def __create_reveal_block(self, game_code: str, data: dict, on_chain: bool, header: dict):
+        return RevealBlock(len(self.__log), self.__actual_public_key_file, self.__actual_private_key_file,self.__last_block.get_hash() ,game_code, data, on_chain, header)
+
+    def __create_dispute_block(self, game_code: str, data: dict, on_chain: bool, header: dict):
+        return DisputeBlock(len(self.__log), self.__actual_public_key_file, self.__actual_private_key_file,self.__last_block.get_hash() ,game_code, data, header)
+
+    def __create_end_game_block(self, game_code: str, data: dict, on_chain: bool, header: dict):
+        return PostGameBlock(len(self.__log), self.__server_public_key_file, self.__server_private_key_file,self.__last_block.get_hash() ,game_code, data, header)
 
 
     def set_credentials(self, public_key_file, private_key_file):
@@ -88,11 +231,6 @@ class Blockchain:
         self.__actual_private_key_file = self.__server_private_key_file
 
 
-    @staticmethod
-    def append_to_file(file_path, text):
-        with open(file_path, 'a') as f:
-            f.write(text)
-
     @final
     @staticmethod
     def __check_user_id(user_id):
@@ -102,20 +240,20 @@ class Blockchain:
     
     @final  
     def __check_entry_pre_game(self,user_id: str, user_pk: str):
-        if len(self.__block_list) > 0:
+        if len(self.__log) > 0:
              raise ValueError('Pre-game block must be the first block!')
         
         Blockchain.__check_user_id(user_id)
         if not isinstance(user_pk, str):
             raise TypeError(f'User {user_id} has a public key file that is not a string')
         user_pk_file_path = os.path.join(self.__blockchain_keys_directory_path, f'{user_id}_public_key.pem')
-        os.system(f"cp {user_pk} {user_pk_file_path}")
+        shutil.copy(user_pk, user_pk_file_path)
         return user_pk_file_path
 
 
     @final
     def __check_entry_commit(self, user_id: str, user_commit: tuple):
-        if len(self.__block_list) <= 0:
+        if len(self.__log) <= 0:
             raise ValueError('Commit block must be at least the second block!')
         
         Blockchain.__check_user_id(user_id)
@@ -126,7 +264,7 @@ class Blockchain:
 
     @final
     def __check_entry_reveal(self, user_id: str, user_reveal: tuple):
-        if len(self.__block_list) <= 1:
+        if len(self.__log) <= 1:
             raise ValueError('Reveal block must be at least the third block!')
         
         Blockchain.__check_user_id(user_id)
@@ -136,7 +274,7 @@ class Blockchain:
     
     @final
     def __check_entry_end_game(self, user_id: str, user_endgame: tuple):
-        if len(self.__block_list) <= 2:
+        if len(self.__log) <= 2:
             raise ValueError('End game block must be at least the fourth block!')
         
         Blockchain.__check_user_id(user_id)
@@ -147,7 +285,7 @@ class Blockchain:
 
     @final
     def __check_entry_dispute(self, user_id: str, user_dispute: tuple):
-        if len(self.__block_list) <= 0:
+        if len(self.__log) <= 0:
                 raise ValueError('Dispute block must be at least the second block!')
         
         Blockchain.__check_user_id(user_id)
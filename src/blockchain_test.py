@@ -1,35 +1,158 @@
-from blockchain import Blockchain
-from utils.keys_util import gen_ECDSA_keys
-from utils.pseudorandom_util import rand_extract
 import os
+import tempfile
+from blockchain import Blockchain
+from blocks import BlockEntry, split_block_body
+from utils.hash_util import compute_hash_from_data
+from blockchain_test_util import generate_keys, play_rounds
+
+def test_blockchains_of_different_games_are_independent():
+    with tempfile.TemporaryDirectory() as folder:
+        server_keys = generate_keys(folder, 'server')
+        player_keys = {'0': generate_keys(folder, 'player0'), '1': generate_keys(folder, 'player1')}
+        root = os.path.join(folder, 'Blockchain')
+
+        first = Blockchain(*server_keys, 'game1', root)
+        play_rounds(first, folder, player_keys, 3)
+        second = Blockchain(*server_keys, 'game2', root)
+        play_rounds(second, folder, player_keys, 2)
+
+        assert Blockchain.get_open_chain('game1') is first
+        assert set(Blockchain.open_chains()) >= {'game1', 'game2'}
+        # creating the second chain does not touch the first one
+        assert len(first) == 7 and len(second) == 5
+        assert first.get_block(6).get_block_type() == 'reveal'
+        assert first.get_block(3).verify_block(server_keys[0])
+        assert os.path.isdir(os.path.join(root, 'game1', 'log')) and os.path.isdir(os.path.join(root, 'game2', 'log'))
+
+        first.close()
+        second.close()
+        assert Blockchain.get_open_chain('game1') is None
 
+def test_blocks_are_linked_and_exported():
+    with tempfile.TemporaryDirectory() as folder:
+        server_keys = generate_keys(folder, 'server')
+        player_keys = {'0': generate_keys(folder, 'player0')}
+        blockchain = Blockchain(*server_keys, 'game3', os.path.join(folder, 'Blockchain'))
+        try:
+            play_rounds(blockchain, folder, player_keys, 2)
+            hashes = [blockchain.get_block(n).get_hash() for n in range(len(blockchain))]
+            for n in range(1, len(blockchain)):
+                assert f'PreviousHash: {hashes[n - 1]}\n' in blockchain.get_block(n).get_body_string()
+            with open(blockchain.export_text(), 'r') as f:
+                assert f.read().count('START HEADER BLOCK') == len(blockchain)
+        finally:
+            blockchain.close()
 
-def generate_tuples_list():
-    tuples_list = []
-    for i in range(5):
-        tuples_list.append((rand_extract(16,"hex"),(rand_extract(16,"hex"))))
-    return tuples_list
+def test_a_game_code_cannot_be_opened_twice():
+    with tempfile.TemporaryDirectory() as folder:
+        server_keys = generate_keys(folder, 'server')
+        blockchain = Blockchain(*server_keys, 'game4', os.path.join(folder, 'Blockchain'))
+        try:
+            Blockchain(*server_keys, 'game4', os.path.join(folder, 'Blockchain'))
+            assert False, 'the same game was opened twice'
+        except ValueError:
+            pass
+        finally:
+            blockchain.close()
 
+def test_blocks_are_found_by_type_round_and_user():
+    with tempfile.TemporaryDirectory() as folder:
+        server_keys = generate_keys(folder, 'server')
+        player_keys = {'0': generate_keys(folder, 'player0'), '1': generate_keys(folder, 'player1')}
+        blockchain = Blockchain(*server_keys, 'game5', os.path.join(folder, 'Blockchain'))
+        try:
+            play_rounds(blockchain, folder, player_keys, 3)
+            assert blockchain.get_round() == 3
+            assert blockchain.find_blocks(block_type='commit') == [1, 3, 5]
+            assert blockchain.find_blocks(round=2) == [3, 4]
+            assert blockchain.find_blocks(round=0) == [0]
+            assert blockchain.find_blocks(block_type='reveal', round=3, user_id='1') == [6]
+            assert blockchain.find_blocks(user_id='7') == []
 
-public_key_file = 'server_public_key.pem'
-private_key_file = 'server_private_key.pem'
-params_file = 'params.txt'
-curve_name = 'prime256v1'
+            commit, = blockchain.iter_blocks(block_type='commit', round=2, user_id='0')
+            params, commitment, signature = commit.get_data()['0']
+            assert params == ('0', 'game5', '2', '2023-06-01 10:00:00.000000')
+            assert commit.get_header()['Block Number'] == '3'
+        finally:
+            blockchain.close()
 
-os.system(f"rm {public_key_file}")
-os.system(f"rm {private_key_file}")
-os.system(f"rm {params_file}")
+def test_entries_are_verified_with_inclusion_proofs():
+    with tempfile.TemporaryDirectory() as folder:
+        server_keys = generate_keys(folder, 'server')
+        player_keys = {str(id): generate_keys(folder, f'player{id}') for id in range(5)}
+        blockchain = Blockchain(*server_keys, 'game6', os.path.join(folder, 'Blockchain'))
+        try:
+            play_rounds(blockchain, folder, player_keys, 2)
+            for number in (3, len(blockchain) - 1):
+                full_data = blockchain.get_block(number).get_data()
+                for id in player_keys:
+                    entry = blockchain.get_entry(number, id)
+                    assert entry.verify(server_keys[0])
+                    assert entry.get_data() == full_data[id]
+            assert blockchain.get_entry(3, '2').get_header()['Data Root'] == blockchain.get_block(3).get_header()['Data Root']
 
+            entry = blockchain.get_entry(4, '1')
+            forged = BlockEntry(entry.get_header_string(), entry.get_hash(), entry.get_signature_string(), entry.get_line().replace('Reveal: ', 'Reveal: 0'), 1, entry.get_proof())
+            assert not forged.verify(server_keys[0])
+        finally:
+            blockchain.close()
 
-gen_ECDSA_keys(curve_name, params_file,private_key_file,public_key_file)
+def test_a_stored_block_builds_its_tree_once():
+    with tempfile.TemporaryDirectory() as folder:
+        server_keys = generate_keys(folder, 'server')
+        player_keys = {str(id): generate_keys(folder, f'player{id}') for id in range(5)}
+        blockchain = Blockchain(*server_keys, 'game7', os.path.join(folder, 'Blockchain'))
+        try:
+            play_rounds(blockchain, folder, player_keys, 2)
+            record = blockchain.get_block(3)
+            first = record.get_entry('0')
+            entries = record._entries
+            for id in player_keys:
+                entry = record.get_entry(id)
+                assert entry.verify(server_keys[0]) and entry.get_index() == int(id)
+            assert record._entries is entries and first.get_proof() == record.get_entry('0').get_proof()
+            try:
+                record.get_entry('7')
+                assert False, 'a missing user has no entry'
+            except KeyError:
+                pass
 
+            # the players of a round read the same stored block: it is decoded once
+            data = blockchain.get_block(3).get_data()
+            reads = []
+            get_block = Blockchain.get_block
+            Blockchain.get_block = lambda self, number: reads.append(number) or get_block(self, number)
+            try:
+                for id in player_keys:
+                    assert blockchain.get_entry(3, id).verify(server_keys[0])
+                assert blockchain.get_entry(-2, '1').get_data() == data['1']
+            finally:
+                Blockchain.get_block = get_block
+            assert reads == [3]
+        finally:
+            blockchain.close()
 
-blockchain = Blockchain(public_key_file, private_key_file)
-blockchain.add_block("pre_game", generate_tuples_list())
-for i in range(10):
-    blockchain.add_block("commit", generate_tuples_list())
-    blockchain.add_block("reveal", generate_tuples_list())
+def test_a_dispute_block_is_on_chain():
+    with tempfile.TemporaryDirectory() as folder:
+        server_keys = generate_keys(folder, 'server')
+        player_keys = {'0': generate_keys(folder, 'player0'), '1': generate_keys(folder, 'player1')}
+        blockchain = Blockchain(*server_keys, 'game8', os.path.join(folder, 'Blockchain'))
+        try:
+            play_rounds(blockchain, folder, player_keys, 1)
+            block = blockchain.add_block('dispute', 'game8', {'1': ('00' * 16, '11' * 16)})
+            assert block.get_hash() == compute_hash_from_data(split_block_body(block.get_body().decode())[0])
+            record = blockchain.get_block(-1)
+            assert record.get_header()['On Chain'] == 'True' and record.get_hash() == block.get_hash()
+            assert blockchain.get_entry(-1, '1').verify(server_keys[0])
+        finally:
+            blockchain.close()
 
-os.system(f"rm {public_key_file}")
-os.system(f"rm {private_key_file}")
-os.system(f"rm {params_file}")
\ No newline at end of file
+if __name__ == "__main__":
+    test_blockchains_of_different_games_are_independent()
+    test_blocks_are_linked_and_exported()
+    test_a_game_code_cannot_be_opened_twice()
+    test_blocks_are_found_by_type_round_and_user()
+    test_entries_are_verified_with_inclusion_proofs()
+    test_a_stored_block_builds_its_tree_once()
+    test_a_dispute_block_is_on_chain()
+    print("Blockchain tests passed")
@@ -0,0 +1,55 @@
+import os
+from blockchain import Blockchain
+from utils.hash_util import compute_hash_from_data
+from utils.keys_util import gen_ECDSA_keys, sign_ECDSA_from_variable
+from utils.pseudorandom_util import rand_extract, hash_concat_data_and_known_rand
+
+curve_name = 'prime256v1'
+
+def generate_keys(folder, name):
+    """
+    Generate an ECDSA key pair in the folder.
+    # Returns
+        The public and the private key files.
+    """
+    public_key_file = os.path.join(folder, f'{name}_public_key.pem')
+    private_key_file = os.path.join(folder, f'{name}_private_key.pem')
+    gen_ECDSA_keys(curve_name, os.path.join(folder, f'{name}_params.txt'), private_key_file, public_key_file)
+    return public_key_file, private_key_file
+
+def play_rounds(blockchain, folder, player_keys, rounds):
+    """
+    Add the pre game block and `rounds` commit and reveal blocks of a valid game: the players sign
+    their commit messages, the openings match the commitments and every reveal block carries the final string.
+    """
+    game_code = blockchain.get_game_code()
+    blockchain.add_block('pre_game', game_code, {id: keys[0] for id, keys in player_keys.items()})
+    for round in range(1, rounds + 1):
+        commits = {}
+        reveals = {}
+        for id, (_, private_key_file) in player_keys.items():
+            contribution, randomness = rand_extract(16, 'hex'), rand_extract(16, 'hex')
+            params = (id, game_code, str(round), '2023-06-01 10:00:00.000000')
+            commitment = hash_concat_data_and_known_rand(contribution, randomness)
+            signature_file = os.path.join(folder, f'{id}_{round}_sign.pem')
+            sign_ECDSA_from_variable(private_key_file, ''.join(params) + commitment, signature_file)
+            commits[id] = (params, commitment, signature_file)
+            reveals[id] = (contribution, randomness)
+        final_string = compute_hash_from_data(''.join(reveals[id][0] for id in sorted(reveals, key=int)))
+        blockchain.add_block('commit', game_code, commits)
+        blockchain.add_block('reveal', game_code, reveals, header={'Final String': final_string})
+
+def write_game(folder, game_code, rounds):
+    """
+    Store a valid chain of three players.
+    # Returns
+        The directory of the chain and the private key of the server.
+    """
+    server_keys = generate_keys(folder, 'server')
+    player_keys = {str(id): generate_keys(folder, f'player{id}') for id in range(3)}
+    blockchain = Blockchain(*server_keys, game_code, os.path.join(folder, 'Blockchain'))
+    try:
+        play_rounds(blockchain, folder, player_keys, rounds)
+        return blockchain.get_directory(), server_keys[1]
+    finally:
+        blockchain.close()
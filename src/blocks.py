@@ -1,22 +1,30 @@
 from abc import ABC, abstractmethod
 from datetime import datetime
-from utils.hash_util import compute_hash_from_data
 from utils.pseudorandom_util import rand_extract
-from utils.keys_util import verify_ECDSA, sign_ECDSA
+from utils.keys_util import load_private_key, load_public_key, sign_ECDSA_bytes, verify_ECDSA_bytes
 from utils.keys_util import base64_key_view
+from utils.hash_util import compute_hash_from_data, hash_many
+from merkle import MerkleTree, verify_binary_proof
+import ast
 import binascii
+import re
+import struct
 from typing import final
 
 class AbstractBlock(ABC):
-    __slots__ = ['_blockchain_directory_path','_block_number', '_public_key_file' ,'_hash', '_previous_hash', '_timestamp', '_data', '_signature_string', '_signature_file', '_on_chain', '_game_code']
+    __slots__ = ['_block_number', '_public_key_file' ,'_hash', '_previous_hash', '_timestamp', '_data', '_signature_string', '_on_chain', '_game_code', '_body', '_header_fields', '_header_length', '_entries', '_tree', '_entry_index']
+
+    _block_type = None
+    _text_title = None
+    _text_prefix = '\n\n'
+    _text_suffix = ''
 
     _internal_block_header = "----------START HEADER BLOCK----------\n"
     _internal_block_footer = "----------END HEADER BLOCK----------\n"
     _internal_block_data_header = "----------START DATA BLOCK----------\n"
     _internal_block_data_footer = "----------END DATA BLOCK----------\n"
 
-    def __init__(self, blockchain_directory_path:str ,block_number: int, public_key_file: str, private_key_file: str, previous_hash: str, game_code: str ,data: dict, on_chain: bool = False):
-        self._blockchain_directory_path = blockchain_directory_path
+    def __init__(self, block_number: int, public_key_file: str, private_key_file: str, previous_hash: str, game_code: str ,data: dict, on_chain: bool = False, header: dict = None):
         self._block_number = block_number
         self._public_key_file = public_key_file
         self._previous_hash = previous_hash
@@ -24,10 +32,19 @@ class AbstractBlock(ABC):
         self._game_code = game_code
         self._timestamp = datetime.today()
         self._data = data
+        self._header_fields = header or {}
+        # Canonical serialization of the block, built once: hash, signature, record and text reuse it.
+        # Every data entry is a leaf of a Merkle tree whose root is in the header, the hash covers the header only.
+        data_string = self._data_string()
+        self._entries = _data_lines(data_string)
+        self._tree = _data_tree(self._entries)
+        self._entry_index = {user_id: index for index, user_id in enumerate(self._data)}
+        header_string = self._header_string().encode()
+        self._header_length = len(header_string)
+        self._body = header_string + data_string.encode()
         self._hash = self.__compute_hash()
         self._signature_string = self.__compute_signature(private_key_file)
-        
-        
+
 
     def get_public_key_file(self):
         return self._public_key_file
@@ -35,8 +52,8 @@ class AbstractBlock(ABC):
     def get_signature_string(self):
         return self._signature_string
     
-    def get_signature_file(self):
-        return self._signature_file
+    def get_block_type(self):
+        return self._block_type
 
     def get_previous_hash(self):
         return self._previous_hash
@@ -49,6 +66,26 @@ class AbstractBlock(ABC):
 
     def get_hash(self):
         return self._hash
+
+    def get_block_number(self):
+        return self._block_number
+
+    def get_body(self):
+        return self._body
+
+    def get_data_root(self):
+        return _data_root(self._tree)
+
+    def get_entry(self, user_id):
+        """
+        Returns the entry of a user with its inclusion proof, without the data of the other users.
+        # Arguments
+            user_id: the id of the user.
+        # Returns
+            The BlockEntry of the user.
+        """
+        index = self._entry_index[user_id]
+        return BlockEntry(self._body[:self._header_length].decode(), self._hash, self._signature_string, self._entries[index], index, self._tree.binary_proof(index))
     
     def verify_block(self, PK):
         """ 
@@ -58,12 +95,34 @@ class AbstractBlock(ABC):
         # Returns 
             True if the signature is valid, False otherwise.
         """
-        return verify_ECDSA(PK, str(self._blockchain_directory_path)+'/hashes/'+str(self._block_number)+'.txt', self.get_signature_file())
-        
+        return verify_ECDSA_bytes(load_public_key(PK), self._hash.encode(), bytes.fromhex(self._signature_string))
+
+    def to_record(self):
+        """
+        Encode the block as a binary record of the blockchain log.
+        # Returns
+            The record bytes.
+        """
+        return BlockRecord.encode(self._block_type, self._body, self._hash, self._signature_string)
+
+    @classmethod
+    def render_text(cls, body, hash, signature):
+        """
+        Render the human readable text of a block of this type.
+        # Arguments
+            body: the header and data of the block.
+            hash: the hash of the block.
+            signature: the hex signature of the block.
+        """
+        output = cls._text_prefix + f'---------------START {cls._text_title} BLOCK---------------\n'
+        output += body
+        output += f'HashBlock: {hash}\n'
+        output += f'Signature: {signature}\n'
+        output += f'---------------END {cls._text_title} BLOCK---------------' + cls._text_suffix
+        return output
 
-    @abstractmethod
     def __str__(self):
-        pass
+        return self.render_text(self._body.decode(), self._hash, self._signature_string)
 
     
     def _header_string(self):
@@ -77,18 +136,17 @@ class AbstractBlock(ABC):
         output += 'Public Key: ' + public_key + '\n'
         output += f'Timestamp: {self._timestamp}\n'
         output += f'PreviousHash: {self._previous_hash}\n'
+        output += f'Data Root: {_data_root(self._tree)}\n'
+        for key, value in self._header_fields.items():
+            output += f'{key}: {value}\n'
         output += self._internal_block_footer
         return output
     
     
+ 
     @abstractmethod
     def _data_string(self):
         pass
-
-    
-    @final
-    def _body_string(self):
-        return self._header_string() + self._data_string()
     
     
     @staticmethod
@@ -98,32 +156,23 @@ class AbstractBlock(ABC):
         return binascii.hexlify(binary_data).decode()
 
     def __compute_hash(self):
-        hash = compute_hash_from_data(self._body_string())
-        with open(f'{self._blockchain_directory_path}/hashes/{self._block_number}.txt', 'w') as f:
-            f.write(hash)
-        return hash
+        # the same helper of the verifiers, on the header string
+        return compute_hash_from_data(self._body[:self._header_length].decode())
     
     def __compute_signature(self, private_key):
-        signature_path = f'{self._blockchain_directory_path}/signatures/{self._block_number}.pem'
-        sign_ECDSA(private_key, str(self._blockchain_directory_path)+'/hashes/'+str(self._block_number)+'.txt', signature_path)
-        self._signature_file = signature_path
-        return AbstractBlock.binary_to_hex(signature_path)
+        # The signature on the hex hash is kept in memory and stored in the block record
+        return sign_ECDSA_bytes(load_private_key(private_key), self._hash.encode()).hex()
 
 
 class PreGameBlock(AbstractBlock):
+    _block_type = 'pre_game'
+    _text_title = 'PRE GAME'
+    _text_prefix = ''
+    _text_suffix = '\n\n'
 
-    def __init__(self, blockchain_directory_path, public_key_file, private_key_file, game_code, data):
+    def __init__(self, public_key_file, private_key_file, game_code, data, header = None):
         previous_hash = rand_extract(32, 'hex')
-        super().__init__(blockchain_directory_path, 0, public_key_file, private_key_file ,previous_hash, game_code, data, True)
-
-    def __str__(self):
-        output = '---------------START PRE GAME BLOCK---------------\n'
-        output += self._body_string()
-        output += f'HashBlock: {self._hash}\n'
-        output += f'Signature: {self._signature_string}\n'
-        output += '---------------END PRE GAME BLOCK---------------\n\n'
-        return output
-    
+        super().__init__(0, public_key_file, private_key_file ,previous_hash, game_code, data, True, header)
     
     def _data_string(self):
         output = self._internal_block_data_header
@@ -135,18 +184,12 @@ class PreGameBlock(AbstractBlock):
     
 
 class CommitBlock(AbstractBlock):
+    _block_type = 'commit'
+    _text_title = 'COMMIT'
+    _text_suffix = '\n\n'
 
-    def __init__(self, blockchain_directory_path, block_number, public_key_file, private_key_file, previous_hash, game_code, data, on_chain: bool = False):
-        super().__init__(blockchain_directory_path, block_number, public_key_file, private_key_file, previous_hash, game_code, data, on_chain)
-
-    def __str__(self):
-        output = '\n\n---------------START COMMIT BLOCK---------------\n'
-        output += self._body_string()
-        output += f'HashBlock: {self._hash}\n'
-        output += f'Signature: {self._signature_string}\n'
-        output += '---------------END COMMIT BLOCK---------------\n\n'
-        return output
-    
+    def __init__(self, block_number, public_key_file, private_key_file, previous_hash, game_code, data, on_chain: bool = False, header = None):
+        super().__init__(block_number, public_key_file, private_key_file, previous_hash, game_code, data, on_chain, header)
     
     def _data_string(self):
         output = self._internal_block_data_header
@@ -157,17 +200,12 @@ class CommitBlock(AbstractBlock):
     
     
 class RevealBlock(AbstractBlock):
+    _block_type = 'reveal'
+    _text_title = 'REVEAL'
+    _text_suffix = '\n\n'
 
-    def __init__(self, blockchain_directory_path, block_number, public_key_file, private_key_file, previous_hash, game_code, data, on_chain: bool = False):
-        super().__init__(blockchain_directory_path, block_number, public_key_file, private_key_file, previous_hash, game_code, data, on_chain)
-
-    def __str__(self):
-        output = '\n\n---------------START REVEAL BLOCK---------------\n'
-        output += self._body_string()
-        output += f'HashBlock: {self._hash}\n'
-        output += f'Signature: {self._signature_string}\n'
-        output += '---------------END REVEAL BLOCK---------------\n\n'
-        return output
+    def __init__(self, block_number, public_key_file, private_key_file, previous_hash, game_code, data, on_chain: bool = False, header = None):
+        super().__init__(block_number, public_key_file, private_key_file, previous_hash, game_code, data, on_chain, header)
     
     def _data_string(self):
         output = self._internal_block_data_header
@@ -179,18 +217,12 @@ class RevealBlock(AbstractBlock):
     
 
 class PostGameBlock(AbstractBlock):
+    _block_type = 'end_game'
+    _text_title = 'POST GAME'
     
-    def __init__(self, blockchain_directory_path, block_number, public_key_file, private_key_file, previous_hash, game_code, data):
-        super().__init__(blockchain_directory_path, block_number, public_key_file, private_key_file, previous_hash, game_code, data, True)
+    def __init__(self, block_number, public_key_file, private_key_file, previous_hash, game_code, data, header = None):
+        super().__init__(block_number, public_key_file, private_key_file, previous_hash, game_code, data, True, header)
     
-    def __str__(self):
-        output = '\n\n---------------START POST GAME BLOCK---------------\n'
-        output += self._body_string()
-        output += f'HashBlock: {self._hash}\n'
-        output += f'Signature: {self._signature_string}\n'
-        output += '---------------END POST GAME BLOCK---------------'
-        return output
-        
     def _data_string(self):
         output = self._internal_block_data_header
         for user_id, user_post_game in self._data.items():
@@ -200,18 +232,12 @@ class PostGameBlock(AbstractBlock):
     
 
 class DisputeBlock(AbstractBlock):
+        _block_type = 'dispute'
+        _text_title = 'DISPUTE'
         
-        def __init__(self, blockchain_directory_path, block_number, public_key_file, private_key_file, previous_hash, game_code, data):
-            super().__init__(blockchain_directory_path, block_number, public_key_file, private_key_file, previous_hash, game_code,data, True)
+        def __init__(self, block_number, public_key_file, private_key_file, previous_hash, game_code, data, header = None):
+            super().__init__(block_number, public_key_file, private_key_file, previous_hash, game_code,data, True, header)
         
-        def __str__(self):
-            output = '\n\n---------------START DISPUTE BLOCK---------------\n'
-            output += self._body_string()
-            output += f'HashBlock: {self._hash}\n'
-            output += f'Signature: {self._signature_string}\n'
-            output += '---------------END DISPUTE BLOCK---------------'
-            return output
-            
         def _data_string(self):
             output = self._internal_block_data_header
             
@@ -227,4 +253,302 @@ class DisputeBlock(AbstractBlock):
             
             output += self._internal_block_data_footer
             return output
-        
\ No newline at end of file
+        
+
+_block_classes = {cls._block_type: cls for cls in (PreGameBlock, CommitBlock, RevealBlock, PostGameBlock, DisputeBlock)}
+
+
+class BlockRecord:
+    """
+    A block as stored in the blockchain log: its type, its body (header and data),
+    its hash and the signature on the hash.
+    Every field of the binary record is preceded by its length (4 byte big endian),
+    the signature is stored as raw bytes.
+    """
+    __slots__ = ['_block_type', '_body', '_hash', '_signature_string', '_entries']
+
+    _field_length = struct.Struct('>I')
+
+    def __init__(self, block_type: str, body: str, hash: str, signature_string: str):
+        self._block_type = block_type
+        self._body = body
+        self._hash = hash
+        self._signature_string = signature_string
+        self._entries = None
+
+    def get_block_type(self):
+        return self._block_type
+
+    def get_body_string(self):
+        return self._body
+
+    def get_hash(self):
+        return self._hash
+
+    def get_signature_string(self):
+        return self._signature_string
+
+    def get_header(self):
+        return parse_header(split_block_body(self._body)[0])
+
+    def get_data(self):
+        """
+        Parse the data of the stored block with the same layout of the data given to the blockchain:
+        the base64 public key for a pre game block, (parameters, commitment, player signature) for a commit,
+        (reveal, randomness) for a reveal and (winner, game code, player signature) for a post game block.
+        Player signatures are hex strings instead of files.
+        """
+        return {user_id: _entry_data(entry) for user_id, entry in parse_block_body(self._body)[1].items()}
+
+    def get_entry(self, user_id):
+        """
+        Returns the entry of a user with its inclusion proof, without the data of the other users.
+        # Arguments
+            user_id: the id of the user.
+        # Returns
+            The BlockEntry of the user.
+        """
+        header, lines, tree, entry_index = self.__entries()
+        index = entry_index[user_id]
+        return BlockEntry(header, self._hash, self._signature_string, lines[index], index, tree.binary_proof(index))
+
+    def __entries(self):
+        # The data lines, their Merkle tree and the user -> position map are built at the first lookup
+        # and reused by the next ones, as a Block does at construction
+        if self._entries is None:
+            header, lines = split_block_body(self._body)
+            entry_index = {}
+            for index, line in enumerate(lines):
+                match = _data_line.match(line)
+                if match is None:
+                    raise ValueError(f'Malformed data line: {line}')
+                entry_index.setdefault(match.group(1), index)
+            self._entries = (header, lines, _data_tree(lines), entry_index)
+        return self._entries
+
+    def verify_block(self, PK):
+        """
+        This method verifies the signature on the stored block.
+        # Arguments
+            PK: the public key of the signer.
+        # Returns
+            True if the signature is valid, False otherwise.
+        """
+        return verify_ECDSA_bytes(load_public_key(PK), self._hash.encode(), bytes.fromhex(self._signature_string))
+
+    def to_bytes(self):
+        return BlockRecord.encode(self._block_type, self._body.encode(), self._hash, self._signature_string)
+
+    @classmethod
+    def encode(cls, block_type: str, body: bytes, hash: str, signature_string: str):
+        """
+        Encode the fields of a block as a binary record.
+        # Arguments
+            block_type: the type of the block.
+            body: the canonical body bytes of the block.
+            hash: the hex hash of the block.
+            signature_string: the hex signature of the block.
+        # Returns
+            The record bytes.
+        """
+        fields = (block_type.encode(), body, hash.encode(), bytes.fromhex(signature_string))
+        return b''.join(cls._field_length.pack(len(field)) + field for field in fields)
+
+    @classmethod
+    def from_bytes(cls, record: bytes):
+        """
+        Decode a record of the blockchain log.
+        # Arguments
+            record: the record bytes.
+        # Returns
+            The BlockRecord.
+        """
+        fields = []
+        offset = 0
+        for _ in range(4):
+            length, = cls._field_length.unpack_from(record, offset)
+            offset += cls._field_length.size
+            fields.append(record[offset:offset + length])
+            offset += length
+        if offset != len(record):
+            raise ValueError('Malformed block record')
+        return cls(fields[0].decode(), fields[1].decode(), fields[2].decode(), fields[3].hex())
+
+    def __str__(self):
+        return _block_classes[self._block_type].render_text(self._body, self._hash, self._signature_string)
+
+
+class BlockEntry:
+    """
+    The entry of a single user in a block, with what is needed to verify it without the rest of the data:
+    the header of the block (which contains the Merkle root of the data), the hash and the signature
+    of the block, the data line of the user, its position and its binary Merkle inclusion proof.
+    """
+    __slots__ = ['_header', '_hash', '_signature_string', '_line', '_index', '_proof']
+
+    def __init__(self, header: str, hash: str, signature_string: str, line: str, index: int, proof: bytes):
+        self._header = header
+        self._hash = hash
+        self._signature_string = signature_string
+        self._line = line
+        self._index = index
+        self._proof = proof
+
+    def get_header(self):
+        return parse_header(self._header)
+
+    def get_header_string(self):
+        return self._header
+
+    def get_hash(self):
+        return self._hash
+
+    def get_signature_string(self):
+        return self._signature_string
+
+    def get_line(self):
+        return self._line
+
+    def get_index(self):
+        return self._index
+
+    def get_proof(self):
+        return self._proof
+
+    def get_data(self):
+        """
+        Returns the data of the entry, with the layout of BlockRecord.get_data.
+        """
+        return _entry_data(parse_data_line(self._line)[1])
+
+    def verify(self, PK):
+        """
+        Verify the entry: the hash of the header, the signature of the block and the inclusion of the entry
+        in the data root of the header. The cost is logarithmic in the number of entries of the block.
+        # Arguments
+            PK: the public key of the signer of the block.
+        # Returns
+            True if the entry is valid, False otherwise.
+        """
+        if compute_hash_from_data(self._header) != self._hash:
+            return False
+        if not verify_ECDSA_bytes(load_public_key(PK), self._hash.encode(), bytes.fromhex(self._signature_string)):
+            return False
+        root = parse_header(self._header).get('Data Root')
+        return root is not None and verify_binary_proof(root, self._proof, compute_hash_from_data(self._line), self._index)
+
+
+def _data_lines(data_string: str):
+    """
+    Returns the entry lines of a data string, without the data markers.
+    """
+    return data_string[len(AbstractBlock._internal_block_data_header):-len(AbstractBlock._internal_block_data_footer)].split('\n')[:-1]
+
+def _data_tree(lines):
+    """
+    Returns the Merkle tree of the data lines of a block, None if the block has no data.
+    """
+    return MerkleTree(hash_many(lines)) if len(lines) > 0 else None
+
+def _data_root(tree):
+    return tree.get_root() if tree is not None else compute_hash_from_data('')
+
+def compute_data_root(lines):
+    """
+    Compute the Merkle root of the data lines of a block, as written in the Data Root header field.
+    """
+    return _data_root(_data_tree(lines))
+
+
+_data_line = re.compile(r'^\(User: (.*?) - (?:Public Key: (.*)|\[(.*)\])\)$')
+_winner_field = re.compile(r'^The winner is (.*) for #GameCode: (.*)$')
+
+
+def split_block_body(body: str):
+    """
+    Split the body of a block in its header and its data lines.
+    # Arguments
+        body: the body of the block.
+    # Returns
+        header: string
+            The header of the block, with its markers. The hash of the block is computed on it.
+        lines: list
+            The data lines of the block, one for each user.
+    # Raises
+        ValueError: If the body is malformed.
+    """
+    header_end = body.find(AbstractBlock._internal_block_footer)
+    if not body.startswith(AbstractBlock._internal_block_header) or header_end < 0:
+        raise ValueError('Malformed block header')
+    header = body[:header_end + len(AbstractBlock._internal_block_footer)]
+    data = body[len(header):]
+    if not data.startswith(AbstractBlock._internal_block_data_header) or not data.endswith(AbstractBlock._internal_block_data_footer):
+        raise ValueError('Malformed block data')
+    return header, _data_lines(data)
+
+def parse_header(header: str):
+    """
+    Parse the header of a block.
+    # Returns
+        A dict, key: field name (e.g. 'PreviousHash'), value: string.
+    """
+    fields = {}
+    for line in header.split('\n')[1:-2]:
+        key, separator, value = line.partition(': ')
+        if not separator:
+            raise ValueError(f'Malformed header line: {line}')
+        fields[key] = value
+    return fields
+
+def parse_data_line(line: str):
+    """
+    Parse a data line of a block.
+    # Returns
+        user_id: string
+            The id of the user.
+        entry: dict
+            The fields of the user. 'Parameter' is parsed as a tuple, the winner of a post game block
+            is stored in 'Winner' and 'Game Code'.
+    """
+    match = _data_line.match(line)
+    if match is None:
+        raise ValueError(f'Malformed data line: {line}')
+    user_id, public_key, fields = match.groups()
+    if public_key is not None:
+        return user_id, {'Public Key': public_key}
+    entry = {}
+    for field in fields.split(' - '):
+        winner = _winner_field.match(field)
+        if winner is not None:
+            entry['Winner'], entry['Game Code'] = winner.groups()
+            continue
+        key, separator, value = field.partition(': ')
+        if not separator:
+            raise ValueError(f'Malformed data field: {field}')
+        entry[key] = ast.literal_eval(value) if key == 'Parameter' else value
+    return user_id, entry
+
+def _entry_data(entry):
+    if 'Public Key' in entry:
+        return entry['Public Key']
+    if 'Commitment' in entry:
+        return (entry['Parameter'], entry['Commitment'], entry['Player Signature'])
+    if 'Winner' in entry:
+        return (entry['Winner'], entry['Game Code'], entry['Player Signature'])
+    return (entry['Reveal'], entry['Randomness'])
+
+def parse_block_body(body: str):
+    """
+    Parse the body (header and data) of a block.
+    # Arguments
+        body: the body of the block.
+    # Returns
+        header: dict
+            The header fields, key: field name (e.g. 'PreviousHash'), value: string.
+        data: dict
+            The data of the block, key: user id, value: dict of the user fields (see parse_data_line).
+    # Raises
+        ValueError: If the body is malformed.
+    """
+    header, lines = split_block_body(body)
+    return parse_header(header), dict(parse_data_line(line) for line in lines)
@@ -0,0 +1,113 @@
+import os
+import tempfile
+import threading
+import time
+import utils.cache_util as CacheU
+
+class CountingParser:
+    """
+    A parser counting its calls.
+    """
+
+    def __init__(self):
+        self.calls = 0
+
+    def __call__(self, data):
+        self.calls += 1
+        return data.decode()
+
+def write(path, data, mtime_ns=None):
+    with open(path, 'wb') as f:
+        f.write(data)
+    if mtime_ns is not None:
+        os.utime(path, ns=(mtime_ns, mtime_ns))
+
+def old():
+    # far enough in the past to be outside of the racy window
+    return time.time_ns() - 10 * CacheU._racy_window
+
+def test_hits_and_misses_are_counted():
+    with tempfile.TemporaryDirectory() as folder:
+        path = os.path.join(folder, 'key.pem')
+        write(path, b'first', old())
+        cache, parser = CacheU.PEMCache(), CountingParser()
+        assert [cache.get('key', path, parser) for _ in range(3)] == ['first'] * 3
+        assert parser.calls == 1
+        assert cache.info() == {"hits": 2, "misses": 1, "invalidations": 0, "size": 1}
+        # the same file parsed in another way is another entry
+        cache.get('other', path, parser)
+        assert cache.info() == {"hits": 2, "misses": 2, "invalidations": 0, "size": 2}
+        cache.clear()
+        assert cache.info() == {"hits": 0, "misses": 0, "invalidations": 0, "size": 0}
+
+def test_a_rewritten_file_is_parsed_again():
+    with tempfile.TemporaryDirectory() as folder:
+        path = os.path.join(folder, 'key.pem')
+        stamp = old()
+        write(path, b'first', stamp)
+        cache, parser = CacheU.PEMCache(), CountingParser()
+        assert cache.get('key', path, parser) == 'first'
+        # a different size or modification time
+        write(path, b'second!', stamp)
+        assert cache.get('key', path, parser) == 'second!'
+        write(path, b'third!!', stamp + 1000)
+        assert cache.get('key', path, parser) == 'third!!'
+        assert cache.info() == {"hits": 0, "misses": 3, "invalidations": 2, "size": 1}
+
+def test_a_rewrite_in_the_racy_window_is_detected():
+    with tempfile.TemporaryDirectory() as folder:
+        path = os.path.join(folder, 'key.pem')
+        write(path, b'first')
+        stamp = os.stat(path).st_mtime_ns
+        cache, parser = CacheU.PEMCache(), CountingParser()
+        assert cache.get('key', path, parser) == 'first'
+        # same inode, size and modification time: only the content tells the files apart
+        write(path, b'other', stamp)
+        assert cache.get('key', path, parser) == 'other'
+        assert cache.get('key', path, parser) == 'other'
+        assert parser.calls == 2
+        assert cache.info() == {"hits": 1, "misses": 2, "invalidations": 1, "size": 1}
+
+def test_the_content_is_dropped_after_the_racy_window():
+    window = CacheU._racy_window
+    CacheU._racy_window = 50_000_000
+    try:
+        with tempfile.TemporaryDirectory() as folder:
+            path = os.path.join(folder, 'key.pem')
+            write(path, b'first')
+            cache, parser = CacheU.PEMCache(), CountingParser()
+            cache.get('key', path, parser)
+            entry = cache._entries[('key', os.path.abspath(path))]
+            assert entry[2] == b'first'
+            time.sleep(0.1)
+            assert cache.get('key', path, parser) == 'first'
+            assert entry[2] is None and parser.calls == 1
+    finally:
+        CacheU._racy_window = window
+
+def test_the_counters_are_consistent_across_threads():
+    with tempfile.TemporaryDirectory() as folder:
+        paths = [os.path.join(folder, f'key{index}.pem') for index in range(4)]
+        for index, path in enumerate(paths):
+            write(path, str(index).encode())
+        cache, parser = CacheU.PEMCache(), CountingParser()
+        results = []
+        def read():
+            results.extend(cache.get('key', path, parser) for _ in range(50) for path in paths)
+        threads = [threading.Thread(target=read) for _ in range(8)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        info = cache.info()
+        assert sorted(set(results)) == ['0', '1', '2', '3']
+        assert info["hits"] + info["misses"] == 8 * 50 * 4
+        assert info["size"] == 4
+
+if __name__ == "__main__":
+    test_hits_and_misses_are_counted()
+    test_a_rewritten_file_is_parsed_again()
+    test_a_rewrite_in_the_racy_window_is_detected()
+    test_the_content_is_dropped_after_the_racy_window()
+    test_the_counters_are_consistent_across_threads()
+    print("PEM cache tests passed")
@@ -0,0 +1,116 @@
+import datetime
+import os
+import subprocess
+import tempfile
+from round_test import application
+from player import Player
+from AS import AS
+import AS_authentication as AS_util
+import utils.bash_util as BU
+import utils.cache_util as CacheU
+from utils.commands_util import commands
+from cryptography import x509
+from cryptography.hazmat.primitives import hashes, serialization
+from cryptography.hazmat.primitives.asymmetric import ec
+from cryptography.x509.oid import NameOID
+from utils.certificates_util import GPCertificate, TrustStore
+
+now = datetime.datetime(2024, 1, 1, tzinfo=datetime.timezone.utc)
+day = datetime.timedelta(days=1)
+
+def write_certificate(folder, name, subject_key, issuer_name, issuer_key, not_before, not_after, CA=False):
+    """
+    Issue a certificate with the given validity and write it as PEM.
+    # Returns
+        The name of the certificate file.
+    """
+    builder = (x509.CertificateBuilder()
+        .subject_name(x509.Name([x509.NameAttribute(NameOID.COMMON_NAME, name)]))
+        .issuer_name(issuer_name)
+        .public_key(subject_key.public_key())
+        .serial_number(x509.random_serial_number())
+        .not_valid_before(not_before)
+        .not_valid_after(not_after)
+        .add_extension(x509.SubjectKeyIdentifier.from_public_key(subject_key.public_key()), critical=False)
+        .add_extension(x509.AuthorityKeyIdentifier.from_issuer_public_key(issuer_key.public_key()), critical=False))
+    if CA:
+        builder = builder.add_extension(x509.BasicConstraints(ca=True, path_length=None), critical=True)
+    else:
+        builder = builder.add_extension(x509.SubjectAlternativeName([x509.DNSName("0" * 64)]), critical=False)
+    cert_file = os.path.join(folder, name + ".cert")
+    with open(cert_file, "wb") as f:
+        f.write(builder.sign(issuer_key, hashes.SHA256()).public_bytes(serialization.Encoding.PEM))
+    return cert_file
+
+def issue(folder, CA_validity, GP_validity):
+    """
+    Returns a trust store with a test CA and a GP issued by it, with the given (notBefore, notAfter) validities.
+    """
+    CA_key = ec.generate_private_key(ec.SECP256R1())
+    CA_name = x509.Name([x509.NameAttribute(NameOID.COMMON_NAME, "Test AS")])
+    store = TrustStore()
+    store.add(write_certificate(folder, "Test AS", CA_key, CA_name, CA_key, *CA_validity, CA=True))
+    GP = GPCertificate(write_certificate(folder, "GP", ec.generate_private_key(ec.SECP256R1()), CA_name, CA_key, *GP_validity))
+    return store, GP
+
+def test_a_not_yet_valid_GP_is_accepted_once_valid():
+    with tempfile.TemporaryDirectory() as folder:
+        store, GP = issue(folder, (now - day, now + 365 * day), (now + day, now + 100 * day))
+        assert GP.days_left(now) == -1
+        assert not store.validate(GP, now=now)
+        # the rejection is not cached for the lifetime of the GP
+        assert store.validate(GP, now=now + 2 * day)
+
+def test_a_positive_verdict_does_not_outlive_the_CA():
+    with tempfile.TemporaryDirectory() as folder:
+        store, GP = issue(folder, (now - day, now + 10 * day), (now - day, now + 100 * day))
+        assert store.validate(GP, now=now)
+        assert store.validate(GP, now=now + 5 * day)
+        assert not store.validate(GP, now=now + 20 * day)
+
+def test_a_positive_verdict_expires_one_day_before_the_GP():
+    with tempfile.TemporaryDirectory() as folder:
+        store, GP = issue(folder, (now - day, now + 365 * day), (now - day, now + 30 * day))
+        assert store.validate(GP, now=now)
+        assert not store.validate(GP, now=now + 29 * day + datetime.timedelta(hours=12))
+
+def openssl_accepts(command):
+    try:
+        BU.execute_command(command)
+        return True
+    except subprocess.CalledProcessError:
+        return False
+
+def test_an_AS_issued_GP_agrees_with_openssl():
+    with application() as folder:
+        player = Player(["Alice", "IT", "F", "Rome", "1990-01-01", "CF"], folder)
+        AS_util.authentication(player, AS(folder))
+        AS_cert = os.path.join(folder, "AS", "auto_certificate.cert")
+        GP = GPCertificate(player.send_GP())
+
+        assert GP.is_signed_by(CacheU.load_certificate(AS_cert))
+        assert openssl_accepts(commands["validate_certificate"](AS_cert, GP.get_file()))
+
+        # the GP is valid for days_left whole days, not for one more
+        days = GP.days_left()
+        assert days > 0
+        assert openssl_accepts(f"openssl x509 -in {GP.get_file()} -noout -checkend {days * 86400}")
+        assert not openssl_accepts(f"openssl x509 -in {GP.get_file()} -noout -checkend {(days + 1) * 86400}")
+        expired = GP.get_not_after() + day
+        assert GP.days_left(expired) < 0
+        assert not openssl_accepts(f"{commands['validate_certificate'](AS_cert, GP.get_file())} -attime {int(expired.timestamp())}")
+        too_early = GP.get_not_before() - day
+        assert GP.days_left(too_early) == -1
+        assert not openssl_accepts(f"{commands['validate_certificate'](AS_cert, GP.get_file())} -attime {int(too_early.timestamp())}")
+
+        # a GP issued by another CA is rejected by both
+        _, other = issue(folder, (now - day, now + 365 * day), (now - day, now + 30 * day))
+        assert not GP.is_signed_by(other.get_certificate()) and not other.is_signed_by(CacheU.load_certificate(AS_cert))
+        assert not openssl_accepts(commands["validate_certificate"](AS_cert, other.get_file()))
+
+if __name__ == "__main__":
+    test_a_not_yet_valid_GP_is_accepted_once_valid()
+    test_a_positive_verdict_does_not_outlive_the_CA()
+    test_a_positive_verdict_expires_one_day_before_the_GP()
+    test_an_AS_issued_GP_agrees_with_openssl()
+    print("Certificate tests passed")
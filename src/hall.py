@@ -0,0 +1,309 @@
+import math
+import multiprocessing
+import os
+import shutil
+import time
+import traceback
+from multiprocessing.connection import wait
+from bingo import Bingo
+from DPA import DPA
+from round import RoundCoordinator
+import bingo_authentication as bingo_util
+
+# The workers are spawned, as the batch verification pool of the Bingo: forking a process with threads is unsafe
+_context = multiprocessing.get_context("spawn")
+
+def latency_stats(values):
+    """
+    Summarize a list of latencies.
+    # Arguments
+        values: list
+            The latencies, in seconds.
+    # Returns
+        dict
+            The number of samples, the mean, the nearest-rank p50, p95 and p99 and the maximum.
+    """
+    values = sorted(values)
+    stats = {"count": len(values), "mean": sum(values) / len(values)}
+    for percentile in (50, 95, 99):
+        stats[f"p{percentile}"] = values[max(0, math.ceil(percentile / 100 * len(values)) - 1)]
+    stats["max"] = values[-1]
+    return stats
+
+class Room:
+    """
+    A room of the hall: a table of players served by its own sala bingo.
+    # Attributes
+        name: string
+            The name of the room.
+        folder: string
+            The folder of the sala bingo of the room.
+        players: list
+            The players routed to the room.
+    """
+
+    __slots__ = ['name', 'folder', 'players']
+
+    def __init__(self, name, folder):
+        self.name = name
+        self.folder = folder
+        self.players = []
+
+def _play_room(room, rounds, blockchain):
+    """
+    Play a game in a room: authentication and validation of the players, the rounds and, with
+    the blockchain, the proclamation of the winner. It runs in the worker processes.
+    # Arguments
+        room: Room
+            The room.
+        rounds: int
+            The number of rounds.
+        blockchain: bool
+            True to play the blockchain version of the game.
+    # Returns
+        dict
+            The report of the room, with the latencies of every phase: the authentication and
+            the validation of each player, each round phase and the end of the game.
+    """
+    start = time.perf_counter()
+    phases = {"bingo_authentication": [], "validation": [], "end_game": []}
+    bingo = Bingo(room.folder)
+    coordinator = chain = None
+    try:
+        if blockchain:
+            bingo.set_blockchain()
+            chain = bingo.get_blockchain()
+        policy = DPA().choose_policy()
+        for player in room.players:
+            phase_start = time.perf_counter()
+            player.set_auth_id(bingo_util.authentication(player, bingo))
+            phases["bingo_authentication"].append(time.perf_counter() - phase_start)
+        validations = []
+        for player in room.players:
+            phase_start = time.perf_counter()
+            validations.append(bingo_util.validation(player, bingo, policy))
+            phases["validation"].append(time.perf_counter() - phase_start)
+        if any(validation is None for validation in validations):
+            raise Exception("Player not allowed to play")
+
+        bingo.start_game()
+        for player, (game_code, player_id, chain) in zip(room.players, validations):
+            player.start_game(game_code, player_id, chain)
+            bingo.receive_mapping(player_id, player.generate_mapping())
+        if blockchain:
+            bingo.add_pre_game_block()
+
+        final_strings = []
+        coordinator = RoundCoordinator(room.players, bingo)
+        for _ in range(rounds):
+            coordinator.run_round()
+            final_string = bingo.get_final_string()
+            if any(player.get_final_string() != final_string for player in room.players):
+                raise Exception("The players and the sala bingo computed different final strings")
+            final_strings.append(final_string)
+
+        winner = None
+        if blockchain:
+            phase_start = time.perf_counter()
+            winner = bingo.choose_winner()
+            bingo.end_game([player.get_winner(winner) for player in room.players])
+            for player in room.players:
+                player.end_game()
+            winner = winner[0]
+            phases["end_game"].append(time.perf_counter() - phase_start)
+        phases.update(coordinator.get_latencies())
+    finally:
+        # a failed room releases its game code, the batch verification pool and the threads of
+        # the coordinator, so the next rooms of the worker are not affected
+        if coordinator is not None:
+            coordinator.close()
+        if chain is not None:
+            chain.close()
+        bingo.close()
+
+    return {
+        "status": "ok",
+        "game_code": chain.get_game_code() if chain is not None else validations[0][0],
+        "players": len(room.players),
+        "rounds": len(final_strings),
+        "final_strings": final_strings,
+        "winner": winner,
+        "phases": phases,
+        "seconds": time.perf_counter() - start,
+    }
+
+def _serve_rooms(connection, rooms, rounds, blockchain):
+    """
+    Host a set of rooms, one after the other, and send the report of each room to the supervisor.
+    A failing room is reported and does not stop the other rooms of the worker.
+    It is the target of the worker processes.
+    """
+    try:
+        for room in rooms:
+            try:
+                report = _play_room(room, rounds, blockchain)
+            except (Exception, SystemExit) as e:
+                report = {"status": "failed", "error": f"{type(e).__name__}: {e}", "traceback": traceback.format_exc()}
+            connection.send((room.name, report))
+    finally:
+        connection.close()
+
+class Hall:
+    """
+    Supervisor of a bingo hall with many rooms.
+    The authenticated players are routed to the rooms, the rooms are sharded over a pool of
+    worker processes, each one hosting its own Bingo instances: the games scale with the cores
+    and a crashed worker takes down only its rooms.
+    # Attributes
+        _folder: string
+            The application folder, containing the AS folder.
+        _workers: int
+            The number of worker processes.
+        _table_size: int
+            The number of players of a room.
+        _room_count: int
+            The number of rooms the players are dealt into, None to fill a room before opening the next one.
+        _routed: int
+            The number of routed players.
+        _rooms: list
+            The rooms of the hall, in order of creation.
+        _reports: dict
+            key: room name, value: the report of the room in the last run.
+        _seconds: float
+            The elapsed time of the last run.
+    """
+
+    __slots__ = ['_folder', '_workers', '_table_size', '_room_count', '_routed', '_rooms', '_reports', '_seconds']
+
+    def __init__(self, folder, workers: int = None, table_size: int = 2, rooms: int = None):
+        if table_size < 1:
+            raise ValueError("A room needs at least one player")
+        if rooms is not None and rooms < 1:
+            raise ValueError("A hall needs at least one room")
+        self._folder = folder
+        self._workers = workers or os.cpu_count() or 1
+        self._table_size = table_size
+        self._room_count = rooms
+        self._routed = 0
+        self._rooms = []
+        self._reports = {}
+        self._seconds = 0.0
+
+    def route(self, player):
+        """
+        Route a player to the first room with a free seat, a new room is opened when all the rooms are full.
+        With a fixed number of rooms the players are dealt round-robin into them, regardless of the table size.
+        # Arguments
+            player: Player
+                The player, it must own a GP released by the AS.
+        # Returns
+            string
+                The name of the room of the player.
+        """
+        if player.send_GP() is None:
+            raise Exception("Player not authenticated.")
+        self._routed += 1
+        if self._room_count is not None:
+            room = self.__room(self._routed - 1) if len(self._rooms) < self._room_count else self._rooms[(self._routed - 1) % self._room_count]
+        else:
+            room = next((room for room in self._rooms if len(room.players) < self._table_size), None) or self.__room(len(self._rooms))
+        room.players.append(player)
+        return room.name
+
+    def __room(self, index):
+        name = f"room_{index}"
+        room = Room(name, os.path.join(self._folder, "Hall", name))
+        self._rooms.append(room)
+        return room
+
+    def get_rooms(self):
+        """
+        Returns the rooms of the hall.
+        # Returns
+            dict
+                key: room name, value: the names of the players of the room.
+        """
+        return {room.name: [player.get_name() for player in room.players] for room in self._rooms}
+
+    def __prepare(self, room):
+        # every sala bingo trusts the AS of the hall and reads its certificate from its own folder
+        os.makedirs(os.path.join(room.folder, "AS"), exist_ok=True)
+        shutil.copy(os.path.join(self._folder, "AS", "auto_certificate.cert"), os.path.join(room.folder, "AS", "auto_certificate.cert"))
+
+    def run(self, rounds: int = 1, blockchain: bool = True):
+        """
+        Play a game in every room.
+        # Arguments
+            rounds: int
+                The number of rounds of every game.
+            blockchain: bool
+                True to play the blockchain version of the games.
+        # Returns
+            dict
+                key: room name, value: the report of the room, with status "ok", "failed" if the game
+                raised an error or "crashed" if its worker died.
+        """
+        start = time.perf_counter()
+        for room in self._rooms:
+            self.__prepare(room)
+
+        workers = min(self._workers, len(self._rooms))
+        shards = [self._rooms[worker::workers] for worker in range(workers)]
+        readers = {}
+        for shard in shards:
+            reader, writer = _context.Pipe(duplex=False)
+            process = _context.Process(target=_serve_rooms, args=(writer, shard, rounds, blockchain))
+            process.start()
+            writer.close()
+            readers[reader] = (process, shard)
+
+        reports = {}
+        while readers:
+            for reader in wait(list(readers)):
+                try:
+                    name, report = reader.recv()
+                    reports[name] = report
+                except EOFError:
+                    # the worker exited: the rooms without a report were lost with it
+                    process, shard = readers.pop(reader)
+                    process.join()
+                    reader.close()
+                    for room in shard:
+                        reports.setdefault(room.name, {"status": "crashed", "error": f"worker exited with code {process.exitcode}"})
+
+        self._reports = {room.name: reports[room.name] for room in self._rooms}
+        self._seconds = time.perf_counter() - start
+        return dict(self._reports)
+
+    def summary(self):
+        """
+        Aggregate the reports of the last run.
+        # Returns
+            dict
+                The number of rooms per status, of players and of rounds, the elapsed time and the
+                rounds per second, the last final string of every room and the latency_stats
+                of every phase over all the rooms.
+        """
+        statuses = {}
+        players = rounds = 0
+        final_strings = {}
+        latencies = {}
+        for name, report in self._reports.items():
+            statuses[report["status"]] = statuses.get(report["status"], 0) + 1
+            if report["status"] != "ok":
+                continue
+            players += report["players"]
+            rounds += report["rounds"]
+            final_strings[name] = report["final_strings"][-1] if report["final_strings"] else None
+            for phase, values in report["phases"].items():
+                latencies.setdefault(phase, []).extend(values)
+
+        return {
+            "rooms": statuses,
+            "players": players,
+            "rounds": rounds,
+            "seconds": self._seconds,
+            "rounds_per_second": rounds / self._seconds if self._seconds > 0 else 0.0,
+            "final_strings": final_strings,
+            "phases": {phase: latency_stats(values) for phase, values in latencies.items() if values},
+        }
@@ -0,0 +1,79 @@
+import os
+import shutil
+from round_test import application
+from player import Player
+from AS import AS
+from blockchain import Blockchain
+from hall import Hall, Room, _play_room
+import AS_authentication as AS_util
+
+class Guest:
+    """
+    A player authenticated by the AS, it is enough to be routed.
+    """
+
+    def __init__(self, name, GP = 'GP.cert'):
+        self.name = name
+        self.GP = GP
+
+    def send_GP(self):
+        return self.GP
+
+class Forger(Player):
+    """
+    A player sending forged clear fields: it fails the validation.
+    """
+
+    def send_clear_fields(self, policy):
+        clear_fields, merkle_proofs, indices = super().send_clear_fields(policy)
+        return [field + "0" for field in clear_fields], merkle_proofs, indices
+
+def players(folder, classes):
+    players = [player_class([f"Player{index}", "IT", "F", "Rome", "1990-01-01", f"CF{index}"], folder) for index, player_class in enumerate(classes)]
+    authority = AS(folder)
+    for player in players:
+        AS_util.authentication(player, authority)
+    return players
+
+def test_players_fill_a_room_before_the_next_one():
+    hall = Hall('Application', table_size=2)
+    assert [hall.route(Guest(str(index))) for index in range(5)] == ['room_0', 'room_0', 'room_1', 'room_1', 'room_2']
+    assert [room.folder for room in hall._rooms] == [os.path.join('Application', 'Hall', f'room_{index}') for index in range(3)]
+    try:
+        hall.route(Guest('stranger', None))
+        assert False, "a player without a GP should be refused"
+    except Exception as e:
+        assert str(e) == "Player not authenticated."
+    assert sum(len(room.players) for room in hall._rooms) == 5
+
+def test_a_room_without_the_blockchain():
+    with application() as folder:
+        hall = Hall(folder, workers=1)
+        for player in players(folder, [Player, Player]):
+            hall.route(player)
+        reports = hall.run(rounds=2, blockchain=False)
+    assert list(reports) == ['room_0']
+    report = reports['room_0']
+    assert report['status'] == 'ok', report.get('traceback')
+    assert report['players'] == 2 and report['rounds'] == 2 and report['winner'] is None
+    assert len(set(report['final_strings'])) == 2
+    assert report['phases']['end_game'] == [] and len(report['phases']['commit']) == 2
+
+def test_a_failed_room_releases_its_chain():
+    with application() as folder:
+        room = Room('room_0', os.path.join(folder, 'Hall', 'room_0'))
+        os.makedirs(os.path.join(room.folder, 'AS'))
+        room.players = players(folder, [Player, Forger])
+        shutil.copy(os.path.join(folder, 'AS', 'auto_certificate.cert'), os.path.join(room.folder, 'AS', 'auto_certificate.cert'))
+        try:
+            _play_room(room, 1, True)
+            assert False, "the forged fields should be rejected"
+        except Exception as e:
+            assert str(e) == "Player not allowed to play"
+        assert Blockchain.open_chains() == []
+
+if __name__ == "__main__":
+    test_players_fill_a_room_before_the_next_one()
+    test_a_room_without_the_blockchain()
+    test_a_failed_room_releases_its_chain()
+    print("Hall tests passed")
@@ -0,0 +1,74 @@
+import os
+import tempfile
+import utils.bash_util as BU
+import utils.hash_util as HU
+from utils.commands_util import commands
+
+# Samples shaped like the data hashed by the application: hex digests, merkle
+# node concatenations, commit messages and multi-line block bodies.
+samples = [
+    "",
+    "a",
+    "Alice1990-01-01",
+    "d5c1f2e0a4b3" * 10,
+    "0" + "8f14e45fceea167a5a36dedd4bea2543" + "1" + "2023-06-01 10:00:00.123456",
+    "----------START HEADER BLOCK----------\nBlock Number: 1\nOn Chain: False\nPublic Key: MFkwEwYHKoZIzj0CAQYIKoZIzj0DAQcDQgAE+/=\n",
+    "Autorità Sanitaria",
+]
+
+def openssl_hash_from_data(data):
+    return BU.execute_command(commands["compute_hash_from_data"](data)).split('= ')[1].strip()
+
+def test_compute_hash_from_data_matches_openssl():
+    for data in samples:
+        assert HU.compute_hash_from_data(data) == openssl_hash_from_data(data)
+
+def test_hash_many_matches_single_hashes():
+    assert HU.hash_many(samples) == [HU.compute_hash_from_data(data) for data in samples]
+
+def test_compute_hash_from_file_matches_openssl():
+    with tempfile.TemporaryDirectory() as folder:
+        in_file = os.path.join(folder, "body.txt")
+        out_file = os.path.join(folder, "hash.txt")
+        with open(in_file, "w") as f:
+            f.write("\n".join(samples))
+        HU.compute_hash_from_file(in_file, out_file)
+        with open(out_file, "r") as f:
+            digest = f.read()
+        expected = BU.execute_command(f'openssl dgst -sha3-256 {in_file}').split('= ')[1].strip()
+        assert digest == expected
+
+def test_concatenation_hash_matches_hash_of_concatenation():
+    hasher = HU.ConcatenationHash()
+    for data in samples:
+        hasher.update(data)
+    assert hasher.hexdigest() == HU.compute_hash_from_data("".join(samples))
+
+def test_transcript_is_length_prefixed():
+    assert HU.Transcript("t").hexdigest() != HU.Transcript("").hexdigest()
+    first, second = HU.Transcript(), HU.Transcript()
+    first.absorb("ab", "c")
+    second.absorb("a", "bc")
+    assert first.digest() != second.digest()
+
+def test_transcript_absorbs_incrementally():
+    whole, incremental = HU.Transcript("round"), HU.Transcript("round")
+    whole.absorb(*samples)
+    for data in samples:
+        incremental.absorb(data)
+    assert whole.digest() == incremental.digest()
+    assert len(whole.digest()) == 32
+
+    copy = incremental.copy()
+    copy.absorb("opening")
+    assert incremental.digest() == whole.digest()
+    assert copy.digest() != whole.digest()
+
+if __name__ == "__main__":
+    test_compute_hash_from_data_matches_openssl()
+    test_hash_many_matches_single_hashes()
+    test_compute_hash_from_file_matches_openssl()
+    test_concatenation_hash_matches_hash_of_concatenation()
+    test_transcript_is_length_prefixed()
+    test_transcript_absorbs_incrementally()
+    print("hash_util is compatible with the OpenSSL CLI")
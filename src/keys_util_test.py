@@ -0,0 +1,88 @@
+import os
+import subprocess
+import tempfile
+import utils.bash_util as BU
+import utils.keys_util as KU
+from utils.commands_util import commands
+
+# Messages shaped like the signed data: a commit message and a block hash.
+messages = [
+    KU.concatenate("0", "8f14e45fceea167a5a36dedd4bea2543", "1", "2023-06-01 10:00:00.123456", "d5c1f2e0a4b3" * 10),
+    "5ac92cd7a58538ed3705a7b1798877a4eaa1cce347c533a1e2762ce8d0e51970",
+]
+
+# `openssl pkeyutl -sign` signs its input as a digest and refuses inputs longer than 64 bytes.
+digests = [
+    "5ac92cd7a58538ed3705a7b1798877a4eaa1cce347c533a1e2762ce8d0e51970",
+    "8f14e45fceea167a5a36dedd4bea2543",
+]
+
+def write(folder, name, data):
+    path = os.path.join(folder, name)
+    with open(path, 'w') as f:
+        f.write(data)
+    return path
+
+def cli_verifies(command):
+    try:
+        BU.execute_command(command)
+        return True
+    except subprocess.CalledProcessError:
+        return False
+
+def ECDSA_keys(folder):
+    priv_key_file, pub_key_file = os.path.join(folder, 'private_key.pem'), os.path.join(folder, 'public_key.pem')
+    KU.gen_ECDSA_keys('prime256v1', os.path.join(folder, 'params.txt'), priv_key_file, pub_key_file)
+    return priv_key_file, pub_key_file
+
+def RSA_keys(folder):
+    priv_key_file, pub_key_file = os.path.join(folder, 'rsa_private_key.pem'), os.path.join(folder, 'rsa_public_key.pem')
+    KU.gen_RSA_keys(2048, priv_key_file)
+    KU.export_RSA_pub_key(priv_key_file, pub_key_file)
+    return priv_key_file, pub_key_file
+
+def test_ECDSA_signatures_verify_with_openssl():
+    with tempfile.TemporaryDirectory() as folder:
+        priv_key_file, pub_key_file = ECDSA_keys(folder)
+        for index, message in enumerate(messages):
+            data_file = write(folder, f'data{index}.txt', message)
+            signature_file = os.path.join(folder, f'signature{index}.pem')
+            KU.sign_ECDSA_from_variable(priv_key_file, message, signature_file)
+            assert cli_verifies(commands["ECDSA_verify"](data_file, signature_file, pub_key_file))
+            tampered_file = write(folder, f'tampered{index}.txt', message + "0")
+            assert not cli_verifies(commands["ECDSA_verify"](tampered_file, signature_file, pub_key_file))
+
+def test_openssl_ECDSA_signatures_verify_in_process():
+    with tempfile.TemporaryDirectory() as folder:
+        priv_key_file, pub_key_file = ECDSA_keys(folder)
+        pub_key = KU.load_public_key(pub_key_file)
+        for index, message in enumerate(messages):
+            data_file = write(folder, f'data{index}.txt', message)
+            signature_file = os.path.join(folder, f'signature{index}.pem')
+            BU.execute_command(commands["ECDSA_sign"](data_file, priv_key_file, signature_file))
+            signature = KU.read_signature(signature_file)
+            assert KU.verify_ECDSA_bytes(pub_key, message.encode(), signature)
+            assert KU.verify_ECDSA(pub_key_file, data_file, signature_file)
+            assert not KU.verify_ECDSA_bytes(pub_key, (message + "0").encode(), signature)
+
+def test_RSA_signatures_match_openssl():
+    with tempfile.TemporaryDirectory() as folder:
+        priv_key_file, pub_key_file = RSA_keys(folder)
+        for index, message in enumerate(digests):
+            data_file = write(folder, f'data{index}.txt', message)
+            signature_file, cli_signature_file = os.path.join(folder, f'signature{index}.bin'), os.path.join(folder, f'cli_signature{index}.bin')
+            KU.sign_RSA(priv_key_file, data_file, signature_file)
+            BU.execute_command(commands["RSA_sign"](data_file, priv_key_file, cli_signature_file))
+            # PKCS#1 v1.5 is deterministic: the same bytes in both directions
+            assert KU.read_signature(signature_file) == KU.read_signature(cli_signature_file)
+            assert cli_verifies(commands["RSA_verify"](data_file, signature_file, pub_key_file))
+            assert KU.verify_RSA(pub_key_file, data_file, cli_signature_file)
+            tampered_file = write(folder, f'tampered{index}.txt', message + "0")
+            assert not cli_verifies(commands["RSA_verify"](tampered_file, signature_file, pub_key_file))
+            assert not KU.verify_RSA(pub_key_file, tampered_file, cli_signature_file)
+
+if __name__ == "__main__":
+    test_ECDSA_signatures_verify_with_openssl()
+    test_openssl_ECDSA_signatures_verify_in_process()
+    test_RSA_signatures_match_openssl()
+    print("keys_util is compatible with the OpenSSL CLI")
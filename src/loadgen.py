@@ -0,0 +1,115 @@
+import argparse
+import os
+import shutil
+import sys
+import time
+from player import Player
+from AS import AS
+from hall import Hall, latency_stats
+import AS_authentication as AS_util
+import utils.bash_util as BU
+
+# The OpenSSL configurations of the AS and of the CA of the players point to this folder
+_folder = "Application"
+# Written in the folder by the load generator: only a folder with it is reset by the next run
+_marker = os.path.join(_folder, ".loadgen")
+
+def _create_players(folder, count, phases):
+    """
+    Create the players and get their GPs from the AS.
+    The AS signs the GPs with a shared extensions file, so its phase runs in this process, one player after the other.
+    """
+    players = []
+    for index in range(count):
+        start = time.perf_counter()
+        players.append(Player([f"Player{index}", "IT", "F", "Rome", "1990-01-01", f"CF{index}"], folder))
+        phases["player_creation"].append(time.perf_counter() - start)
+
+    authority = AS(folder)
+    for player in players:
+        start = time.perf_counter()
+        AS_util.authentication(player, authority)
+        phases["AS_authentication"].append(time.perf_counter() - start)
+    return players
+
+def run(players: int, games: int, rounds: int, workers: int = None, blockchain: bool = True):
+    """
+    Run the whole game flow with synthetic players: AS authentication, Bingo authentication,
+    validation, rounds and end of the game, with the games played by a Hall.
+    # Arguments
+        players: int
+            The number of players, dealt round-robin into the games.
+        games: int
+            The number of concurrent games.
+        rounds: int
+            The number of rounds of every game.
+        workers: int
+            The number of worker processes of the hall (default: number of CPUs).
+        blockchain: bool
+            True to play the blockchain version of the games.
+    # Returns
+        dict
+            The summary of the hall with the latency_stats of every phase, AS phases included,
+            and the throughput of the run.
+    The application folder is reset if it was created by a previous run, an existing
+    folder of the game is never deleted.
+    """
+    if players < games or games < 1 or rounds < 1:
+        raise ValueError("Every game needs at least one player and one round")
+    if os.path.exists(_folder):
+        if not os.path.isfile(_marker):
+            raise FileExistsError(f"{_folder} was not created by the load generator, remove it to run")
+        shutil.rmtree(_folder)
+    os.makedirs(_folder)
+    open(_marker, 'w').close()
+    BU.enable_command_pool()
+
+    start = time.perf_counter()
+    phases = {"player_creation": [], "AS_authentication": []}
+    hall = Hall(_folder, workers, rooms=games)
+    for player in _create_players(_folder, players, phases):
+        hall.route(player)
+    setup_seconds = time.perf_counter() - start
+
+    reports = hall.run(rounds, blockchain)
+    if len(reports) != games:
+        raise Exception(f"The hall played {len(reports)} games instead of {games}")
+    summary = hall.summary()
+    summary["phases"] = {**{phase: latency_stats(values) for phase, values in phases.items()}, **summary["phases"]}
+    summary["setup_seconds"] = setup_seconds
+    summary["games_per_second"] = summary["rooms"].get("ok", 0) / summary["seconds"] if summary["seconds"] > 0 else 0.0
+    summary["total_seconds"] = time.perf_counter() - start
+    return summary
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Generate a synthetic load on the whole game flow and report the latency of every phase.")
+    parser.add_argument("-n", "--players", type=int, default=6, help="the number of players (default: 6)")
+    parser.add_argument("-g", "--games", type=int, default=2, help="the number of concurrent games (default: 2)")
+    parser.add_argument("-r", "--rounds", type=int, default=10, help="the number of rounds of every game (default: 10)")
+    parser.add_argument("-w", "--workers", type=int, default=None, help="worker processes hosting the games (default: number of CPUs)")
+    parser.add_argument("--no-blockchain", action="store_true", help="play the version of the game without the blockchain")
+    parser.add_argument("--csv", default=None, help="export the latency of every phase to a csv file")
+    args = parser.parse_args(argv)
+
+    summary = run(args.players, args.games, args.rounds, args.workers, not args.no_blockchain)
+
+    print("---------- LOAD ----------")
+    print(f"Players: {summary['players']} of {args.players}, games: {summary['rooms']}, rounds: {summary['rounds']}")
+    print(f"Setup (players and AS): {summary['setup_seconds']:.3f} s")
+    print(f"Games: {summary['seconds']:.3f} s ({summary['games_per_second']:.2f} games/s, {summary['rounds_per_second']:.2f} rounds/s)")
+    print(f"{'Phase':<22}{'count':>8}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}{'max ms':>10}")
+    for phase, stats in summary["phases"].items():
+        print(f"{phase:<22}{stats['count']:>8}{stats['p50'] * 1000:>10.2f}{stats['p95'] * 1000:>10.2f}{stats['p99'] * 1000:>10.2f}{stats['max'] * 1000:>10.2f}")
+
+    if args.csv:
+        with open(args.csv, 'w') as f:
+            f.write("phase,count,mean,p50,p95,p99,max\n")
+            for phase, stats in summary["phases"].items():
+                f.write(f"{phase},{stats['count']},{stats['mean']},{stats['p50']},{stats['p95']},{stats['p99']},{stats['max']}\n")
+        print("Latencies exported to", args.csv)
+
+    # a failed or crashed game is a regression
+    return 0 if set(summary["rooms"]) == {"ok"} else 1
+
+if __name__ == "__main__":
+    sys.exit(main())
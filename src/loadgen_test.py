@@ -0,0 +1,56 @@
+import os
+import shutil
+import tempfile
+import loadgen
+from hall import Hall
+from hall_test import Guest
+
+def test_players_are_dealt_into_the_requested_rooms():
+    hall = Hall('Application', rooms=4)
+    for index in range(5):
+        hall.route(Guest(str(index)))
+    assert [len(room.players) for room in hall._rooms] == [2, 1, 1, 1]
+
+def test_a_small_run_without_the_blockchain():
+    source = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'configuration_files')
+    cwd = os.getcwd()
+    with tempfile.TemporaryDirectory() as folder:
+        # the OpenSSL configurations are read from src/configuration_files and write to Application
+        shutil.copytree(source, os.path.join(folder, 'src', 'configuration_files'))
+        os.chdir(folder)
+        try:
+            summary = loadgen.run(players=3, games=2, rounds=2, workers=1, blockchain=False)
+        finally:
+            os.chdir(cwd)
+    assert summary['rooms'] == {'ok': 2}
+    assert summary['players'] == 3
+    assert summary['rounds'] == 4
+    phases = summary['phases']
+    for phase in ('player_creation', 'AS_authentication', 'bingo_authentication', 'validation'):
+        assert phases[phase]['count'] == 3
+    # a latency for every round of every room
+    for phase in ('commit', 'publish_commitments', 'open', 'reveal'):
+        assert phases[phase]['count'] == 2 * 2
+    assert 'end_game' not in phases
+
+def test_a_folder_of_the_game_is_not_deleted():
+    cwd = os.getcwd()
+    with tempfile.TemporaryDirectory() as folder:
+        os.chdir(folder)
+        try:
+            os.makedirs(os.path.join('Application', 'AS'))
+            open(os.path.join('Application', 'AS', 'auto_certificate.cert'), 'w').close()
+            try:
+                loadgen.run(players=1, games=1, rounds=1, workers=1, blockchain=False)
+                assert False, "the folder of the game should be kept"
+            except FileExistsError:
+                pass
+            assert os.path.isfile(os.path.join('Application', 'AS', 'auto_certificate.cert'))
+        finally:
+            os.chdir(cwd)
+
+if __name__ == "__main__":
+    test_players_are_dealt_into_the_requested_rooms()
+    test_a_small_run_without_the_blockchain()
+    test_a_folder_of_the_game_is_not_deleted()
+    print("Loadgen tests passed")
@@ -7,6 +7,8 @@ import bingo_authentication as bingo_util
 import round
 import time
 import os
+import utils.bash_util as BU
+import utils.cache_util as CacheU
 
 performance = {}
 
@@ -16,6 +18,7 @@ def main():
     if os.path.exists(folder):
         os.system("rm -r " + folder)
     os.mkdir(folder)
+    BU.enable_command_pool()
     
     alice = Player(["Alice", "IT", "F", "Rome", "1990-01-01", "CF1"], folder)
     bob = Player(["Bob", "IT", "F", "Rome", "1999-01-01", "CF2"], folder)
@@ -68,16 +71,22 @@ def main():
     bingo.add_pre_game_block()
     performance["Players initializations"] = time.time() - start_time
     
-    start_time = time.time()
-    round.multi_play([alice,bob],bingo)
-    r = 1
-    performance["Round "+str(r)] = time.time() - start_time
-    
-    for i in range(0, 9):
-        start_time = time.time()
-        r += 1
-        round.multi_play([alice,bob],bingo)
-        performance["Round "+str(r)] = time.time() - start_time
+    # one coordinator, with its executor and event loop, for all the rounds of the game
+    coordinator = round.RoundCoordinator([alice,bob],bingo)
+    try:
+        for r in range(1, 11):
+            start_time = time.time()
+            coordinator.run_round()
+            performance["Round "+str(r)] = time.time() - start_time
+    except round.RoundAborted as e:
+        print("Game aborted:", e)
+        bingo.get_blockchain().close()
+        bingo.close()
+        return
+    finally:
+        coordinator.close()
+    for phase, latencies in coordinator.get_latencies().items():
+        performance["Phase "+phase] = sum(latencies)
         
     start_time = time.time()
     winner = bingo.choose_winner()
@@ -93,9 +102,15 @@ def main():
     performance["Winner proclamation and end game"] = time.time() - start_time
 
     print("---------- GAME END ----------")
+    # human readable dump of the blockchain log, written outside of the measured phases
+    bingo.get_blockchain().export_text()
+    bingo.get_blockchain().close()
+    bingo.close()
     print("---------- PERFORMANCE ----------")
     for key in performance:
         print(key, ":", performance[key])
+    print("OpenSSL commands:", BU.command_stats())
+    print("PEM cache:", CacheU.cache_info())
         
     # export performances to a csv file
     with open('performance.csv', 'w') as f:
@@ -1,110 +1,340 @@
+import binascii
+import hashlib
+import os
+from itertools import repeat
 import utils.hash_util as HU
 
+_digest_size = 32 # byte di un digest SHA3-256
+_chunk_nodes = 65536 # nodi convertiti in esadecimale alla volta durante la costruzione
+_parallel_batch_threshold = 4096 # sotto questo numero di prove verify_many non usa l'executor
+
+class MerkleTree:
+    """
+        Merkle Tree costruito una sola volta e memorizzato per livelli.
+        Ogni livello è un bytearray contiguo di digest da 32 byte: il livello 0 contiene le foglie,
+        l'ultimo livello contiene solo la radice.
+        Come in merkle_tree, il nodo padre è l'hash della concatenazione delle rappresentazioni
+        esadecimali dei figli e, se un livello ha un numero dispari di nodi, l'ultimo nodo viene duplicato.
+        La radice e le prove sono quindi identiche a quelle di merkle_tree e merkle_proof.
+    """
+
+    __slots__ = ['_levels', '_sizes']
+
+    def __init__(self, leaves):
+        """
+            Costruisce l'albero a partire da una lista di foglie esadecimali (digest SHA3-256).
+        """
+        if len(leaves) == 0:
+            raise ValueError("Empty Merkle Tree")
+        try:
+            raw = bytes.fromhex(''.join(leaves))
+        except ValueError:
+            raw = b''
+        if len(raw) != _digest_size * len(leaves):
+            raise ValueError("Leaves must be SHA3-256 hex digests")
+        self.__build(raw, len(leaves))
+
+    @classmethod
+    def from_raw_leaves(cls, raw_leaves):
+        """
+            Costruisce l'albero a partire dalla concatenazione dei digest grezzi delle foglie.
+        """
+        if len(raw_leaves) == 0 or len(raw_leaves) % _digest_size != 0:
+            raise ValueError("Leaves must be 32-byte digests")
+        tree = cls.__new__(cls)
+        tree.__build(bytes(raw_leaves), len(raw_leaves) // _digest_size)
+        return tree
+
+    def __build(self, raw, size):
+        self._levels = [bytearray(raw)]
+        self._sizes = [size]
+        # Si calcola sempre almeno un livello, come merkle_tree con una sola foglia
+        while True:
+            self._levels.append(MerkleTree.__parent_level(self._levels[-1], self._sizes[-1]))
+            self._sizes.append((self._sizes[-1] + 1) // 2)
+            if self._sizes[-1] == 1:
+                break
+
+    @staticmethod
+    def __parent_level(level, size):
+        """
+            Calcola il livello superiore. La concatenazione esadecimale di due fratelli è una
+            sottostringa contigua della rappresentazione esadecimale del livello.
+        """
+        sha3_256 = hashlib.sha3_256
+        parents = bytearray()
+        for start in range(0, size, _chunk_nodes):
+            end = min(start + _chunk_nodes, size)
+            hex_level = binascii.hexlify(level[start * _digest_size:end * _digest_size])
+            if (end - start) % 2 != 0:
+                hex_level += hex_level[-2 * _digest_size:]
+            for i in range(0, len(hex_level), 4 * _digest_size):
+                parents += sha3_256(hex_level[i:i + 4 * _digest_size]).digest()
+        return parents
+
+    def __node(self, level, index):
+        return bytes(self._levels[level][index * _digest_size:(index + 1) * _digest_size])
+
+    def __len__(self):
+        return self._sizes[0]
+
+    def get_root(self):
+        """
+            Restituisce la radice esadecimale dell'albero.
+        """
+        return self.__node(len(self._levels) - 1, 0).hex()
+
+    def get_leaf(self, index):
+        """
+            Restituisce la foglia esadecimale con indice index.
+        """
+        if not 0 <= index < self._sizes[0]:
+            raise IndexError("Leaf index out of range")
+        return self.__node(0, index).hex()
+
+    def proof(self, index):
+        """
+            Restituisce la prova di Merkle per la foglia con indice index in O(log n),
+            nello stesso formato di merkle_proof: una lista di tuple (hash, indice del fratello).
+            Se il nodo è l'ultimo di un livello dispari, il fratello è il suo duplicato.
+        """
+        if not 0 <= index < self._sizes[0]:
+            raise IndexError("Leaf index out of range")
+        proof = []
+        for level in range(len(self._levels) - 1):
+            sibling = index ^ 1
+            node = sibling if sibling < self._sizes[level] else index
+            proof.append((self.__node(level, node).hex(), sibling))
+            index //= 2
+        return proof
+
+    def binary_proof(self, index):
+        """
+            Restituisce la prova di Merkle binaria per la foglia con indice index: la concatenazione
+            dei digest grezzi dei fratelli, dal livello delle foglie verso la radice.
+            I bit di direzione coincidono con i bit dell'indice della foglia.
+        """
+        if not 0 <= index < self._sizes[0]:
+            raise IndexError("Leaf index out of range")
+        proof = bytearray()
+        for level in range(len(self._levels) - 1):
+            sibling = index ^ 1
+            proof += self.__node(level, sibling if sibling < self._sizes[level] else index)
+            index //= 2
+        return bytes(proof)
+
+    def multiproof(self, indices):
+        """
+            Restituisce un'unica prova di Merkle per un insieme di foglie.
+            La prova è una tupla (numero di foglie, lista di hash): a ogni livello, scorrendo i nodi noti
+            in ordine crescente, contiene solo i fratelli che il verificatore non può calcolare da sé,
+            per cui i nodi condivisi dai cammini delle foglie vengono inviati e calcolati una sola volta.
+        """
+        known = sorted(set(indices))
+        if len(known) == 0:
+            raise ValueError("Empty set of leaves")
+        if known[0] < 0 or known[-1] >= self._sizes[0]:
+            raise IndexError("Leaf index out of range")
+        siblings = []
+        for level in range(len(self._levels) - 1):
+            known_set = set(known)
+            for index in known:
+                sibling = index ^ 1
+                if sibling < self._sizes[level] and sibling not in known_set:
+                    siblings.append(self.__node(level, sibling).hex())
+            known = sorted({index // 2 for index in known})
+        return self._sizes[0], siblings
+
+    def update(self, index, leaf):
+        """
+            Sostituisce la foglia con indice index e ricalcola in O(log n) i nodi del suo cammino verso la radice.
+        """
+        if not 0 <= index < self._sizes[0]:
+            raise IndexError("Leaf index out of range")
+        raw = bytes.fromhex(leaf)
+        if len(raw) != _digest_size:
+            raise ValueError("Leaves must be SHA3-256 hex digests")
+        self._levels[0][index * _digest_size:(index + 1) * _digest_size] = raw
+
+        for level in range(len(self._levels) - 1):
+            left = index - index % 2
+            right = left + 1 if left + 1 < self._sizes[level] else left
+            parent = hashlib.sha3_256(binascii.hexlify(self.__node(level, left)) + binascii.hexlify(self.__node(level, right))).digest()
+            index //= 2
+            self._levels[level + 1][index * _digest_size:(index + 1) * _digest_size] = parent
+
 def merkle_tree(leaves):
     """
         Funzione che prende in input una lista di foglie e restituisce la radice del Merkle Tree.
         Se il livello ha un numero dispari di nodi, l'ultimo nodo viene duplicato.
+        La lista di foglie non viene modificata.
+        Le foglie devono essere digest SHA3-256 esadecimali (64 caratteri), come gli hash dei campi del GP:
+        i dati vanno prima passati a HU.compute_hash_from_data o HU.hash_many, altrimenti viene sollevato ValueError.
     """
-    if len(leaves) % 2 != 0:
-        leaves.append(leaves[-1])
-    
-    parent_nodes = []
-    
-    for i in range(0, len(leaves), 2):
-        parent_node = HU.compute_hash_from_data(leaves[i] + leaves[i+1])
-        parent_nodes.append(parent_node)
-        
-    if len(parent_nodes) == 1:
-        return parent_nodes[0]
-    else:
-        return merkle_tree(parent_nodes)
+    return MerkleTree(leaves).get_root()
 
 def merkle_proof(leaves, index):
     """
         Funzione che prende in input una lista di foglie e un indice e restituisce la prova di Merkle per la foglia con indice index.
-        La funzione richiede che la lista di foglie sia stata estesa con foglie duplicate se il numero non è una potenza di 2.
+
+        Le foglie devono essere digest SHA3-256 esadecimali, come in merkle_tree; il numero di foglie
+        non deve più essere una potenza di 2.
 
         La lista restituita ha la seguente struttura:
         - L'elemento in posizione i è la prova al livello i
         - Ogni elemento della lista è una tupla (hash,indice del livello)
     """
+    return MerkleTree(leaves).proof(index)
     
-    # Se sono alla radice non devo calcolare nessun livello superiore, restituisco
-    if len(leaves) == 1:
-        return [] # Nessuna come proof del livello
 
-    # Non sono alla radice, calcolo il livello superiore
-    parent_nodes = []
+def merkle_multiproof(leaves, indices):
+    """
+        Funzione che prende in input una lista di foglie e una lista di indici e restituisce
+        un'unica prova di Merkle per tutte le foglie indicate (vedi MerkleTree.multiproof).
+    """
+    return MerkleTree(leaves).multiproof(indices)
 
-    # Calcolo i nodi genitori del livello successivo.
-    for i in range(0, len(leaves), 2):
-        parent_node = HU.compute_hash_from_data(leaves[i] + leaves[i + 1])
-        parent_nodes.append(parent_node)
+def verify_multiproof(root, multiproof, leaves):
+    """
+        Funzione che verifica una prova di Merkle multipla.
+        leaves è un dizionario che associa l'indice di ogni foglia al suo hash.
+        La prova è valida se ricostruisce la radice consumando esattamente tutti gli hash ricevuti.
+    """
+    size, siblings = multiproof
+    if len(leaves) == 0 or min(leaves) < 0 or max(leaves) >= size:
+        return False
 
-    proof = []
-    proof.append((leaves[__sibling_index(index)], __sibling_index(index)))
+    nodes = dict(leaves)
+    position = 0
+    try:
+        # Si calcola sempre almeno un livello, come in merkle_tree con una sola foglia
+        while True:
+            parents = {}
+            for index in sorted(nodes):
+                if index % 2 == 0:
+                    left = nodes[index]
+                    if index + 1 in nodes:
+                        right = nodes[index + 1]
+                    elif index + 1 >= size: # ultimo nodo di un livello dispari, viene duplicato
+                        right = left
+                    else:
+                        right = siblings[position]
+                        position += 1
+                elif index - 1 in nodes: # già accorpato con il fratello sinistro
+                    continue
+                else:
+                    left = siblings[position]
+                    position += 1
+                    right = nodes[index]
+                parents[index // 2] = HU.compute_hash_from_data(left + right)
+            nodes = parents
+            size = (size + 1) // 2
+            if size == 1:
+                break
+    except IndexError:
+        return False
 
-    return proof + merkle_proof(parent_nodes, __parent_index(index))
-    
+    return position == len(siblings) and nodes[0] == root
 
 def verify_proof(root, proof, leaf, index):
     """
         Funzione che verifica la prova di Merkle per la foglia con indice index.
+        Accetta sia la prova nel formato di merkle_proof sia la prova binaria di MerkleTree.binary_proof.
     """
+    if not isinstance(proof, (bytes, bytearray)):
+        proof = pack_proof(proof)
+    return verify_binary_proof(root, proof, leaf, index)
 
-    # Accorpo la foglia e il fratello che è il primo elemento della proof
-    if index > proof[0][1]: # Se la foglia è fratello destro
-        proof = [(HU.compute_hash_from_data(proof[0][0] + leaf), __parent_index(index))] + proof[1:]
-    else: # Se la foglia è fratello sinistro
-        proof = [(HU.compute_hash_from_data(leaf + proof[0][0]), __parent_index(index))] + proof[1:]
-        
-    return root == __verify_proof_aux(proof)[0][0]
+def pack_proof(proof):
+    """
+        Converte una prova nel formato di merkle_proof nella prova binaria equivalente.
+    """
+    return b''.join(bytes.fromhex(sibling) for sibling, _ in proof)
 
-def __verify_proof_aux(proof):
-    
-    # Se ho un solo elemento nella proof, sono arrivato alla radice
-    if len(proof) == 1:
-        return proof
+def verify_binary_proof(root, proof, leaf, index):
+    """
+        Funzione che verifica in modo iterativo una prova di Merkle binaria.
+        A ogni livello il bit meno significativo dell'indice indica se il nodo corrente è il figlio destro.
+    """
+    depth, remainder = divmod(len(proof), _digest_size)
+    if remainder != 0 or depth == 0 or index < 0 or index >> depth != 0:
+        return False
 
-    # I primi due elementi di proof saranno sempre dello stesso livello, li concateno a seconda del loro indice
-    if proof[0][1] < proof[1][1]:
-        proof = [(HU.compute_hash_from_data(proof[0][0] + proof[1][0]), __parent_index(proof[0][1]))] + proof[2:]
-    else:
-        proof = [(HU.compute_hash_from_data(proof[1][0] + proof[0][0]), __parent_index(proof[0][1]))] + proof[2:]
+    sha3_256 = hashlib.sha3_256
+    hexlify = binascii.hexlify
+    node = leaf.encode()
+    for offset in range(0, len(proof), _digest_size):
+        sibling = hexlify(proof[offset:offset + _digest_size])
+        node = hexlify(sha3_256(sibling + node if index & 1 else node + sibling).digest())
+        index >>= 1
+    return node == root.encode()
 
-    return __verify_proof_aux(proof)
+def verify_many(root, items, executor = None):
+    """
+        Funzione che verifica un insieme di prove di Merkle rispetto alla stessa radice.
+        items è una lista di tuple (foglia, indice, prova) e restituisce la lista degli esiti nello stesso ordine.
+        Le prove vengono verificate in ordine di indice: quando un cammino raggiunge un nodo già autenticato
+        da una prova precedente nella stessa posizione la verifica si ferma, per cui i livelli superiori
+        condivisi vengono calcolati una sola volta.
+        Con un executor (ad esempio un ProcessPoolExecutor creato una volta dal chiamante) i lotti grandi
+        sono divisi tra i suoi worker, altrimenti la verifica avviene nel processo chiamante.
+    """
+    order = sorted(range(len(items)), key=lambda i: items[i][1])
+    ordered = [(items[i][0], items[i][1], items[i][2] if isinstance(items[i][2], (bytes, bytearray)) else pack_proof(items[i][2])) for i in order]
 
-def __sibling_index(index):
-    if index % 2 == 0:
-        return index + 1
+    if executor is not None and len(ordered) >= _parallel_batch_threshold:
+        # blocchi di indici contigui, così ogni worker condivide i nodi superiori dei suoi cammini
+        size = -(-len(ordered) // (os.cpu_count() or 1))
+        chunks = [ordered[i:i + size] for i in range(0, len(ordered), size)]
+        results = [res for chunk in executor.map(_verify_chunk, repeat(root), chunks) for res in chunk]
     else:
-        return index - 1
+        results = _verify_chunk(root, ordered)
 
-def __parent_index(index):
-    return index // 2
+    outcome = [False] * len(items)
+    for i, res in zip(order, results):
+        outcome[i] = res
+    return outcome
 
-def __preprocess(leaves):
+def _verify_chunk(root, items):
     """
-        Prende in input una lista di foglie, estende la lista con foglie duplicate se il numero non è una potenza di 2.
-        Restituisce l'hash delle foglie.
+        Verifica una lista di prove binarie ordinate per indice, eseguita anche nei worker dell'executor.
+        authenticated associa (livello, indice) al nodo esadecimale che una prova valida ha collegato alla radice.
     """
+    root = root.encode()
+    sha3_256 = hashlib.sha3_256
+    hexlify = binascii.hexlify
+    authenticated = {}
+    results = []
+    for leaf, index, proof in items:
+        depth, remainder = divmod(len(proof), _digest_size)
+        if remainder != 0 or depth == 0 or index < 0 or index >> depth != 0:
+            results.append(False)
+            continue
 
-    extender = '$'
-
-    while not __is_power_of_two(len(leaves)):
-        leaves.append(extender)
-    
-    return [HU.compute_hash_from_data(leaf) for leaf in leaves]
-
-
-def __is_power_of_two(n):
-    return n > 0 and (n & (n - 1)) == 0
+        node = leaf.encode()
+        path = []
+        valid = None
+        for level in range(depth):
+            if authenticated.get((level, index)) == node:
+                valid = True
+                break
+            path.append((level, index, node))
+            sibling = hexlify(proof[level * _digest_size:(level + 1) * _digest_size])
+            node = hexlify(sha3_256(sibling + node if index & 1 else node + sibling).digest())
+            index >>= 1
+        if valid is None:
+            valid = node == root
+        if valid:
+            for level, index, node in path:
+                authenticated[(level, index)] = node
+        results.append(valid)
+    return results
 
 if __name__ == "__main__":
     # Uso dell'algoritmo
     # Leaves sono le foglie dell'albero, ovvero i dati da autenticare.
-    leaves = ['a', 'b', 'c','d']
-    leaves = __preprocess(leaves)
+    # Le foglie sono gli hash dei dati.
+    leaves = HU.hash_many(['a', 'b', 'c','d'])
     root = merkle_tree(leaves)
     print(root)
 
@@ -0,0 +1,58 @@
+import multiprocessing
+import os
+import random
+import time
+from concurrent.futures import ProcessPoolExecutor
+from merkle import MerkleTree, verify_proof, verify_binary_proof, verify_many
+
+# Benchmark del Merkle Tree memorizzato per livelli: costruzione, prove e aggiornamenti su un milione di foglie.
+
+n_leaves = 1_000_000
+n_proofs = 10_000
+n_updates = 10_000
+
+if __name__ == "__main__":
+    raw_leaves = os.urandom(32 * n_leaves)
+
+    start = time.perf_counter()
+    tree = MerkleTree.from_raw_leaves(raw_leaves)
+    build_time = time.perf_counter() - start
+    root = tree.get_root()
+
+    indices = [random.randrange(n_leaves) for _ in range(n_proofs)]
+    start = time.perf_counter()
+    proofs = [tree.proof(index) for index in indices]
+    proof_time = time.perf_counter() - start
+
+    for index, proof in zip(indices[:100], proofs[:100]):
+        assert verify_proof(root, proof, tree.get_leaf(index), index)
+
+    binary_proofs = [tree.binary_proof(index) for index in indices]
+    leaves = [tree.get_leaf(index) for index in indices]
+    start = time.perf_counter()
+    assert all(verify_binary_proof(root, proof, leaf, index) for leaf, index, proof in zip(leaves, indices, binary_proofs))
+    verify_time = time.perf_counter() - start
+
+    items = list(zip(leaves, indices, binary_proofs))
+    start = time.perf_counter()
+    assert all(verify_many(root, items))
+    batch_time = time.perf_counter() - start
+
+    # il pool viene creato fuori dalla misura, come farebbe un chiamante che lo riusa
+    with ProcessPoolExecutor(mp_context=multiprocessing.get_context("spawn")) as executor:
+        verify_many(root, items[:1], executor)
+        start = time.perf_counter()
+        assert all(verify_many(root, items, executor))
+        parallel_time = time.perf_counter() - start
+
+    start = time.perf_counter()
+    for index in indices[:n_updates]:
+        tree.update(index, os.urandom(32).hex())
+    update_time = time.perf_counter() - start
+    assert verify_proof(tree.get_root(), tree.proof(indices[0]), tree.get_leaf(indices[0]), indices[0])
+
+    print(f"Leaves: {n_leaves}, levels: {len(proofs[0]) + 1}")
+    print(f"Build: {build_time:.3f} s")
+    print(f"Proofs: {n_proofs / proof_time:.0f} proofs/s ({proof_time / n_proofs * 1e6:.1f} us/proof)")
+    print(f"Verification: {n_proofs / verify_time:.0f} proofs/s, batch: {n_proofs / batch_time:.0f} proofs/s, batch on {os.cpu_count()} processes: {n_proofs / parallel_time:.0f} proofs/s")
+    print(f"Updates: {n_updates / update_time:.0f} updates/s ({update_time / n_updates * 1e6:.1f} us/update)")
@@ -0,0 +1,130 @@
+import multiprocessing
+import os
+from concurrent.futures import ProcessPoolExecutor
+import utils.hash_util as HU
+import merkle
+from merkle import MerkleTree, merkle_tree, merkle_proof, merkle_multiproof, verify_proof, verify_multiproof, verify_many
+
+# Vettori fissi calcolati con l'implementazione ricorsiva originale: il padre è l'hash della
+# concatenazione esadecimale dei figli e l'ultimo nodo di un livello dispari viene duplicato.
+leaves = HU.hash_many(['a', 'b', 'c', 'd', 'e'])
+roots = {
+    1: '6258995560d107be5a5f684f2d0c36724ee546d119e2508518f158790bf129d9',
+    2: '3456f38fe865f13e1f37a71edfa3293104c1dcae921089871fe2f038f4d56655',
+    4: 'c1209ab7611689531425476257b7c59bee92e03b25d071790df6100ba06135f5',
+    5: '5e730673eb88617791224a3171f35b8f486041081b8b783b802f3095f4ace717',
+}
+
+def test_roots_match_the_fixed_vectors():
+    assert leaves[0] == '80084bf2fba02475726feb2cab2d8215eab14bc6bdd8bfb2c8151257032ecd8b'
+    for size, root in roots.items():
+        assert merkle_tree(leaves[:size]) == root
+        assert MerkleTree.from_raw_leaves(b''.join(bytes.fromhex(leaf) for leaf in leaves[:size])).get_root() == root
+
+def test_proofs_match_the_fixed_vectors():
+    assert merkle_proof(leaves[:4], 2) == [(leaves[3], 3), (roots[2], 0)]
+    assert merkle_proof(leaves[:4], 3) == [(leaves[2], 2), (roots[2], 0)]
+    tree = MerkleTree(leaves)
+    for index in range(len(leaves)):
+        proof = tree.proof(index)
+        assert verify_proof(roots[5], proof, leaves[index], index)
+        assert verify_proof(roots[5], tree.binary_proof(index), leaves[index], index)
+        # la foglia, l'indice o un fratello diversi non portano alla radice
+        assert not verify_proof(roots[5], proof, leaves[(index + 1) % 5], index)
+        if index < 4: # l'ultima foglia è duplicata: il suo duplicato ha la stessa prova
+            assert not verify_proof(roots[5], proof, leaves[index], index ^ 1)
+        assert not verify_proof(roots[5], [(leaves[0] if sibling != leaves[0] else leaves[1], i) for sibling, i in proof[:1]] + proof[1:], leaves[index], index)
+
+def test_update_matches_a_new_tree():
+    tree = MerkleTree(leaves[:4])
+    tree.update(0, HU.compute_hash_from_data('z'))
+    assert tree.get_root() == '7f488e415338be824b2f09dbbcf9a0c0ee301c3f93b7f91764479bc71959c44d'
+    # anche l'ultima foglia di un livello dispari, duplicata
+    tree = MerkleTree(leaves)
+    tree.update(4, leaves[0])
+    assert tree.get_root() == merkle_tree(leaves[:4] + [leaves[0]])
+    assert verify_proof(tree.get_root(), tree.proof(4), leaves[0], 4)
+
+def test_leaves_must_be_digests():
+    for bad in (['a', 'b'], [leaves[0][:-2]], [leaves[0] + '00'], []):
+        try:
+            merkle_tree(bad)
+            assert False, "the leaves should be rejected"
+        except ValueError:
+            pass
+    try:
+        MerkleTree(leaves).update(0, 'zz')
+        assert False, "the leaf should be rejected"
+    except ValueError:
+        pass
+
+def test_multiproofs_are_accepted():
+    # la prova per le foglie 1 e 2 di 4 contiene solo i fratelli 0 e 3, la radice si ricava da sé
+    assert merkle_multiproof(leaves[:4], [2, 1]) == (4, [leaves[0], leaves[3]])
+    assert merkle_multiproof(leaves[:4], [0, 1]) == (4, [merkle_tree(leaves[2:4])])
+    for indices in ([0], [4], [0, 4], [1, 2, 3], [0, 1, 2, 3, 4]):
+        proof = merkle_multiproof(leaves, indices)
+        assert verify_multiproof(roots[5], proof, {index: leaves[index] for index in indices})
+
+def test_tampered_multiproofs_are_rejected():
+    indices = [1, 3]
+    size, siblings = merkle_multiproof(leaves, indices)
+    known = {index: leaves[index] for index in indices}
+    assert verify_multiproof(roots[5], (size, siblings), known)
+    # foglia sbagliata, indici scambiati, fratello alterato, hash mancante o in più, numero di foglie errato
+    assert not verify_multiproof(roots[5], (size, siblings), {1: leaves[1], 3: leaves[2]})
+    assert not verify_multiproof(roots[5], (size, siblings), {1: leaves[3], 3: leaves[1]})
+    assert not verify_multiproof(roots[5], (size, [leaves[4]] + siblings[1:]), known)
+    assert not verify_multiproof(roots[5], (size, siblings[:-1]), known)
+    assert not verify_multiproof(roots[5], (size, siblings + [leaves[0]]), known)
+    assert not verify_multiproof(roots[5], (4, siblings), known)
+    assert not verify_multiproof(roots[5], (size, siblings), {})
+    assert not verify_multiproof(roots[5], (size, siblings), {1: leaves[1], 5: leaves[3]})
+
+def test_verify_many_matches_single_verifications():
+    tree = MerkleTree(HU.hash_many([str(i) for i in range(11)]))
+    root = tree.get_root()
+    items = []
+    for index in (7, 3, 3, 10, 0, 4, 9):
+        items.append((tree.get_leaf(index), index, tree.binary_proof(index)))
+    items.append((tree.get_leaf(5), 5, tree.proof(5)))
+    # foglia altera, fratello alterato, indice sbagliato e prova troncata, anche accanto a prove valide
+    items.append((leaves[0], 4, tree.binary_proof(4)))
+    items.append((tree.get_leaf(2), 2, bytes(32) + tree.binary_proof(2)[32:]))
+    items.append((tree.get_leaf(6), 1, tree.binary_proof(6)))
+    items.append((tree.get_leaf(8), 8, tree.binary_proof(8)[:-32]))
+    expected = [verify_proof(root, proof, leaf, index) for leaf, index, proof in items]
+    assert expected == [True] * 8 + [False] * 4
+    assert verify_many(root, items) == expected
+    assert verify_many(leaves[0], items) == [False] * len(items)
+    assert verify_many(root, []) == []
+
+def test_verify_many_spreads_large_batches_over_an_executor():
+    tree = MerkleTree(HU.hash_many([str(i) for i in range(64)]))
+    root = tree.get_root()
+    items = [(tree.get_leaf(index), index, tree.binary_proof(index)) for index in range(64)]
+    items[10] = (leaves[0], 10, items[10][2])
+    items[40] = (items[40][0], 41, items[40][2])
+    expected = verify_many(root, items)
+    assert expected.count(False) == 2
+    threshold, cpu_count = merkle._parallel_batch_threshold, os.cpu_count
+    merkle._parallel_batch_threshold = 16
+    os.cpu_count = lambda: 3
+    try:
+        with ProcessPoolExecutor(max_workers=2, mp_context=multiprocessing.get_context("spawn")) as executor:
+            assert verify_many(root, items, executor) == expected
+            assert verify_many(root, items[:8], executor) == expected[:8]
+    finally:
+        merkle._parallel_batch_threshold = threshold
+        os.cpu_count = cpu_count
+
+if __name__ == "__main__":
+    test_roots_match_the_fixed_vectors()
+    test_proofs_match_the_fixed_vectors()
+    test_update_matches_a_new_tree()
+    test_leaves_must_be_digests()
+    test_multiproofs_are_accepted()
+    test_tampered_multiproofs_are_rejected()
+    test_verify_many_matches_single_verifications()
+    test_verify_many_spreads_large_batches_over_an_executor()
+    print("Merkle tests passed")
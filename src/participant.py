@@ -1,13 +1,35 @@
-from utils.bash_util import execute_command
-from utils.commands_util import commands
-from utils.hash_util import compute_hash_from_data
-from utils.keys_util import concatenate, sign_ECDSA
-from src.utils.pseudorandom_util import rand_extract
+from utils.keys_util import concatenate, sign_ECDSA_from_variable
+from src.utils.pseudorandom_util import rand_extract, contribution_stream
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
 import datetime
+import os
+
+# Background thread computing the contributions of the next rounds, shared by the participants of the process
+_prefetcher = None
+
+def _prefetch_executor():
+    global _prefetcher
+    if _prefetcher is None:
+        _prefetcher = ThreadPoolExecutor(max_workers=1, thread_name_prefix="prefetch")
+    return _prefetcher
+
+def _forget_prefetcher():
+    # the thread of the executor does not survive a fork: the child starts its own
+    global _prefetcher
+    _prefetcher = None
+
+os.register_at_fork(after_in_child=_forget_prefetcher)
+
+def _take_contributions(stream, count):
+    return [next(stream) for _ in range(count)]
 
 class Participant:
     
-    __slots__ = ["_seed", "_IV", "_security_param", "_game_code", "_player_id", "_round", "_last_contribute", "_last_randomess", "_last_message"]
+    __slots__ = ["_seed", "_IV", "_security_param", "_game_code", "_player_id", "_round", "_last_contribute", "_last_randomess", "_last_message", "_contributions", "_contributions_stream", "_pending_contributions"]
+
+    # Number of (contribution, randomness, commitment) triples computed ahead of the rounds
+    _prefetched_contributions = 4
     
     def __init__(self):
         self._seed = None
@@ -19,6 +41,9 @@ class Participant:
         self._last_contribute = None
         self._last_randomess = None
         self._last_message = None
+        self._contributions = deque()
+        self._contributions_stream = None
+        self._pending_contributions = None
     
     def set_game_code(self, game_code):
         """
@@ -74,8 +99,50 @@ class Participant:
     def next_round(self):
         """
         Go to next round.
+        The contributions for the next rounds are computed by a background thread, out of the critical path of the round.
         """
         self._round += 1
+        self._prefetch_contributions()
+
+    def _init_PRF(self):
+        """
+        Initialize the PRF used to compute the random contributions and
+        precompute the contributions of the first rounds.
+        """
+        self._IV = int(rand_extract(self._security_param, "hex"), 32) # Cast to a 32-bit integer cause it's used as a counter
+        self._seed = rand_extract(self._security_param, "base64")
+        self.__drop_contributions()
+        self._contributions_stream = contribution_stream(self._seed, self._IV, self._security_param)
+        self._prefetch_contributions()
+
+    def _prefetch_contributions(self):
+        """
+        Start refilling, in background, the buffer of precomputed (contribution, randomness, commitment) triples.
+        While a refill is pending the stream belongs to the background thread: the triples are
+        collected by __compute_commitment.
+        """
+        if self._contributions_stream is None or self._pending_contributions is not None:
+            return
+        missing = self._prefetched_contributions - len(self._contributions)
+        if missing > 0:
+            self._pending_contributions = _prefetch_executor().submit(_take_contributions, self._contributions_stream, missing)
+
+    def __collect_contributions(self):
+        """
+        Wait for the pending refill, if any, and move its triples to the buffer.
+        """
+        if self._pending_contributions is not None:
+            pending, self._pending_contributions = self._pending_contributions, None
+            self._contributions.extend(pending.result())
+
+    def __drop_contributions(self):
+        """
+        Discard the buffered triples and the pending refill.
+        """
+        if self._pending_contributions is not None:
+            self._pending_contributions.cancel()
+            self._pending_contributions = None
+        self._contributions.clear()
 
     def __compute_commitment(self):
         """
@@ -84,16 +151,15 @@ class Participant:
             commitment: string
                 The commitment of the contribution.
         """
-        # Compute the PRF output
-        prf_output = execute_command(commands["get_prf_value"](self._seed, self._IV)).split('= ')[1].strip()
+        self.__collect_contributions()
+        if not self._contributions:
+            self._contributions.extend(_take_contributions(self._contributions_stream, 1))
+        # The PRF output is divided in two equal parts: the first is the contribution, the second is the randomness used to commit
+        self._last_contribute, self._last_randomess, commitment = self._contributions.popleft()
         # Update the IV
         self._IV = (self._IV + 1) % (self._security_param)
 
-        # Divide output in two equal parts: the first is the contribution, the second is the randomness used to commit
-        self._last_contribute = prf_output[:len(prf_output)//2]
-        self._last_randomess = prf_output[len(prf_output)//2:]
-
-        return compute_hash_from_data(self._last_contribute + self._last_randomess)
+        return commitment
     
     def __sign_message(self, SK, message, name):
         """
@@ -108,15 +174,10 @@ class Participant:
         if message is None:
             raise Exception("Message is None. Can't sign a None message.")
         
-        temp_filename = name+"temp.txt"
         sign_filename = name+'comm_sign.pem'
 
-        with open(temp_filename, "w") as f:
-            f.write(message)
-
         # sign the message
-        print(SK,'-', temp_filename,'-', sign_filename)
-        sign_ECDSA(SK, temp_filename, sign_filename)
+        sign_ECDSA_from_variable(SK, message, sign_filename)
         return sign_filename
     
     def start_game(self, game_code, player_id, blocks = False):
@@ -134,8 +195,7 @@ class Participant:
         #self._round = 0
 
         # Inizializzo la PRF per il calcolo dei contributi casuali
-        self._IV = int(rand_extract(self._security_param, "hex"), 32) # Cast to a 32-bit integer cause it's used as a counter
-        self._seed = rand_extract(self._security_param, "base64")
+        self._init_PRF()
 
     def end_game(self):
         """ 
@@ -146,4 +206,6 @@ class Participant:
         self._round = 1
 
         self._IV = None
-        self._seed = None
\ No newline at end of file
+        self._seed = None
+        self.__drop_contributions()
+        self._contributions_stream = None
\ No newline at end of file
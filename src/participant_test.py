@@ -0,0 +1,48 @@
+import itertools
+import threading
+import player  # adds the repository root to the path: participant imports src.utils
+import participant
+import utils.pseudorandom_util as PU
+
+class Contributor(participant.Participant):
+    """
+    A participant playing without the blockchain, it only draws the contributions.
+    """
+
+    __slots__ = ['_blockchain']
+
+def test_the_contributions_are_prefetched_in_background():
+    contributor = Contributor()
+    contributor.start_game("game", "1")
+    expected = list(itertools.islice(PU.contribution_stream(contributor._seed, contributor._IV, contributor._security_param), 12))
+    commitments = []
+    for _ in range(len(expected)):
+        assert contributor._pending_contributions is not None
+        commitments.append(contributor._Participant__compute_commitment())
+        assert contributor._pending_contributions is None
+        assert (contributor._last_contribute, contributor._last_randomess) == expected[len(commitments) - 1][:2]
+        contributor.next_round()
+    assert commitments == [commitment for _, _, commitment in expected]
+    assert participant._prefetcher._threads
+    assert all(thread is not threading.current_thread() for thread in participant._prefetcher._threads)
+
+def test_the_buffer_is_refilled_without_a_round_transition():
+    contributor = Contributor()
+    contributor.start_game("game", "1")
+    expected = list(itertools.islice(PU.contribution_stream(contributor._seed, contributor._IV, contributor._security_param), 10))
+    assert [contributor._Participant__compute_commitment() for _ in expected] == [commitment for _, _, commitment in expected]
+
+def test_end_game_drops_the_prefetched_contributions():
+    contributor = Contributor()
+    contributor.start_game("game", "1")
+    contributor.end_game()
+    assert contributor._pending_contributions is None and not contributor._contributions
+    contributor.start_game("game", "2")
+    expected = next(PU.contribution_stream(contributor._seed, contributor._IV, contributor._security_param))
+    assert contributor._Participant__compute_commitment() == expected[2]
+
+if __name__ == "__main__":
+    test_the_contributions_are_prefetched_in_background()
+    test_the_buffer_is_refilled_without_a_round_transition()
+    test_end_game_drops_the_prefetched_contributions()
+    print("The contributions are prefetched in background")
@@ -3,9 +3,9 @@ sys.path.append(os.path.join(os.path.dirname(__file__), '..'))
 
 from user import User
 from participant import Participant
-from merkle import merkle_proof
-from utils.hash_util import compute_hash_from_data
-from utils.keys_util import concatenate, sign_ECDSA, verify_ECDSA
+from merkle import MerkleTree
+from utils.hash_util import ConcatenationHash, Transcript
+from utils.keys_util import concatenate, sign_ECDSA, verify_ECDSA, sign_ECDSA_from_variable, verify_ECDSA_from_variable
 from utils.pseudorandom_util import hash_concat_data_and_known_rand, rand_extract
 from utils.hash_util import compute_hash_from_data
 from src.utils.keys_util import *
@@ -17,7 +17,7 @@ class Player(User, Participant):
     This class represents a player of the bingo game, it inherits from the User class.
     """
         
-    __slots__ = ['_final_string', '_contr_comm', '_contr_open', '_SK_BC', '_PK_BC', '_blockchain', '_state']
+    __slots__ = ['_final_string', '_contr_comm', '_contr_open', '_SK_BC', '_PK_BC', '_blockchain', '_commit_block', '_transcript']
 
     def __init__(self, CIE_fields, folder):
         User.__init__(self,CIE_fields, folder)
@@ -25,7 +25,8 @@ class Player(User, Participant):
         self._auth_id = None
         self._contr_comm = []
         self._contr_open = []
-        self._state = []
+        self._commit_block = None # (number, own commitment) of the last validated commit block
+        self._transcript = None # transcript of the published messages of the round
         self._final_string = None
     
     # AUTHENTICATION
@@ -74,20 +75,20 @@ class Player(User, Participant):
     
     def __compute_proofs(self, policy):
         """
-        Given a policy, compute the merkle proofs for the leaves that are in the policy
+        Given a policy, compute a single merkle multiproof for the leaves that are in the policy
         # Arguments
             policy: string
                 The policy to access bingo
 
         # Returns
-            proofs: dictionary
-                A dictionary containing the merkle proofs for the leaves that are in the policy.
-                Key are the name of the field (opening of leaf) and values are the merkle proofs.
+            proof: tuple
+                The merkle multiproof of the leaves that are in the policy (number of leaves, list of hashes).
+            indices: dictionary
+                Key are the name of the fields in the policy and values are the indices of their leaves.
         """
         
         leaves = [] # list of leaves of the merkle tree
         indices = {} # map the properties (key) to the index of leaves list (value)
-        proofs = {} # map the properties (key) to the merkle proof (value)
 
         index = 0 
 
@@ -98,15 +99,13 @@ class Player(User, Participant):
             indices[key] = index
             index += 1
             
-        # verify the merkle proofs for each leaf
-        for key in policy:
-            if key in indices:
-                proofs[key] = merkle_proof(leaves, indices[key])
-            
         # delete from indices the keys that are not in the policy
         indices = {key: value for key, value in indices.items() if key in policy}
 
-        return proofs, indices
+        # one proof for all the leaves in the policy, shared siblings are sent once
+        proof = MerkleTree(leaves).multiproof(indices.values())
+
+        return proof, indices
     
     def send_clear_fields(self, policy):
         """ 
@@ -121,7 +120,7 @@ class Player(User, Participant):
         if policy is None or len(policy) == 0:
             raise Exception("Policy not set.")
         
-        # compute the merkle proofs for the leaves that are in the policy, and the indices of the leaves 
+        # compute the merkle multiproof of the leaves that are in the policy, and the indices of the leaves 
         proofs, indices = self.__compute_proofs(policy)
         # get the clear values of the leaves that are in the policy
         clear_values = {key: self._clear_fields[key] for key in policy} 
@@ -154,12 +153,9 @@ class Player(User, Participant):
         if signature is None:
             raise Exception("Signature not received.")
 
-        temp_filename = self._folder+self._user_name+"_temp.txt"
-
-        with open(temp_filename, "w") as f: 
-            f.write(concatenate(*self._last_message[0], self._last_message[1], self._last_message[2]))
+        concat = concatenate(*self._last_message[0], self._last_message[1], self._last_message[2])
         
-        if verify_ECDSA(self._bingo_PK, temp_filename, signature):
+        if verify_ECDSA_from_variable(self._bingo_PK, concat, signature):
             self._bingo_sign_on_comm = signature
             return True
         
@@ -180,8 +176,6 @@ class Player(User, Participant):
         # Returns
             true if the signature is valid, false otherwise.
         """
-        temp_filename = self._folder+self._user_name+"_temp.txt"
-        
         if self._blockchain is None:
 
             if pairs is None or signature is None:
@@ -189,46 +183,42 @@ class Player(User, Participant):
 
             self._contr_comm = pairs
 
-            concat = ""
-            for pair in pairs:
-                for param in pair[0]:
-                    concat += param
-                concat += pair[1]
-            
-            with open(temp_filename, "w") as f:
-                f.write(concat)
+            # the sala bingo signs the digest of the transcript of the pairs
+            self._transcript = Transcript("commitments")
+            for params, commitment in pairs:
+                self._transcript.absorb(*params, commitment)
 
             # Verify that the received signature is valid
-            if not verify_ECDSA(self._bingo_PK, temp_filename, signature):
+            if not verify_ECDSA_bytes(load_public_key(self._bingo_PK), self._transcript.digest(), read_signature(signature)):
                 self._bingo_sign_on_comm = signature
                 raise Exception("Bingo's signature on the commit pairs is not valid.")
             
+            # the openings follow the commitments in the transcript
+            self._transcript.absorb("openings")
             return True
         
         else:
             # PROCESS BLOCK
             
-            # verify player's signature on its own pair
-            data = pairs.get_data()
-            
-            if self._player_id not in data.keys():
+            # download only the entry of the player, with its inclusion proof in the data of the block
+            try:
+                entry = self._blockchain.get_entry(pairs.get_block_number(), self._player_id)
+            except KeyError:
                 raise Exception("Player's id not in the block.")
             
-            my_pair = data[self._player_id]
-            concat = concatenate(*my_pair[0], my_pair[1])
+            # verify bingo's signature on the block and the inclusion of the entry
+            if not entry.verify(self._bingo_PK):
+                raise Exception("Bingo's signature on the block is not valid.")
             
-            with open(temp_filename, "w") as f:
-                f.write(concat)
+            # verify player's signature on its own pair
+            my_pair = entry.get_data()
+            concat = concatenate(*my_pair[0], my_pair[1])
                 
-            if not verify_ECDSA(self._PK_BC, temp_filename, my_pair[2]):
+            if my_pair[1] != self._last_message[1] or not verify_ECDSA_bytes(load_public_key(self._PK_BC), concat.encode("utf-8"), bytes.fromhex(my_pair[2])):
                 raise Exception("Player's signature on its own pair is not valid.")
             
-            # verify bingo's signature on the block
-            if not pairs.verify_block(self._bingo_PK):
-                raise Exception("Bingo's signature on the block is not valid.")
-            
-            # if all is ok, add the block to the player's state
-            self._state.append(pairs)
+            # if all is ok, remember the commitment: the opening will be checked against it
+            self._commit_block = (pairs.get_block_number(), my_pair[1])
             return True
     
     def send_opening(self):
@@ -241,23 +231,13 @@ class Player(User, Participant):
         self._last_opening = (self._last_contribute, self._last_randomess)
         return self._player_id, *self._last_opening
 
-    def __compute_final_string(self):
+    def __clear_round(self):
         """
-        Compute the final string constructed by the concatenation of all the openings sorted by player ID.
-        # Returns
-            final_string: string
-                The final string.
+        Drop the publications of the round.
         """
-        # hash the concatenation of all the openings
-        concat = ""
-        # print("PLAYER: ", self._player_id)
-        # print("ROUND ", self._round)
-        for opening in self._contr_open:
-            # print("CONCATENING: ", opening[0])
-            concat += opening[0]
-        self._contr_open.clear()
-        self._contr_comm.clear()
-        return compute_hash_from_data(concat)
+        # the publications are shared by all the players, they are dropped and never modified
+        self._contr_open = []
+        self._contr_comm = []
     
     def __verify_commitments(self, contr_comm, contr_open):
         """
@@ -286,21 +266,20 @@ class Player(User, Participant):
                 raise Exception("Openings or signature are None.")
 
             self._contr_open = openings
-            
-            temp_filename = self._folder+self._user_name+"_temp.txt"
 
             if self.__verify_commitments(self._contr_comm, self._contr_open):
-                # Compute the concatenation of commit messages and openings messages in order
-                # to verify the signature of sala bingo
-                concat = ""
-                for contr, opening in zip(self._contr_comm, self._contr_open):
-                    concat += concatenate(*contr[0], contr[1], opening[0], opening[1])
-                with open(temp_filename, "w") as f:
-                    f.write(concat)
+                # Complete the transcript with the openings in order
+                # to verify the signature of sala bingo, the final string is the hash
+                # of the concatenation of the contributions sorted by player ID
+                final_hash = ConcatenationHash()
+                for opening in self._contr_open:
+                    self._transcript.absorb(*opening)
+                    final_hash.update(opening[0])
 
                 # Verify the signature of sala bingo
-                res = verify_ECDSA(self._bingo_PK, temp_filename, signature)
-                self._final_string = self.__compute_final_string()
+                res = verify_ECDSA_bytes(load_public_key(self._bingo_PK), self._transcript.digest(), read_signature(signature))
+                self._final_string = final_hash.hexdigest()
+                self.__clear_round()
                 return res
             else:
                 raise Exception("Commitments not valid.")
@@ -308,32 +287,26 @@ class Player(User, Participant):
         else:
             # PROCESS BLOCK
             
-            # verify bingo's signature on the block
-            if not openings.verify_block(self._bingo_PK):
+            # download only the entry of the player: the other openings are checked by the auditors
+            try:
+                entry = self._blockchain.get_entry(openings.get_block_number(), self._player_id)
+            except KeyError:
+                raise Exception("Player's id not in the block.")
+
+            # verify bingo's signature on the block and the inclusion of the entry
+            if not entry.verify(self._bingo_PK):
                 raise Exception("Bingo's signature on the block is not valid.")
 
-            ids = list(openings.get_data().keys())
-            ids.sort()
-            for id in ids:
-                self._contr_open.append(openings.get_data()[id])
-                
-            ids = list(self._state[-1].get_data().keys())
-            ids.sort()
-            for id in ids:
-                self._contr_comm.append(self._state[-1].get_data()[id])
-            
-            # verify commitments openings 
-            if self.__verify_commitments(self._contr_comm, self._contr_open):
-                            
-                # if all is ok, add the block to the player's state
-                self._state.append(openings)
-            
-                # compute final string
-                self._final_string = self.__compute_final_string()
-                
-            else:
-                
+            # verify that the published opening is the one of the player and opens its commitment
+            reveal = entry.get_data()
+            if reveal != (self._last_contribute, self._last_randomess) or hash_concat_data_and_known_rand(*reveal) != self._commit_block[1]:
                 raise Exception("Commitments not valid.")
+
+            # the final string is in the signed header of the block
+            final_string = entry.get_header().get('Final String')
+            if final_string is None:
+                raise Exception("Final string not in the block.")
+            self._final_string = final_string
             
             return True
         
@@ -362,17 +335,13 @@ class Player(User, Participant):
         # Fiat-Shamir 86 protocol with mapping key
         print("Generating signature for mapping...")
         signature_bc = self._folder + self._user_name+'_BC_mapping_sign.pem'
-        with open(self._folder + self._user_name + "_void_file.txt", "w") as f:
-                f.write('')
-        sign_ECDSA(self._SK_BC, self._folder + self._user_name + "_void_file.txt", signature_bc)
+        sign_ECDSA_from_variable(self._SK_BC, '', signature_bc)
         temp = (self._PK_BC, signature_bc)
 
         # Shnorr signature with GP key
         print("Generating signature for mapping...")
         signature_gp = self._folder + self._user_name+'_GP_mapping_sign.pem'
-        with open(self._folder + self._user_name + "_temp_sign_mapping.txt", "w") as f:
-                f.write(concatenate(*temp))
-        sign_ECDSA(self._SK_GP, self._folder + self._user_name + "_temp_sign_mapping.txt", signature_gp)
+        sign_ECDSA_from_variable(self._SK_GP, concatenate(*temp), signature_gp)
 
         return temp, signature_gp
 
@@ -382,7 +351,7 @@ class Player(User, Participant):
             raise Exception("There is no blockchain to contestate.")
         
         self._blockchain.set_credentials(self._PK_BC, self._SK_BC)
-        self._blockchain.add_block("dispute", {self._player_id: self._last_opening})
+        self._blockchain.add_block("dispute", self._game_code, {self._player_id: self._last_opening})
         self._blockchain.reset_server_credentials()
 
     def contestate_commit(self):
@@ -391,7 +360,7 @@ class Player(User, Participant):
             raise Exception("There is no blockchain to contestate.")
         
         self._blockchain.set_credentials(self._PK_BC, self._SK_BC)
-        self._blockchain.add_block("dispute", {self._player_id: self._last_contribute})
+        self._blockchain.add_block("dispute", self._game_code, {self._player_id: self._last_message})
         self._blockchain.reset_server_credentials()
         
     def get_winner(self, winner_info):
@@ -399,8 +368,6 @@ class Player(User, Participant):
         # winner_info = (winner_id, bingo_signature)
         concat = winner_info[0] + self._game_code
 
-        with open(self._folder+ self._user_name +"_temp_winner.txt", "w") as f:
-            f.write(concat)
-        if verify_ECDSA(self._bingo_PK, self._folder + self._user_name +"_temp_winner.txt", winner_info[1]):
-            sign_ECDSA(self._SK_BC,self._folder + self._user_name +"_temp_winner.txt", self._folder + self._user_name +"_temp_winner_sign.txt")
+        if verify_ECDSA_from_variable(self._bingo_PK, concat, winner_info[1]):
+            sign_ECDSA_from_variable(self._SK_BC, concat, self._folder + self._user_name +"_temp_winner_sign.txt")
             return (self._player_id, self._folder + self._user_name +"_temp_winner_sign.txt")
\ No newline at end of file
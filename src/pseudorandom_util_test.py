@@ -0,0 +1,73 @@
+import itertools
+import os
+import utils.bash_util as BU
+import utils.pseudorandom_util as PU
+from utils.commands_util import commands
+
+def openssl_prf(key, data):
+    return BU.execute_command(commands["get_prf_value"](key, data)).split('= ')[1].strip()
+
+def test_prf_matches_openssl_hmac():
+    for key in (PU.rand_extract(32, "hex"), "seed", "0" * 64):
+        for data in (0, 1, 31, 2 ** 64, "8f14e45fceea167a"):
+            assert PU.prf(key, data) == openssl_prf(key, data)
+
+def test_contribution_stream_is_deterministic():
+    seed = PU.rand_extract(32, "hex")
+    first = list(itertools.islice(PU.contribution_stream(seed, 5, 32), 40))
+    second = list(itertools.islice(PU.contribution_stream(seed, 5, 32), 40))
+    assert first == second
+    assert first != list(itertools.islice(PU.contribution_stream(PU.rand_extract(32, "hex"), 5, 32), 40))
+    assert first[0][0] + first[0][1] == PU.prf(seed, 5)
+    for contribution, randomness, commitment in first:
+        assert commitment == PU.hash_concat_data_and_known_rand(contribution, randomness)
+    # the counter wraps around the modulus
+    assert first[32:] == first[:8]
+
+def test_random_pool_refills_in_chunks():
+    urandom, calls = os.urandom, []
+    def counting_urandom(size):
+        calls.append(size)
+        return urandom(size)
+    os.urandom = counting_urandom
+    try:
+        pool = PU.RandomPool(chunk_size=64)
+        first, second = pool.take(40), pool.take(24)
+        assert calls == [64] and len(first) == 40 and len(second) == 24
+        # the buffer is empty: a new chunk
+        third = pool.take(30)
+        assert calls == [64, 64] and len(third) == 30
+        # larger requests bypass the buffer
+        assert len(pool.take(100)) == 100 and calls == [64, 64, 100]
+        assert pool.take(0) == b'' and len(pool.take(34)) == 34 and calls == [64, 64, 100]
+        assert len({first[:24], second, third[:24]}) == 3
+    finally:
+        os.urandom = urandom
+    try:
+        pool.take(-1)
+        assert False, "a negative size should be rejected"
+    except ValueError:
+        pass
+
+def test_a_forked_child_gets_distinct_bytes():
+    # the child inherits a non-empty buffer: without the reseed it would return the parent's next bytes
+    PU.rand_extract(1, "raw")
+    reader, writer = os.pipe()
+    pid = os.fork()
+    if pid == 0:
+        os.close(reader)
+        os.write(writer, PU.rand_extract(32, "raw"))
+        os._exit(0)
+    os.close(writer)
+    with os.fdopen(reader, 'rb') as f:
+        child = f.read()
+    os.waitpid(pid, 0)
+    assert len(child) == 32
+    assert child != PU.rand_extract(32, "raw")
+
+if __name__ == "__main__":
+    test_prf_matches_openssl_hmac()
+    test_contribution_stream_is_deterministic()
+    test_random_pool_refills_in_chunks()
+    test_a_forked_child_gets_distinct_bytes()
+    print("pseudorandom_util is compatible with the OpenSSL CLI")
@@ -1,4 +1,8 @@
+import asyncio
+import os
 import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
 from player import Player
 from bingo import Bingo
 from DPA import DPA
@@ -7,34 +11,164 @@ from AS import AS
 import AS_authentication as AS_util
 import bingo_authentication as bingo_util
 
-def multi_play(players, bingo):
-    bingo.generate_message(bingo._SK, bingo.get_folder())
-    for player in players:
-        # Send commitment and receive signature ack
-        send_commit(player, bingo)
-    
-    for player in players:
-        # Receive commitments and signature from server
-        receive_commitments_and_signature(player, bingo)
-
-    for player in players:
-        # player sends the opening to the sala bingo
-        bingo.receive_opening(*player.send_opening())
-
-    for player in players: 
-        # Send opening and receive signature ack
-        res = bingo.publish_openings()
-        if res is not None:
-            player.receive_openings(*res)
+class RoundAborted(Exception):
+    """
+    Raised when a player or the sala bingo aborts a round: the game cannot continue.
+    """
+
+class RoundCoordinator:
+    """
+    Runs the rounds of a table with asyncio.
+    Every phase (commit, publication of the commitments, opening, reveal) runs concurrently
+    across the players, the cryptographic work is offloaded to an executor and a barrier
+    ends each phase: the time of a phase is the time of its slowest player, not the sum of all the players.
+    The state of the sala bingo is only changed by the coordinator, one call at a time.
+    The players and the sala bingo live in this process, so the executor is a thread pool: the
+    signatures run in-process and hold the GIL, the overlap comes from the file accesses and the
+    openssl commands of the phases. The games scale over processes in the Hall.
+    # Attributes
+        _players: list
+            The players of the table.
+        _bingo: Bingo
+            The sala bingo.
+        _executor: Executor
+            The executor running the cryptographic operations.
+        _own_executor: bool
+            True if the executor was created by the coordinator, it is shut down by close.
+        _loop: AbstractEventLoop
+            The event loop of run_round, created on the first call and reused by the following rounds.
+        _latencies: dict
+            key: phase name, value: the list of the latencies of the phase in the played rounds, in seconds.
+    """
+
+    _phases = ('commit', 'publish_commitments', 'open', 'reveal')
+
+    __slots__ = ['_players', '_bingo', '_executor', '_own_executor', '_loop', '_latencies']
+
+    def __init__(self, players, bingo, executor = None):
+        self._players = list(players)
+        self._bingo = bingo
+        # one thread per player and one for the sala bingo, for the whole game, capped as the default
+        # pool of the standard library: the crypto holds the GIL and asyncio queues the other players
+        self._own_executor = executor is None
+        self._executor = executor or ThreadPoolExecutor(max_workers=min(len(self._players) + 1, 32, (os.cpu_count() or 1) + 4))
+        self._loop = None
+        self._latencies = {phase: [] for phase in self._phases}
+
+    def get_latencies(self):
+        """
+        Returns the latencies of the phases of the played rounds.
+        # Returns
+            dict
+                key: phase name, value: the list of the latencies of the phase, in seconds.
+        """
+        return {phase: list(latencies) for phase, latencies in self._latencies.items()}
+
+    async def __run(self, function, *args):
+        return await asyncio.get_running_loop().run_in_executor(self._executor, function, *args)
+
+    async def __all_players(self, method, *args):
+        # one task per player, gather is the barrier of the phase
+        return await asyncio.gather(*(self.__run(getattr(player, method), *args) for player in self._players))
+
+    async def __commit(self):
+        await self.__run(self._bingo.generate_message, self._bingo._SK, self._bingo.get_folder())
+        messages = await self.__all_players('send_commitment')
+        # the commit messages are verified by the sala bingo in a single batch
+        acks = await self.__run(self._bingo.receive_commitments_batch, messages)
+        await asyncio.gather(*(self.__run(check_ack, player, acks[message[0][0]]) for player, message in zip(self._players, messages)))
+
+    async def __publish_commitments(self):
+        res = await self.__run(self._bingo.publish_commitments_and_signature)
+        if res is None:
+            for player in self._players:
+                player.contestate_commit()
+            return
+        for valid in await self.__all_players('receive_commitments_and_signature', *res):
+            if not valid:
+                print("Not valid signature! Terminating...")
+                raise RoundAborted("Not valid signature of the sala bingo on the commitments")
+        print("- Valid server signature, opening the contribution...")
+
+    async def __open(self):
+        for opening in await self.__all_players('send_opening'):
+            self._bingo.receive_opening(*opening)
+
+    async def __reveal(self):
+        res = await self.__run(self._bingo.publish_openings)
+        if res is None:
+            for player in self._players:
+                player.contestate_opening()
+            return
+        await self.__all_players('receive_openings', *res)
+        for player in self._players:
             print("Sono il player " + player.get_name() + " e ho ottenuto:", player.get_final_string())
-        else:
-            player.contestate_opening()
 
-    for player in players:
-        player.next_round()
-    bingo.next_round()
+    async def play_round(self):
+        """
+        Play a round, one phase after the other.
+        # Returns
+            dict
+                key: phase name, value: the latency of the phase in this round, in seconds.
+        # Raises
+            RoundAborted: If a player aborted the round, the round is not completed.
+        """
+        latencies = {}
+        for phase, step in zip(self._phases, (self.__commit, self.__publish_commitments, self.__open, self.__reveal)):
+            start = time.perf_counter()
+            try:
+                await step()
+            except RoundAborted:
+                raise
+            except Exception as e:
+                # an error in a player thread ends the round, not the process
+                raise RoundAborted(f"{phase} phase failed: {type(e).__name__}: {e}") from e
+            latencies[phase] = time.perf_counter() - start
+            self._latencies[phase].append(latencies[phase])
 
-    print("Sono la Sala Bingo e ho ottenuto:", bingo.get_final_string())
+        for player in self._players:
+            player.next_round()
+        self._bingo.next_round()
+
+        print("Sono la Sala Bingo e ho ottenuto:", self._bingo.get_final_string())
+        return latencies
+
+    async def play(self, rounds: int = 1):
+        """
+        Play some rounds.
+        # Arguments
+            rounds: int
+                The number of rounds.
+        # Returns
+            dict
+                key: phase name, value: the list of the latencies of the phase in the played rounds, in seconds.
+        """
+        for _ in range(rounds):
+            await self.play_round()
+        return self.get_latencies()
+
+    def run_round(self):
+        """
+        Play a round from synchronous code, on the event loop of the coordinator.
+        # Returns
+            dict
+                key: phase name, value: the latency of the phase in this round, in seconds.
+        # Raises
+            RoundAborted: If a player aborted the round.
+        """
+        if self._loop is None:
+            self._loop = asyncio.new_event_loop()
+        return self._loop.run_until_complete(self.play_round())
+
+    def close(self):
+        """
+        Close the event loop and, if created by the coordinator, shut down the executor.
+        """
+        if self._loop is not None:
+            self._loop.close()
+            self._loop = None
+        if self._own_executor:
+            self._executor.shutdown()
 
 def play(user, bingo):
     # player sends the parameters, commitment and signature to the bingo and 
@@ -84,16 +218,18 @@ def receive_commitments_and_signature(player, bingo):
 
 def send_commit(player, bingo):
     message = player.send_commitment()
-    sign = bingo.receive_commitment(*message)
+    check_ack(player, bingo.receive_commitment(*message))
+
+def check_ack(player, sign):
     if sign:
         # player verifies the signature of the sala bingo on the commitment and the additional parameters
         # if it is not valid, it aborts the game, otherwise it continues
         if not player.receive_signature(sign):
             print("Not valid signature! Terminating...")
-            sys.exit()
+            raise RoundAborted("Not valid signature of the sala bingo on the commitment of " + player.get_name())
     else:
         print("Not valid signature! Terminating...")
-        sys.exit()
+        raise RoundAborted("The sala bingo rejected the commitment of " + player.get_name())
 
 if __name__ == '__main__':
     # authentication with the AS to get the GP
@@ -0,0 +1,107 @@
+import contextlib
+import os
+import shutil
+import tempfile
+import round
+from player import Player
+from bingo import Bingo
+from DPA import DPA
+from AS import AS
+import AS_authentication as AS_util
+import bingo_authentication as bingo_util
+
+@contextlib.contextmanager
+def application():
+    """
+    Run in a temporary directory with the OpenSSL configurations, which write to Application.
+    """
+    source = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'configuration_files')
+    cwd = os.getcwd()
+    with tempfile.TemporaryDirectory() as folder:
+        shutil.copytree(source, os.path.join(folder, 'src', 'configuration_files'))
+        os.makedirs(os.path.join(folder, 'Application'))
+        os.chdir(folder)
+        try:
+            yield 'Application'
+        finally:
+            os.chdir(cwd)
+
+def table(folder, bingo_class=Bingo, count=2):
+    """
+    Returns the players and the sala bingo of a started game without the blockchain.
+    """
+    players = [Player([f"Player{index}", "IT", "F", "Rome", "1990-01-01", f"CF{index}"], folder) for index in range(count)]
+    authority = AS(folder)
+    for player in players:
+        AS_util.authentication(player, authority)
+    bingo = bingo_class(folder)
+    policy = DPA().choose_policy()
+    for player in players:
+        player.set_auth_id(bingo_util.authentication(player, bingo))
+    validations = [bingo_util.validation(player, bingo, policy) for player in players]
+    bingo.start_game()
+    for player, (game_code, player_id, chain) in zip(players, validations):
+        player.start_game(game_code, player_id, chain)
+        bingo.receive_mapping(player_id, player.generate_mapping())
+    return players, bingo
+
+class SwappingBingo(Bingo):
+    """
+    Acknowledges every commitment with the signature on the commitment of another player.
+    """
+
+    def receive_commitments_batch(self, messages):
+        acks = super().receive_commitments_batch(messages)
+        ids = list(acks)
+        return {id: acks[ids[(index + 1) % len(ids)]] for index, id in enumerate(ids)}
+
+def test_the_rounds_share_the_loop_and_the_executor():
+    with application() as folder:
+        players, bingo = table(folder)
+        coordinator = round.RoundCoordinator(players, bingo)
+        try:
+            final_strings = []
+            for _ in range(3):
+                latencies = coordinator.run_round()
+                assert set(latencies) == set(round.RoundCoordinator._phases)
+                loop, executor = coordinator._loop, coordinator._executor
+                final_strings.append(bingo.get_final_string())
+                assert all(player.get_final_string() == final_strings[-1] for player in players)
+            assert coordinator._loop is loop and coordinator._executor is executor
+            assert len(set(final_strings)) == 3
+            assert all(len(values) == 3 for values in coordinator.get_latencies().values())
+        finally:
+            coordinator.close()
+        assert coordinator._loop is None and loop.is_closed()
+
+def test_an_invalid_acknowledgement_aborts_the_round():
+    with application() as folder:
+        players, bingo = table(folder, SwappingBingo)
+        coordinator = round.RoundCoordinator(players, bingo)
+        try:
+            try:
+                coordinator.run_round()
+                assert False, "the players should abort the round"
+            except round.RoundAborted as e:
+                assert "Not valid signature" in str(e)
+            assert coordinator.get_latencies()['commit'] == []
+        finally:
+            coordinator.close()
+
+def test_a_large_table_shares_a_bounded_pool():
+    with application() as folder:
+        players, bingo = table(folder, count=12)
+        coordinator = round.RoundCoordinator(players, bingo)
+        try:
+            assert coordinator._executor._max_workers == min(13, 32, (os.cpu_count() or 1) + 4)
+            for _ in range(2):
+                coordinator.run_round()
+                assert all(player.get_final_string() == bingo.get_final_string() for player in players)
+        finally:
+            coordinator.close()
+
+if __name__ == "__main__":
+    test_the_rounds_share_the_loop_and_the_executor()
+    test_an_invalid_acknowledgement_aborts_the_round()
+    test_a_large_table_shares_a_bounded_pool()
+    print("Round tests passed")
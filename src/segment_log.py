@@ -0,0 +1,156 @@
+import os
+import struct
+import threading
+
+class SegmentLog:
+    """
+    Append-only log of binary records stored in rotating segment files.
+    Every record is written as a 4 byte big endian length followed by its payload.
+    A sidecar index of fixed size entries (segment number, offset) maps the record number
+    to its position, so reading any record is a single seek.
+    # Attributes
+        _directory: string
+            The directory containing the segments and the index.
+        _segment_size: int
+            The size in bytes after which a new segment is started.
+        _length: int
+            The number of records in the log.
+    """
+
+    _record_header = struct.Struct('>I')
+    _index_entry = struct.Struct('>IQ')
+    _index_file_name = 'index.bin'
+
+    __slots__ = ['_directory', '_segment_size', '_length', '_active_segment', '_active_size', '_segment_file', '_index_file', '_readers', '_lock']
+
+    def __init__(self, directory, segment_size: int = 4 * 1024 * 1024):
+        if segment_size <= 0:
+            raise ValueError("The segment size must be positive")
+        self._directory = str(directory)
+        self._segment_size = segment_size
+        self._lock = threading.Lock()
+        self._readers = {}
+        os.makedirs(self._directory, exist_ok=True)
+
+        index_path = os.path.join(self._directory, self._index_file_name)
+        self._index_file = open(index_path, 'a+b')
+        self._length = os.path.getsize(index_path) // self._index_entry.size
+        if os.path.getsize(index_path) != self._length * self._index_entry.size:
+            # An interrupted append left a partial entry: drop it
+            self._index_file.truncate(self._length * self._index_entry.size)
+
+        # Bytes after the last indexed record belong to an interrupted append: drop them
+        self._active_segment, end = 0, 0
+        if self._length > 0:
+            self._active_segment, offset = self.__locate(self._length - 1)
+            with open(self.__segment_path(self._active_segment), 'rb') as reader:
+                reader.seek(offset)
+                end = offset + self._record_header.size + self._record_header.unpack(reader.read(self._record_header.size))[0]
+        self._segment_file = open(self.__segment_path(self._active_segment), 'ab')
+        self._segment_file.truncate(end)
+        self._active_size = end
+
+    def __segment_path(self, segment):
+        return os.path.join(self._directory, f'segment_{segment:06d}.log')
+
+    def __locate(self, number):
+        self._index_file.seek(number * self._index_entry.size)
+        return self._index_entry.unpack(self._index_file.read(self._index_entry.size))
+
+    def __reader(self, segment):
+        reader = self._readers.get(segment)
+        if reader is None:
+            reader = open(self.__segment_path(segment), 'rb')
+            self._readers[segment] = reader
+        return reader
+
+    def __len__(self):
+        return self._length
+
+    def append(self, payload: bytes):
+        """
+        Append a record to the log.
+        # Arguments
+            payload: bytes
+                The content of the record.
+        # Returns
+            int
+                The number of the record.
+        """
+        record = self._record_header.pack(len(payload)) + payload
+        with self._lock:
+            if self._active_size > 0 and self._active_size + len(record) > self._segment_size:
+                self._segment_file.close()
+                self._active_segment += 1
+                self._segment_file = open(self.__segment_path(self._active_segment), 'wb')
+                self._active_size = 0
+
+            offset = self._active_size
+            self._segment_file.write(record)
+            self._segment_file.flush()
+            self._active_size += len(record)
+
+            # The index entry is written after the record, an entry always points to a complete record
+            self._index_file.seek(0, os.SEEK_END)
+            self._index_file.write(self._index_entry.pack(self._active_segment, offset))
+            self._index_file.flush()
+
+            number = self._length
+            self._length += 1
+        return number
+
+    def get(self, number: int):
+        """
+        Read a record of the log.
+        # Arguments
+            number: int
+                The number of the record, negative numbers count from the end.
+        # Returns
+            bytes
+                The content of the record.
+        """
+        with self._lock:
+            if number < 0:
+                number += self._length
+            if not 0 <= number < self._length:
+                raise IndexError("Record number out of range")
+            segment, offset = self.__locate(number)
+            reader = self.__reader(segment)
+            reader.seek(offset)
+            length, = self._record_header.unpack(reader.read(self._record_header.size))
+            return reader.read(length)
+
+    def __iter__(self):
+        """
+        Stream the records in order, reading every segment sequentially.
+        """
+        length = len(self)
+        number = 0
+        segment = 0
+        while number < length:
+            with open(self.__segment_path(segment), 'rb') as reader:
+                while number < length:
+                    header = reader.read(self._record_header.size)
+                    if len(header) < self._record_header.size:
+                        break
+                    size, = self._record_header.unpack(header)
+                    yield reader.read(size)
+                    number += 1
+            segment += 1
+
+    def segments(self):
+        """
+        Returns the number of segment files of the log.
+        """
+        return self._active_segment + 1
+
+    def close(self):
+        """
+        Close the files of the log.
+        """
+        with self._lock:
+            self._segment_file.close()
+            self._index_file.close()
+            for reader in self._readers.values():
+                reader.close()
+            self._readers.clear()
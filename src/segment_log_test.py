@@ -0,0 +1,114 @@
+import os
+import struct
+import tempfile
+from segment_log import SegmentLog
+
+payloads = [b'', b'a', b'\x00\xff' * 3, 'Autorità'.encode(), bytes(range(256))]
+
+def segment_path(directory, segment):
+    return os.path.join(directory, f'segment_{segment:06d}.log')
+
+def test_records_are_length_prefixed():
+    with tempfile.TemporaryDirectory() as directory:
+        log = SegmentLog(directory)
+        try:
+            assert [log.append(payload) for payload in payloads] == list(range(len(payloads)))
+            assert len(log) == len(payloads)
+        finally:
+            log.close()
+        with open(segment_path(directory, 0), 'rb') as f:
+            assert f.read() == b''.join(struct.pack('>I', len(payload)) + payload for payload in payloads)
+        assert os.path.getsize(os.path.join(directory, 'index.bin')) == 12 * len(payloads)
+
+def test_segments_rotate_at_the_segment_size():
+    with tempfile.TemporaryDirectory() as directory:
+        log = SegmentLog(directory, segment_size=32)
+        try:
+            # 14 bytes per record: two records per segment, a larger record fills a segment alone
+            records = [bytes([i]) * 10 for i in range(5)] + [b'x' * 40] + [b'y' * 10]
+            for record in records:
+                log.append(record)
+            assert log.segments() == 5
+            assert [os.path.getsize(segment_path(directory, segment)) for segment in range(5)] == [28, 28, 14, 44, 14]
+            assert [log.get(number) for number in range(len(records))] == records
+            assert list(log) == records
+        finally:
+            log.close()
+
+def test_records_are_found_through_the_index_after_reopening():
+    with tempfile.TemporaryDirectory() as directory:
+        log = SegmentLog(directory, segment_size=64)
+        records = [str(i).encode() * (i % 7 + 1) for i in range(50)]
+        for record in records:
+            log.append(record)
+        log.close()
+
+        log = SegmentLog(directory, segment_size=64)
+        try:
+            assert len(log) == 50
+            for number in (49, 0, 17, 33, 1):
+                assert log.get(number) == records[number]
+            assert log.get(-1) == records[-1]
+            for number in (50, -51):
+                try:
+                    log.get(number)
+                    assert False, "the record should not exist"
+                except IndexError:
+                    pass
+            assert log.append(b'next') == 50
+            assert list(log) == records + [b'next']
+        finally:
+            log.close()
+
+def test_a_torn_tail_is_truncated_on_reopen():
+    with tempfile.TemporaryDirectory() as directory:
+        log = SegmentLog(directory)
+        for payload in payloads:
+            log.append(payload)
+        log.close()
+        size = os.path.getsize(segment_path(directory, 0))
+
+        # an append interrupted after a partial record and a partial index entry
+        with open(segment_path(directory, 0), 'ab') as f:
+            f.write(struct.pack('>I', 100) + b'abc')
+        with open(os.path.join(directory, 'index.bin'), 'ab') as f:
+            f.write(b'\x00' * 5)
+
+        log = SegmentLog(directory)
+        try:
+            assert len(log) == len(payloads)
+            assert os.path.getsize(segment_path(directory, 0)) == size
+            assert os.path.getsize(os.path.join(directory, 'index.bin')) == 12 * len(payloads)
+            assert log.append(b'after') == len(payloads)
+            assert list(log) == payloads + [b'after']
+            assert log.get(-1) == b'after'
+        finally:
+            log.close()
+
+def test_a_torn_record_in_a_new_segment_is_overwritten():
+    with tempfile.TemporaryDirectory() as directory:
+        log = SegmentLog(directory, segment_size=32)
+        records = [b'a' * 10, b'b' * 10]
+        for record in records:
+            log.append(record)
+        log.close()
+        # the append rotating to the second segment was interrupted before its index entry
+        with open(segment_path(directory, 1), 'wb') as f:
+            f.write(struct.pack('>I', 10) + b'torn')
+
+        log = SegmentLog(directory, segment_size=32)
+        try:
+            assert len(log) == 2 and log.segments() == 1
+            assert log.append(b'c' * 10) == 2
+            assert log.get(2) == b'c' * 10
+            assert list(log) == records + [b'c' * 10]
+        finally:
+            log.close()
+
+if __name__ == "__main__":
+    test_records_are_length_prefixed()
+    test_segments_rotate_at_the_segment_size()
+    test_records_are_found_through_the_index_after_reopening()
+    test_a_torn_tail_is_truncated_on_reopen()
+    test_a_torn_record_in_a_new_segment_is_overwritten()
+    print("Segment log tests passed")
@@ -1 +1 @@
-__all__ = ["bash_util", "CA_util", "certificates_util","commands_util","keys_util","pseudorandom_util"]
\ No newline at end of file
+__all__ = ["bash_util", "CA_util", "cache_util", "certificates_util","commands_util","keys_util","pseudorandom_util"]
\ No newline at end of file
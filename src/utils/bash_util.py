@@ -1,11 +1,241 @@
+import os
+import re
+import shlex
 import subprocess
+import threading
+import uuid
+from collections import deque
+
+# Characters that need a shell to be interpreted (pipes, redirections, expansions, ...).
+# A command without them can be executed directly, without spawning /bin/sh.
+_shell_syntax = re.compile(r'[|&;<>()$`\\*?\[\]{}~#\n]')
+
+class _ShellWorker:
+    """
+    A long-lived /bin/sh process that runs commands sent on its stdin.
+    The end of every command is marked by a sentinel line carrying its exit status.
+    """
+
+    __slots__ = ['_process', '_sentinel', '_broken']
+
+    def __init__(self):
+        self._sentinel = ('__worker_' + uuid.uuid4().hex + '__').encode()
+        self._broken = False
+        self._process = subprocess.Popen(['/bin/sh'], stdin=subprocess.PIPE, stdout=subprocess.PIPE, cwd=os.getcwd())
+
+    def is_alive(self):
+        return not self._broken and self._process.poll() is None
+
+    def run(self, command: str):
+        """
+        Run a command and wait for its completion.
+        # Arguments
+            command: The command to execute.
+        # Returns
+            The exit status and the output of the command.
+        # Raises
+            BrokenPipeError: If the worker died before receiving the command.
+            ChildProcessError: If the worker died while running the command.
+        """
+        script = f'cd {shlex.quote(os.getcwd())} && {{ {command}\n}} </dev/null; printf "\\n%s %d\\n" {self._sentinel.decode()} $?\n'
+        try:
+            self._process.stdin.write(script.encode())
+            self._process.stdin.flush()
+        except (OSError, ValueError):
+            self._broken = True
+            raise BrokenPipeError("Shell worker terminated")
+
+        fd = self._process.stdout.fileno()
+        output = b''
+        while True:
+            chunk = os.read(fd, 65536)
+            if not chunk:
+                self._broken = True
+                raise ChildProcessError("Shell worker terminated while running the command")
+            output += chunk
+            if output.endswith(b'\n'):
+                position = output.rfind(b'\n' + self._sentinel + b' ')
+                if position >= 0:
+                    status = int(output[position + len(self._sentinel) + 2:].strip())
+                    return status, output[:position]
+
+    def close(self):
+        self._broken = True
+        try:
+            self._process.stdin.close()
+            self._process.wait(timeout=1)
+        except (OSError, subprocess.TimeoutExpired):
+            self._process.kill()
+
+class CommandPool:
+    """
+    A bounded pool of long-lived shell workers.
+    Each command sent to the pool is executed by an idle worker instead of a new /bin/sh,
+    at most `size` commands run at the same time and crashed workers are replaced.
+    # Attributes
+        _size: int
+            The maximum number of workers.
+        _idle: deque
+            The workers waiting for a command.
+        _stats: dict
+            The counters of executed commands, spawned and restarted workers.
+    """
+
+    __slots__ = ['_size', '_idle', '_spawned', '_available', '_stats', '_pid']
+
+    def __init__(self, size: int = 4):
+        if size < 1:
+            raise ValueError("The pool needs at least one worker")
+        self._size = size
+        self._idle = deque()
+        self._spawned = 0
+        self._available = threading.Condition()
+        self._stats = {"commands": 0, "spawns": 0, "restarts": 0}
+        self._pid = os.getpid()
+
+    def __acquire(self):
+        with self._available:
+            while True:
+                if self._pid != os.getpid():
+                    # Forked child: the workers belong to the parent process
+                    self._idle.clear()
+                    self._spawned = 0
+                    self._pid = os.getpid()
+                if self._idle:
+                    return self._idle.pop()
+                if self._spawned < self._size:
+                    self._spawned += 1
+                    self._stats["spawns"] += 1
+                    break
+                self._available.wait()
+        try:
+            return _ShellWorker()
+        except OSError:
+            with self._available:
+                self._spawned -= 1
+                self._available.notify()
+            raise
+
+    def __release(self, worker):
+        with self._available:
+            if worker.is_alive():
+                self._idle.append(worker)
+            else:
+                self._spawned -= 1
+                self._stats["restarts"] += 1
+            self._available.notify()
+
+    def execute(self, command: str):
+        """
+        Executes a command on a worker of the pool.
+        # Arguments
+            command: The command to execute.
+        # Returns
+            The output of the command.
+        # Raises
+            subprocess.CalledProcessError: If the command exits with a non-zero status.
+            ChildProcessError: If the worker died while running the command, it is not run again.
+        """
+        for attempt in range(2):
+            worker = self.__acquire()
+            try:
+                status, output = worker.run(command)
+                break
+            except BrokenPipeError:
+                # The worker died before receiving the command: it is run once more on a fresh worker
+                worker.close()
+                if attempt:
+                    raise
+            except ChildProcessError:
+                # The command may have had side effects: it is not run again
+                worker.close()
+                raise
+            finally:
+                self.__release(worker)
+
+        with self._available:
+            self._stats["commands"] += 1
+        if status != 0:
+            raise subprocess.CalledProcessError(status, command, output)
+        return output
+
+    def stats(self):
+        """
+        Returns the counters of the pool.
+        # Returns
+            A dict with the executed commands, the spawned and restarted workers and
+            the number of process spawns saved with respect to one shell per command.
+        """
+        with self._available:
+            stats = dict(self._stats)
+        stats["spawns_saved"] = stats["commands"] - stats["spawns"]
+        return stats
+
+    def close(self):
+        """
+        Terminates the idle workers of the pool.
+        """
+        with self._available:
+            while self._idle:
+                self._idle.pop().close()
+                self._spawned -= 1
+
+_pool = None
+_direct_executions = 0
+_direct_lock = threading.Lock()
+
+def enable_command_pool(size: int = 4):
+    """
+    Route the commands of `execute_command` to a pool of long-lived shell workers.
+    # Arguments
+        size: The maximum number of workers.
+    # Returns
+        The command pool.
+    """
+    global _pool
+    if _pool is not None:
+        _pool.close()
+    _pool = CommandPool(size)
+    return _pool
+
+def disable_command_pool():
+    """
+    Terminate the command pool, commands are executed in new processes again.
+    """
+    global _pool
+    if _pool is not None:
+        _pool.close()
+    _pool = None
+
+def command_stats():
+    """
+    Returns the counters of the executed commands.
+    # Returns
+        A dict with the commands executed without a shell and, if enabled, the pool counters.
+    """
+    with _direct_lock:
+        stats = {"direct_executions": _direct_executions}
+    if _pool is not None:
+        stats.update(_pool.stats())
+    return stats
 
 def execute_command(command: str):
     """
         Executes a command in the shell and returns the output.
+        When the command pool is enabled the command runs on a long-lived shell worker,
+        otherwise commands without shell syntax are executed directly, without /bin/sh.
         # Arguments
             command: The command to execute.
         # Returns
             The output of the command.
     """
+    global _direct_executions
+    if _pool is not None:
+        return _pool.execute(command).decode("utf-8")
+    if _shell_syntax.search(command) is None:
+        args = shlex.split(command)
+        if args and '=' not in args[0]:
+            with _direct_lock:
+                _direct_executions += 1
+            return subprocess.check_output(args).decode("utf-8")
     return subprocess.check_output(command, shell=True).decode("utf-8")
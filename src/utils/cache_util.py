@@ -0,0 +1,153 @@
+import os
+import threading
+import time
+from collections import OrderedDict
+from cryptography import x509
+from cryptography.hazmat.primitives import serialization
+
+# Files modified less than this many nanoseconds before being cached may be rewritten
+# within the same timestamp tick, their content is compared until the window is over.
+_racy_window = 1_000_000_000
+
+class PEMCache:
+    """
+    Process-wide LRU cache of parsed PEM files (keys and certificates).
+    Every entry is stamped with the inode, modification time and size of the file,
+    so a file that changes on disk is parsed again at the next access.
+    # Attributes
+        _maxsize: int
+            The maximum number of cached objects.
+        _entries: OrderedDict
+            The cached objects, key: (kind, path), value: [stamp, object, content if racy else None].
+        _hits, _misses, _invalidations: int
+            The cache counters.
+    """
+
+    __slots__ = ['_maxsize', '_entries', '_lock', '_hits', '_misses', '_invalidations']
+
+    def __init__(self, maxsize: int = 4096):
+        self._maxsize = maxsize
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self._hits = 0
+        self._misses = 0
+        self._invalidations = 0
+
+    def get(self, kind, path, parser):
+        """
+        Returns the parsed content of a file, parsing it only if it is not cached or changed.
+        # Arguments
+            kind: string
+                The kind of object, files parsed in different ways are cached separately.
+            path: string
+                The name of the file.
+            parser: function
+                The function parsing the bytes of the file.
+        # Returns
+            The parsed object.
+        """
+        path = os.path.abspath(path)
+        st = os.stat(path)
+        stamp = (st.st_ino, st.st_mtime_ns, st.st_size)
+        key = (kind, path)
+
+        with self._lock:
+            entry = self._entries.get(key)
+        if entry is not None and entry[0] == stamp:
+            if entry[2] is None or self.__same_content(entry, path, st):
+                with self._lock:
+                    self._hits += 1
+                    if key in self._entries:
+                        self._entries.move_to_end(key)
+                return entry[1]
+
+        with open(path, 'rb') as f:
+            data = f.read()
+        value = parser(data)
+        racy = st.st_mtime_ns >= time.time_ns() - _racy_window
+
+        with self._lock:
+            if entry is not None:
+                self._invalidations += 1
+            self._misses += 1
+            self._entries[key] = [stamp, value, data if racy else None]
+            self._entries.move_to_end(key)
+            while len(self._entries) > self._maxsize:
+                self._entries.popitem(last=False)
+        return value
+
+    def __same_content(self, entry, path, st):
+        with open(path, 'rb') as f:
+            if f.read() != entry[2]:
+                return False
+        if st.st_mtime_ns < time.time_ns() - _racy_window:
+            # the entry is shared with the other threads: it is changed under the lock
+            with self._lock:
+                entry[2] = None
+        return True
+
+    def info(self):
+        """
+        Returns the cache counters.
+        # Returns
+            A dict with hits, misses, invalidations and the current size.
+        """
+        with self._lock:
+            return {"hits": self._hits, "misses": self._misses, "invalidations": self._invalidations, "size": len(self._entries)}
+
+    def clear(self):
+        """
+        Empties the cache and resets its counters.
+        """
+        with self._lock:
+            self._entries.clear()
+            self._hits = self._misses = self._invalidations = 0
+
+_cache = PEMCache()
+
+def _parse_base64_body(data):
+    return data.decode("utf-8").split("-----")[2].replace("\n", "")
+
+def load_private_key(priv_key_file):
+    """
+    Returns the private key stored in a PEM file.
+    # Arguments
+        priv_key_file: The file containing the private key.
+    """
+    return _cache.get("private_key", priv_key_file, lambda data: serialization.load_pem_private_key(data, password=None))
+
+def load_public_key(pub_key_file):
+    """
+    Returns the public key stored in a PEM file.
+    # Arguments
+        pub_key_file: The file containing the public key.
+    """
+    return _cache.get("public_key", pub_key_file, serialization.load_pem_public_key)
+
+def load_certificate(cert_file):
+    """
+    Returns the X.509 certificate stored in a PEM file.
+    # Arguments
+        cert_file: The file containing the certificate.
+    """
+    return _cache.get("certificate", cert_file, x509.load_pem_x509_certificate)
+
+def load_base64_body(pem_file):
+    """
+    Returns the base64 body of a PEM file, without armour lines and newlines.
+    # Arguments
+        pem_file: The PEM file.
+    """
+    return _cache.get("base64_body", pem_file, _parse_base64_body)
+
+def cache_info():
+    """
+    Returns the counters of the process-wide PEM cache.
+    """
+    return _cache.info()
+
+def clear_cache():
+    """
+    Empties the process-wide PEM cache.
+    """
+    _cache.clear()
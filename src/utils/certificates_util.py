@@ -1,5 +1,10 @@
+import datetime
 import utils.bash_util as BU
+import utils.cache_util as CacheU
 from utils.commands_util import commands
+from cryptography import x509
+from cryptography.exceptions import InvalidSignature
+from cryptography.hazmat.primitives import hashes, serialization
 
 def require_certificate(priv_key_file, out_file, config_file):
     """
@@ -89,4 +94,190 @@ def extract_public_key(cert_file, out_file):
         cert_file: The file containing the certificate.
         out_file: The file to output the public key to.
     """
-    BU.execute_command(commands["cert_extract_public_key"](cert_file, out_file))
+    public_key = certificate_public_key(cert_file).public_bytes(serialization.Encoding.PEM, serialization.PublicFormat.SubjectPublicKeyInfo)
+    with open(out_file, 'wb') as f:
+        f.write(public_key)
+
+def certificate_public_key(cert_file):
+    """
+    Returns the public key of a certificate.
+    # Arguments
+        cert_file: The file containing the certificate.
+    # Returns
+        The public key object, the certificate is parsed once until the file changes.
+    """
+    return CacheU.load_certificate(cert_file).public_key()
+
+
+class GPCertificate:
+    """
+    A GP certificate parsed once, exposing the fields checked by the sala bingo.
+    # Attributes
+        _file: string
+            The name of the GP certificate file.
+        _certificate: x509.Certificate
+            The parsed certificate.
+        _merkle_root: string
+            The root of the merkle tree of the GP fields, stored in the subjectAltName.
+    """
+
+    __slots__ = ['_file', '_certificate', '_merkle_root']
+
+    def __init__(self, cert_file):
+        """
+        Parse the GP certificate.
+        # Arguments
+            cert_file: string
+                The name of the GP certificate file.
+        # Raises
+            ValueError: If the file is not a valid certificate.
+        """
+        self._file = cert_file
+        self._certificate = CacheU.load_certificate(cert_file)
+        try:
+            SAN = self._certificate.extensions.get_extension_for_class(x509.SubjectAlternativeName).value
+            self._merkle_root = SAN.get_values_for_type(x509.DNSName)[0]
+        except (x509.ExtensionNotFound, IndexError):
+            self._merkle_root = None
+
+    def get_file(self):
+        return self._file
+
+    def get_certificate(self):
+        return self._certificate
+
+    def get_issuer(self):
+        return self._certificate.issuer
+
+    def get_not_before(self):
+        return self._certificate.not_valid_before_utc
+
+    def get_not_after(self):
+        return self._certificate.not_valid_after_utc
+
+    def get_merkle_root(self):
+        return self._merkle_root
+
+    def get_public_key(self):
+        return self._certificate.public_key()
+
+    def is_signed_by(self, CA_certificate):
+        """
+        Check that the GP is issued and signed by the given CA.
+        # Arguments
+            CA_certificate: x509.Certificate
+                The certificate of the CA.
+        # Returns
+            boolean
+                True if the signature is valid, False otherwise.
+        """
+        try:
+            self._certificate.verify_directly_issued_by(CA_certificate)
+            return True
+        except (ValueError, TypeError, InvalidSignature):
+            return False
+
+    def days_left(self, now=None):
+        """
+        Returns the number of whole days before the expiration of the GP.
+        # Arguments
+            now: datetime
+                The current time (UTC), by default the time of the call.
+        """
+        now = now or datetime.datetime.now(datetime.timezone.utc)
+        if now < self.get_not_before():
+            return -1
+        return (self.get_not_after() - now).days
+
+
+class TrustStore:
+    """
+    The set of trusted root CAs, indexed by subject and by subject key identifier.
+    The positive verdicts of the validations are cached per certificate fingerprint while
+    both the certificate and its CA are valid, so a valid certificate already seen is not verified again.
+    Negative verdicts are not cached: a certificate not yet valid becomes valid later.
+    # Attributes
+        _by_subject: dict
+            key: the subject name of the CA, value: list of CA certificates.
+        _by_key_id: dict
+            key: the subject key identifier of the CA, value: CA certificate.
+        _verdicts: dict
+            key: the SHA-256 fingerprint of a valid certificate, value: (start, expiration) of the positive verdict.
+    """
+
+    __slots__ = ['_by_subject', '_by_key_id', '_verdicts']
+
+    def __init__(self):
+        self._by_subject = {}
+        self._by_key_id = {}
+        self._verdicts = {}
+
+    def add(self, CA_cert):
+        """
+        Add a trusted CA.
+        # Arguments
+            CA_cert: string
+                The name of the CA certificate file.
+        """
+        certificate = CacheU.load_certificate(CA_cert)
+        self._by_subject.setdefault(certificate.subject, []).append(certificate)
+        self._by_key_id[TrustStore.__subject_key_id(certificate)] = certificate
+
+    def __len__(self):
+        return len(self._by_key_id)
+
+    @staticmethod
+    def __subject_key_id(certificate):
+        try:
+            return certificate.extensions.get_extension_for_class(x509.SubjectKeyIdentifier).value.digest
+        except x509.ExtensionNotFound:
+            return x509.SubjectKeyIdentifier.from_public_key(certificate.public_key()).digest
+
+    def find_issuers(self, certificate):
+        """
+        Find the trusted CAs that could have issued the certificate.
+        # Arguments
+            certificate: x509.Certificate
+                The certificate.
+        # Returns
+            list
+                The candidate CA certificates.
+        """
+        try:
+            key_id = certificate.extensions.get_extension_for_class(x509.AuthorityKeyIdentifier).value.key_identifier
+        except x509.ExtensionNotFound:
+            key_id = None
+        if key_id is not None:
+            issuer = self._by_key_id.get(key_id)
+            return [issuer] if issuer is not None else []
+        return self._by_subject.get(certificate.issuer, [])
+
+    def validate(self, GP, now=None):
+        """
+        Check that the GP is not expired and it is signed by a trusted CA.
+        # Arguments
+            GP: GPCertificate
+                The GP certificate.
+            now: datetime
+                The current time (UTC), by default the time of the call.
+        # Returns
+            boolean
+                True if the GP is valid, False otherwise.
+        """
+        now = now or datetime.datetime.now(datetime.timezone.utc)
+        fingerprint = GP.get_certificate().fingerprint(hashes.SHA256())
+
+        cached = self._verdicts.get(fingerprint)
+        if cached is not None and cached[0] <= now < cached[1]:
+            return True
+
+        if GP.days_left(now) <= 0:
+            return False
+        for CA in self.find_issuers(GP.get_certificate()):
+            if CA.not_valid_before_utc <= now <= CA.not_valid_after_utc and GP.is_signed_by(CA):
+                # GP.days_left(now) > 0 holds until one day before notAfter, the CA must be valid too
+                start = max(GP.get_not_before(), CA.not_valid_before_utc)
+                expiration = min(GP.get_not_after() - datetime.timedelta(days=1), CA.not_valid_after_utc)
+                self._verdicts[fingerprint] = (start, expiration)
+                return True
+        return False
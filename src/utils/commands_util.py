@@ -50,7 +50,7 @@ commands = {
     "create_CA_key_dir": lambda ca_name: f'mkdir {ca_name}/private',
     "create_CA_cert_dir": lambda ca_name: f'mkdir {ca_name}/certs',
     "create_CA_index_file": lambda ca_name: f'touch {ca_name}/index.txt',
-    "create_CA_serial_file": lambda ca_name: f'echo 00 > {ca_name}/serial',
+    "create_CA_serial_file": lambda ca_name: f'echo 01 > {ca_name}/serial',
     "move_CA_cert": lambda ca_name, cert_file: f'mv {cert_file} {ca_name}',
     "move_CA_key": lambda ca_name, priv_key_file: f'mv {priv_key_file} {ca_name}/private',
     # CA sign CSR
@@ -1,32 +1,120 @@
-import utils.bash_util as BU
-from utils.commands_util import commands
+import hashlib
 
 def compute_hash_from_data(data):
-    """ 
+    """
     Compute the hash from the given data.
+    The SHA3-256 digest is computed in-process, the output is the same hex string
+    returned by `echo -n "{data}" | openssl dgst -sha3-256`.
     # Arguments
         data: string
             The data.
     # Returns
         The hash.
     """
-    return BU.execute_command(commands["compute_hash_from_data"](data)).split('= ')[1].strip()
+    return hashlib.sha3_256(data.encode("utf-8")).hexdigest()
+
+def hash_many(data_list):
+    """
+    Compute the hash of every element of the given list.
+    # Arguments
+        data_list: iterable of strings
+            The data to hash.
+    # Returns
+        The list of the hashes, in the same order of the input.
+    """
+    sha3_256 = hashlib.sha3_256
+    return [sha3_256(data.encode("utf-8")).hexdigest() for data in data_list]
 
 def compute_hash_from_file(in_file, out_file):
-    """ 
+    """
     Compute the hash from the given file.
     # Arguments
         in_file: string
             The name of the input file.
         out_file: string
             The name of the output file.
-        hash_alg: string
-            The hash algorithm.
     """
-    BU.execute_command(commands["compute_hash_from_file"](in_file, out_file, "-sha3-256"))
-    # modify the output file to remove the part before the = sign
-    with open(out_file, "r") as f:
-        line = f.readline().split('= ')[1].strip()
+    hasher = hashlib.sha3_256()
+    with open(in_file, "rb") as f:
+        for chunk in iter(lambda: f.read(65536), b""):
+            hasher.update(chunk)
     with open(out_file, "w") as f:
-        f.write(line)
-        
\ No newline at end of file
+        f.write(hasher.hexdigest())
+
+class ConcatenationHash:
+    """
+    SHA3-256 of the concatenation of strings fed one at a time.
+    The hex digest is the one returned by `compute_hash_from_data` on the whole
+    concatenation, which is never built.
+    # Attributes
+        _hasher: the SHA3-256 state of the fed strings.
+    """
+
+    __slots__ = ['_hasher']
+
+    def __init__(self):
+        self._hasher = hashlib.sha3_256()
+
+    def update(self, data):
+        """
+        Append a string to the hashed concatenation.
+        # Arguments
+            data: string
+                The string.
+        """
+        self._hasher.update(data.encode("utf-8"))
+
+    def hexdigest(self):
+        """
+        Returns the hex digest of the concatenation of the fed strings.
+        """
+        return self._hasher.hexdigest()
+
+class Transcript:
+    """
+    Running SHA3-256 hash of the messages of a protocol run.
+    The fields are absorbed one at a time, each one prefixed by its length on 8 bytes:
+    two different sequences of fields never produce the same stream of bytes,
+    e.g. ("ab", "c") and ("a", "bc") give different digests.
+    # Attributes
+        _hasher: the SHA3-256 state of the absorbed fields.
+    """
+
+    __slots__ = ['_hasher']
+
+    def __init__(self, label: str = ""):
+        self._hasher = hashlib.sha3_256()
+        self.absorb(label)
+
+    def absorb(self, *fields):
+        """
+        Absorb some fields in the transcript.
+        # Arguments
+            fields: strings
+                The fields, in order.
+        """
+        update = self._hasher.update
+        for field in fields:
+            data = field.encode("utf-8")
+            update(len(data).to_bytes(8, "big"))
+            update(data)
+
+    def copy(self):
+        """
+        Returns an independent copy of the transcript.
+        """
+        transcript = Transcript.__new__(Transcript)
+        transcript._hasher = self._hasher.copy()
+        return transcript
+
+    def digest(self):
+        """
+        Returns the 32 bytes digest of the absorbed fields.
+        """
+        return self._hasher.digest()
+
+    def hexdigest(self):
+        """
+        Returns the hex digest of the absorbed fields.
+        """
+        return self._hasher.hexdigest()
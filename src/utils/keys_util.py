@@ -1,5 +1,10 @@
 import utils.bash_util as BU
+import utils.cache_util as CacheU
 from utils.commands_util import commands
+from cryptography.exceptions import InvalidSignature
+from cryptography.hazmat.primitives import hashes
+from cryptography.hazmat.primitives.asymmetric import ec, padding
+from cryptography.hazmat.primitives.asymmetric.utils import NoDigestInfo
 
 def gen_ECDSA_keys(curve_name, param_file, priv_key_file, pub_key_file):
     """
@@ -44,6 +49,106 @@ def view_ECDSA_pub_key(pub_key_file):
     """ 
     return BU.execute_command(commands["ECDSA_pub_key_view"](pub_key_file))
 
+def load_private_key(priv_key_file):
+    """
+    Load a PEM private key (ECDSA or RSA) from file.
+    The parsed key is cached until the file changes.
+    # Arguments
+        priv_key_file: The file to read the private key from.
+    # Returns
+        The private key object.
+    """
+    return CacheU.load_private_key(priv_key_file)
+
+def load_public_key(pub_key_file):
+    """
+    Load a PEM public key (ECDSA or RSA) from file.
+    The parsed key is cached until the file changes.
+    # Arguments
+        pub_key_file: The file to read the public key from.
+    # Returns
+        The public key object.
+    """
+    return CacheU.load_public_key(pub_key_file)
+
+def read_signature(signature_file):
+    """
+    Read a signature from file.
+    # Arguments
+        signature_file: The file to read the signature from.
+    # Returns
+        The signature bytes.
+    """
+    with open(signature_file, 'rb') as f:
+        return f.read()
+
+def write_signature(signature, signature_file):
+    """
+    Write a signature to file.
+    # Arguments
+        signature: The signature bytes.
+        signature_file: The file to store the signature in.
+    """
+    with open(signature_file, 'wb') as f:
+        f.write(signature)
+
+def sign_ECDSA_bytes(priv_key, data):
+    """
+    Sign the given bytes with an ECDSA private key.
+    The signature is the DER encoded ECDSA-SHA256 signature produced by `openssl dgst -sign`.
+    # Arguments
+        priv_key: The loaded private key.
+        data: The bytes to sign.
+    # Returns
+        The signature bytes.
+    """
+    return priv_key.sign(data, ec.ECDSA(hashes.SHA256()))
+
+def verify_ECDSA_bytes(pub_key, data, signature):
+    """
+    Verify an ECDSA signature on the given bytes.
+    # Arguments
+        pub_key: The loaded public key.
+        data: The signed bytes.
+        signature: The signature bytes.
+    # Returns
+        True if the signature is valid, False otherwise.
+    """
+    try:
+        pub_key.verify(signature, data, ec.ECDSA(hashes.SHA256()))
+        return True
+    except (InvalidSignature, ValueError):
+        return False
+
+def sign_RSA_bytes(priv_key, data):
+    """
+    Sign the given bytes with an RSA private key.
+    As `openssl pkeyutl -sign`, the data is padded with PKCS#1 v1.5 and signed as is,
+    without hashing it and without a DigestInfo structure.
+    # Arguments
+        priv_key: The loaded private key.
+        data: The bytes to sign.
+    # Returns
+        The signature bytes.
+    """
+    return priv_key.sign(data, padding.PKCS1v15(), NoDigestInfo())
+
+def verify_RSA_bytes(pub_key, data, signature):
+    """
+    Verify an RSA signature produced by `sign_RSA_bytes` or `openssl pkeyutl -sign`.
+    # Arguments
+        pub_key: The loaded public key.
+        data: The signed bytes.
+        signature: The signature bytes.
+    # Returns
+        True if the signature is valid, False otherwise.
+    """
+    try:
+        pub_key.verify(signature, data, padding.PKCS1v15(), NoDigestInfo())
+        return True
+    except (InvalidSignature, ValueError):
+        return False
+
 def sign_ECDSA(priv_key_file, data_file, signature_file):
     """ 
     Sign a file with the given private key.
@@ -52,18 +157,19 @@ def sign_ECDSA(priv_key_file, data_file, signature_file):
         data_file: The file to sign.
         signature_file: The file to store the signature in.
     """
-        
-    BU.execute_command(commands["ECDSA_sign"](data_file, priv_key_file, signature_file))
+    with open(data_file, 'rb') as f:
+        data = f.read()
+    write_signature(sign_ECDSA_bytes(load_private_key(priv_key_file), data), signature_file)
 
 def sign_ECDSA_from_variable(priv_key_file, data_variable, signature_file):
     """ 
-    Sign a file with the given private key.
+    Sign a variable with the given private key.
     # Arguments
         priv_key_file: The file to read the private key from.
         data_variable: The variable to sign.
         signature_file: The file to store the signature in.
     """
-    return BU.execute_command(commands["ECDSA_sign_variable"](data_variable, priv_key_file, signature_file))
+    write_signature(sign_ECDSA_bytes(load_private_key(priv_key_file), data_variable.encode("utf-8")), signature_file)
 
 def verify_ECDSA(pub_key_file, data_file, signature_file):
     """
@@ -73,9 +179,23 @@ def verify_ECDSA(pub_key_file, data_file, signature_file):
         data_file: The file to verify.
         signature_file: The file to read the signature from.
     # Returns
-        The output of the command.
+        True if the signature is valid, False otherwise.
     """
-    return BU.execute_command(commands["ECDSA_verify"](data_file, signature_file, pub_key_file))
+    with open(data_file, 'rb') as f:
+        data = f.read()
+    return verify_ECDSA_bytes(load_public_key(pub_key_file), data, read_signature(signature_file))
+
+def verify_ECDSA_from_variable(pub_key_file, data_variable, signature_file):
+    """
+    Verify a variable with the given public key.
+    # Arguments
+        pub_key_file: The file to read the public key from.
+        data_variable: The variable to verify.
+        signature_file: The file to read the signature from.
+    # Returns
+        True if the signature is valid, False otherwise.
+    """
+    return verify_ECDSA_bytes(load_public_key(pub_key_file), data_variable.encode("utf-8"), read_signature(signature_file))
 
 def gen_RSA_keys(key_size, priv_key_file):
     """
@@ -118,35 +238,39 @@ def view_RSA_pub_key(pub_key_file):
 
 def sign_RSA(priv_key_file, data_file, signature_file):
     """
-    Signs data using RSA private key using the openssl bash command.
+    Signs data using RSA private key.
     # Arguments
         priv_key_file: The file to read the private key from.
         data_file: The file to read the data from.
         signature_file: The file to store the signature in.
     """ 
-    BU.execute_command(commands["RSA_sign"](data_file, priv_key_file, signature_file))
+    with open(data_file, 'rb') as f:
+        data = f.read()
+    write_signature(sign_RSA_bytes(load_private_key(priv_key_file), data), signature_file)
 
 def verify_RSA(pub_key_file, data_file, signature_file):
     """
-    Verifies data using RSA public key using the openssl bash command.
+    Verifies data using RSA public key.
     # Arguments
         pub_key_file: The file to read the public key from.
         data_file: The file to read the data from.
         signature_file: The file to read the signature from.
+    # Returns
+        True if the signature is valid, False otherwise.
     """ 
-    return BU.execute_command(commands["RSA_verify"](data_file, signature_file, pub_key_file))
+    with open(data_file, 'rb') as f:
+        data = f.read()
+    return verify_RSA_bytes(load_public_key(pub_key_file), data, read_signature(signature_file))
 
 def base64_key_view(key_file):
     """
-    Views a base64 key using the openssl bash command.
+    Views the base64 body of a PEM key.
     # Arguments
         key_file: The file to read the key from.
     # Returns
-        The output of the command.
+        The base64 key, cached until the file changes.
     """
-    with open(key_file, 'r') as f:
-        key = f.read()
-    return key.split("-----")[2].replace("\n", "")
+    return CacheU.load_base64_body(key_file)
 
 def concatenate(*args):
     risultato = ''.join(args)
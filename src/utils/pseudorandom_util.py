@@ -1,25 +1,82 @@
 import base64
+import hashlib
+import hmac
+import os
+import threading
 import utils.bash_util as BU
 import utils.hash_util as HU
 from utils.commands_util import commands
 
+class RandomPool:
+    """
+    A buffer of cryptographically secure random bytes refilled from os.urandom in large chunks.
+    It is thread-safe and fork-safe: a child process discards the bytes inherited
+    from its parent, so parent and child never return the same bytes.
+    # Attributes
+        _chunk_size: int
+            The number of bytes read from os.urandom at every refill.
+        _buffer: bytearray
+            The random bytes not yet returned.
+    """
+
+    __slots__ = ['_chunk_size', '_buffer', '_lock']
+
+    def __init__(self, chunk_size:int = 65536):
+        self._chunk_size = chunk_size
+        self._buffer = bytearray()
+        self._lock = threading.Lock()
+
+    def take(self, num_bytes:int):
+        """
+            Returns fresh random bytes.
+            # Arguments
+                num_bytes: The number of bytes.
+            # Returns
+                The random bytes.
+        """
+        if num_bytes < 0:
+            raise ValueError("Invalid number of bytes")
+        if num_bytes > self._chunk_size:
+            return os.urandom(num_bytes)
+        with self._lock:
+            if len(self._buffer) < num_bytes:
+                self._buffer = bytearray(os.urandom(self._chunk_size))
+            out = bytes(self._buffer[:num_bytes])
+            del self._buffer[:num_bytes]
+        return out
+
+    def reseed(self):
+        """
+            Discards the buffered bytes, the next request reads new bytes from os.urandom.
+        """
+        self._lock = threading.Lock()
+        self._buffer = bytearray()
+
+_pool = RandomPool()
+os.register_at_fork(after_in_child=_pool.reseed)
+
 def rand_extract(bytes:int, encode:str):
     """
         Generates a pseudo random number.
+        The encodings are the same of `openssl rand -hex` and `openssl rand -base64`.
         # Arguments
-            out_file: The file to output the pseudo random number to.
             bytes: The number of bytes to generate.
+            encode: The encoding of the output: hex, base64 or raw.
         # Returns
-            The pseudo random number.
+            The pseudo random number, as bytes if the encoding is raw.
         # Raises
             ValueError: If the encoding is invalid.
     """
-    enc = "-hex"
     encode = encode.lower()
 
-    if encode== "hex" or encode == "base64":
-        enc = "-"+encode
-        return (BU.execute_command(commands["rand_extract"](enc,bytes))).removesuffix("\n")
+    if encode == "hex":
+        return _pool.take(bytes).hex()
+    elif encode == "base64":
+        encoded = base64.b64encode(_pool.take(bytes)).decode("ascii")
+        # openssl splits the base64 output in lines of 64 characters
+        return "\n".join(encoded[i:i+64] for i in range(0, len(encoded), 64))
+    elif encode == "raw":
+        return _pool.take(bytes)
     else:
         raise ValueError("Invalid encoding")
     
@@ -130,4 +187,35 @@ def hash_concat_data_and_known_rand(data,rand):
         # Returns
             The concatenated data.
     """
-    return HU.compute_hash_from_data((data+rand).removesuffix("\n"))
\ No newline at end of file
+    return HU.compute_hash_from_data((data+rand).removesuffix("\n"))
+
+def prf(key:str, data):
+    """
+        Computes the HMAC-SHA256 PRF in-process.
+        The output is the same of `echo -n {data} | openssl dgst -sha256 -hmac {key}`.
+        # Arguments
+            key: The key of the PRF.
+            data: The input of the PRF.
+        # Returns
+            The hex output of the PRF.
+    """
+    return hmac.new(key.encode("utf-8"), str(data).encode("utf-8"), hashlib.sha256).hexdigest()
+
+def contribution_stream(seed:str, IV:int, modulus:int):
+    """
+        Generates the sequence of random contributions of a participant.
+        The PRF output for the current IV is split in two halves: the contribution
+        and the randomness used to commit to it. After every output the IV is incremented modulo `modulus`.
+        # Arguments
+            seed: The key of the PRF.
+            IV: The initial value of the counter.
+            modulus: The modulus of the counter.
+        # Returns
+            A generator of (contribution, randomness, commitment) triples.
+    """
+    while True:
+        prf_output = prf(seed, IV)
+        IV = (IV + 1) % modulus
+        contribution = prf_output[:len(prf_output)//2]
+        randomness = prf_output[len(prf_output)//2:]
+        yield contribution, randomness, HU.compute_hash_from_data(contribution + randomness)